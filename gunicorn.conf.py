@@ -0,0 +1,57 @@
+import os
+
+from src.config import worker_count, thread_count
+
+# Configuração do gunicorn para produção (Railway): `gunicorn -c gunicorn.conf.py "src.main:create_app()"`
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+workers = worker_count()
+threads = thread_count()
+# Sempre gthread, mesmo com uma thread: o stream ao vivo (SSE) fica aberto por
+# muito mais que o timeout, que no worker sync mataria a conexão
+worker_class = 'gthread'
+
+# Carregar a aplicação no master antes do fork economiza memória e tempo de boot
+preload_app = os.environ.get('GUNICORN_PRELOAD', '1') == '1'
+
+timeout = int(os.environ.get('GUNICORN_TIMEOUT', '30'))
+graceful_timeout = int(os.environ.get('GUNICORN_GRACEFUL_TIMEOUT', '30'))
+keepalive = int(os.environ.get('GUNICORN_KEEPALIVE', '5'))
+
+# Reciclar workers periodicamente evita crescimento de memória em processos longos
+max_requests = int(os.environ.get('GUNICORN_MAX_REQUESTS', '1000'))
+max_requests_jitter = int(os.environ.get('GUNICORN_MAX_REQUESTS_JITTER', '100'))
+
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    # Cria o schema uma única vez, no master, antes de qualquer worker atender requisições
+    from src.main import create_app, init_db
+    init_db(create_app())
+
+
+def post_fork(server, worker):
+    # Com preload, o engine foi criado no master: cada worker precisa de um pool próprio
+    if not preload_app:
+        return
+
+    from src.models.user import db
+    app = server.app.wsgi()
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+
+
+def post_worker_init(worker):
+    # Executor da fila de tarefas dentro de cada worker, já depois do fork
+    from src.services.jobs import iniciar_executor
+    iniciar_executor(worker.wsgi)
+
+
+def worker_exit(server, worker):
+    from src.services.jobs import parar_executor
+    from src.services.senhas import pool_senhas
+    parar_executor()
+    pool_senhas.desligar()
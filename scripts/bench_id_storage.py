@@ -0,0 +1,166 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Compara o armazenamento de IDs em texto (VARCHAR(36)) e compacto (BLOB de 16 bytes)
+# no SQLite: tamanho de tabelas/índices e latência dos joins do ranking.
+#
+# Uso: python scripts/bench_id_storage.py [partidas] [jogadores_por_partida]
+
+import json
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+import uuid
+from datetime import date, time as dtime, timedelta
+from sqlalchemy import func, text
+
+N_USUARIOS = 600
+N_PELADAS = 20
+REPETICOES = 15
+
+
+def popular(partidas, por_partida):
+    from src.models.user import (db, User, Pelada, MembroPelada, Partida, PresencaPartida,
+                                 EstatisticaJogadorPartida, AvaliacaoPartida)
+    rnd = random.Random(42)
+
+    usuarios = [str(uuid.uuid4()) for _ in range(N_USUARIOS)]
+    db.session.execute(User.__table__.insert(), [
+        {'id': u, 'nome': f'Jogador {i}', 'email': f'j{i}@bench', 'senha_hash': 'x', 'posicao': 'Atacante'}
+        for i, u in enumerate(usuarios)
+    ])
+
+    peladas = [str(uuid.uuid4()) for _ in range(N_PELADAS)]
+    db.session.execute(Pelada.__table__.insert(), [
+        {'id': p, 'nome': f'Pelada {i}', 'local': 'Quadra', 'admin_id': usuarios[i]}
+        for i, p in enumerate(peladas)
+    ])
+
+    elencos = {p: rnd.sample(usuarios, min(40, N_USUARIOS)) for p in peladas}
+    db.session.execute(MembroPelada.__table__.insert(), [
+        {'usuario_id': u, 'pelada_id': p, 'is_admin': False} for p, elenco in elencos.items() for u in elenco
+    ])
+
+    linhas_partida, presencas, estatisticas, avaliacoes = [], [], [], []
+    for i in range(partidas):
+        pelada = peladas[i % N_PELADAS]
+        partida = str(uuid.uuid4())
+        linhas_partida.append({
+            'id': partida, 'pelada_id': pelada, 'status': 'concluida',
+            'data_partida': date(2020, 1, 1) + timedelta(days=i // N_PELADAS * 7),
+            'hora_inicio': dtime(20, 0),
+        })
+        jogadores = rnd.sample(elencos[pelada], por_partida)
+        for j, u in enumerate(jogadores):
+            presencas.append({'partida_id': partida, 'usuario_id': u, 'confirmacao': 'confirmado'})
+            estatisticas.append({
+                'partida_id': partida, 'usuario_id': u, 'gols': rnd.randint(0, 3),
+                'assistencias': rnd.randint(0, 2), 'defesas': 0, 'gols_sofridos': 0,
+                'desarmes': rnd.randint(0, 4), 'pontuacao_total': rnd.randint(-5, 40),
+            })
+            avaliacoes.append({'partida_id': partida, 'avaliador_id': u,
+                               'avaliado_id': jogadores[(j + 1) % por_partida], 'tipo_avaliacao': 'mvp'})
+            avaliacoes.append({'partida_id': partida, 'avaliador_id': u,
+                               'avaliado_id': jogadores[(j + 2) % por_partida], 'tipo_avaliacao': 'bola_murcha'})
+
+    db.session.execute(Partida.__table__.insert(), linhas_partida)
+    db.session.execute(PresencaPartida.__table__.insert(), presencas)
+    db.session.execute(EstatisticaJogadorPartida.__table__.insert(), estatisticas)
+    db.session.execute(AvaliacaoPartida.__table__.insert(), avaliacoes)
+    db.session.commit()
+    return peladas, usuarios
+
+
+def medir(modo, caminho, partidas, por_partida):
+    from src.main import create_app, init_db
+    from src.models.user import db, User, Partida, EstatisticaJogadorPartida
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': f'sqlite:///{caminho}', 'ID_STORAGE': modo})
+    init_db(app)
+
+    with app.app_context():
+        peladas, usuarios = popular(partidas, por_partida)
+        db.session.execute(text('ANALYZE'))
+        db.session.execute(text('VACUUM'))
+
+        tamanhos = dict(db.session.execute(text(
+            'SELECT name, SUM(pgsize) FROM dbstat GROUP BY name'
+        )).all())
+
+        def ranking_pelada(pelada_id):
+            return db.session.query(
+                User.id, func.count(EstatisticaJogadorPartida.partida_id),
+                func.avg(EstatisticaJogadorPartida.pontuacao_total)
+            ).join(
+                EstatisticaJogadorPartida, User.id == EstatisticaJogadorPartida.usuario_id
+            ).join(
+                Partida, EstatisticaJogadorPartida.partida_id == Partida.id
+            ).filter(
+                Partida.pelada_id == pelada_id, Partida.status == 'concluida'
+            ).group_by(User.id).all()
+
+        def stats_usuario(usuario_id):
+            return db.session.query(
+                func.count(EstatisticaJogadorPartida.partida_id), func.sum(EstatisticaJogadorPartida.gols)
+            ).join(
+                Partida, EstatisticaJogadorPartida.partida_id == Partida.id
+            ).filter(
+                EstatisticaJogadorPartida.usuario_id == usuario_id, Partida.status == 'concluida'
+            ).first()
+
+        def cronometrar(fn, argumentos):
+            tempos = []
+            for i in range(REPETICOES):
+                inicio = time.perf_counter()
+                fn(argumentos[i % len(argumentos)])
+                tempos.append((time.perf_counter() - inicio) * 1000)
+            return statistics.median(tempos)
+
+        latencias = {
+            'ranking_pelada_ms': cronometrar(ranking_pelada, peladas),
+            'stats_usuario_ms': cronometrar(stats_usuario, usuarios),
+        }
+
+    return {'tamanhos': tamanhos, 'latencias': latencias, 'arquivo': os.path.getsize(caminho)}
+
+
+def main():
+    partidas = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    por_partida = int(sys.argv[2]) if len(sys.argv) > 2 else 16
+
+    resultados = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        for modo in ('texto', 'compacto'):
+            caminho = os.path.join(tmp, f'{modo}.db')
+            # Cada modo roda em um processo próprio: o tipo das colunas é fixado na primeira conexão
+            saida = subprocess.run(
+                [sys.executable, __file__, '--medir', modo, caminho, str(partidas), str(por_partida)],
+                check=True, capture_output=True, text=True
+            ).stdout
+            resultados[modo] = json.loads(saida.strip().splitlines()[-1])
+
+    texto, compacto = resultados['texto'], resultados['compacto']
+    print(f'{partidas} partidas, {por_partida} jogadores por partida\n')
+    print(f"{'objeto':<48}{'texto (KB)':>12}{'compacto (KB)':>15}{'redução':>10}")
+    for nome in sorted(texto['tamanhos']):
+        a = texto['tamanhos'][nome] / 1024
+        b = compacto['tamanhos'].get(nome, 0) / 1024
+        if a < 8:
+            continue
+        print(f'{nome:<48}{a:>12.0f}{b:>15.0f}{(1 - b / a) * 100:>9.0f}%')
+    a, b = texto['arquivo'] / 1024, compacto['arquivo'] / 1024
+    print(f"{'arquivo total':<48}{a:>12.0f}{b:>15.0f}{(1 - b / a) * 100:>9.0f}%\n")
+
+    print(f"{'consulta (mediana)':<48}{'texto (ms)':>12}{'compacto (ms)':>15}")
+    for nome in texto['latencias']:
+        print(f"{nome:<48}{texto['latencias'][nome]:>12.2f}{compacto['latencias'][nome]:>15.2f}")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--medir':
+        print(json.dumps(medir(sys.argv[2], sys.argv[3], int(sys.argv[4]), int(sys.argv[5]))))
+    else:
+        main()
@@ -0,0 +1,95 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mede o replay completo dos ratings (flask rebuild-ratings) sobre um histórico sintético.
+#
+# Uso: python scripts/bench_rating_replay.py [partidas] [jogadores_por_partida]
+
+import random
+import tempfile
+import time
+import uuid
+from datetime import date, time as dtime, timedelta
+from src.main import create_app, init_db
+from src.models.user import (db, User, Pelada, Partida, EstatisticaJogadorPartida, RatingJogador)
+from src.services.historico import carregar_estatisticas
+from src.services import rating as rating_service
+
+N_USUARIOS = 1000
+N_PELADAS = 50
+
+
+def popular(partidas, por_partida):
+    rnd = random.Random(3)
+    usuarios = [str(uuid.uuid4()) for _ in range(N_USUARIOS)]
+    db.session.execute(User.__table__.insert(), [
+        {'id': u, 'nome': f'Jogador {i}', 'email': f'j{i}@bench', 'senha_hash': 'x', 'posicao': 'Atacante'}
+        for i, u in enumerate(usuarios)
+    ])
+    peladas = [str(uuid.uuid4()) for _ in range(N_PELADAS)]
+    db.session.execute(Pelada.__table__.insert(), [
+        {'id': p, 'nome': f'Pelada {i}', 'local': 'Quadra', 'admin_id': usuarios[i]} for i, p in enumerate(peladas)
+    ])
+    elencos = {p: rnd.sample(usuarios, 30) for p in peladas}
+    # Habilidade "verdadeira" de cada jogador, para conferir se o rating a recupera
+    habilidade = {u: rnd.gauss(0, 1) for u in usuarios}
+
+    linhas_partida, estatisticas = [], []
+    for i in range(partidas):
+        pelada = peladas[i % N_PELADAS]
+        partida = str(uuid.uuid4())
+        linhas_partida.append({
+            'id': partida, 'pelada_id': pelada, 'status': 'concluida', 'hora_inicio': dtime(20, 0),
+            'data_partida': date(2015, 1, 1) + timedelta(days=i // N_PELADAS),
+        })
+        for u in rnd.sample(elencos[pelada], por_partida):
+            estatisticas.append({
+                'partida_id': partida, 'usuario_id': u, 'gols': 0, 'assistencias': 0, 'defesas': 0,
+                'gols_sofridos': 0, 'desarmes': 0,
+                'pontuacao_total': int(round(15 + 8 * habilidade[u] + rnd.gauss(0, 8))),
+            })
+
+    db.session.execute(Partida.__table__.insert(), linhas_partida)
+    db.session.execute(EstatisticaJogadorPartida.__table__.insert(), estatisticas)
+    db.session.commit()
+    return habilidade
+
+
+def main():
+    partidas = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    por_partida = int(sys.argv[2]) if len(sys.argv) > 2 else 14
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'bench.db')}"})
+        init_db(app)
+        with app.app_context():
+            habilidade = popular(partidas, por_partida)
+
+            inicio = time.perf_counter()
+            historico = carregar_estatisticas()
+            carga = time.perf_counter() - inicio
+
+            inicio = time.perf_counter()
+            resultado = rating_service.reconstruir_ratings()
+            total = time.perf_counter() - inicio
+
+            geral = RatingJogador.query.filter_by(escopo=rating_service.ESCOPO_GERAL).all()
+            ratings = [r.rating for r in geral]
+            verdade = [habilidade[r.usuario_id] for r in geral]
+
+    n = len(ratings)
+    media_r, media_v = sum(ratings) / n, sum(verdade) / n
+    cov = sum((a - media_r) * (b - media_v) for a, b in zip(ratings, verdade))
+    var_r = sum((a - media_r) ** 2 for a in ratings)
+    var_v = sum((b - media_v) ** 2 for b in verdade)
+
+    print(f'{partidas} partidas, {len(historico["partida_id"])} linhas de estatística')
+    print(f'carga colunar do histórico: {carga:.2f}s')
+    print(f'replay completo (carga + cálculo + gravação): {total:.2f}s')
+    print(f"{resultado['ratings']} ratings gravados ({resultado['partidas'] / total:.0f} partidas/s)")
+    print(f'correlação rating x habilidade simulada: {cov / (var_r * var_v) ** 0.5:.3f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Logins por segundo por núcleo para cada método/custo de hash de senha.
+#
+# Para cada SENHA_METODO mede a verificação pura em uma thread (1 núcleo) e o
+# POST /api/auth/login de ponta a ponta com o pool de processos, com várias
+# threads de requisição em paralelo.
+#
+# Uso: python scripts/bench_senhas.py [segundos por medida] [processos do pool]
+
+import tempfile
+import threading
+import time
+from werkzeug.security import generate_password_hash, check_password_hash
+from src.main import create_app, init_db
+from src.services.senhas import pool_senhas
+
+METODOS = ['scrypt:32768:8:1', 'scrypt:16384:8:1', 'pbkdf2:sha256:600000', 'pbkdf2:sha256:260000']
+
+
+def medir(fn, segundos, threads=1):
+    contagem = [0] * threads
+    fim = time.perf_counter() + segundos
+
+    def rodar(i):
+        while time.perf_counter() < fim:
+            fn()
+            contagem[i] += 1
+
+    inicio = time.perf_counter()
+    trabalhadores = [threading.Thread(target=rodar, args=(i,)) for i in range(threads)]
+    for t in trabalhadores:
+        t.start()
+    for t in trabalhadores:
+        t.join()
+    return sum(contagem) / (time.perf_counter() - inicio)
+
+
+def main():
+    segundos = float(sys.argv[1]) if len(sys.argv) > 1 else 3
+    processos = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 1)
+    tmp = tempfile.mkdtemp()
+
+    print(f'{processos} processo(s) no pool, {2 * processos} threads de requisição, {segundos:.0f}s por medida')
+    print(f"{'método':<24}{'1 núcleo/s':>12}{'login/s':>10}{'login/s/núcleo':>16}")
+    for metodo in METODOS:
+        senha_hash = generate_password_hash('senha-de-teste', metodo)
+        puro = medir(lambda: check_password_hash(senha_hash, 'senha-de-teste'), segundos)
+
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, metodo.replace(':', '_'))}.db",
+            'SENHA_METODO': metodo,
+            'SENHA_PROCESSOS': processos,
+            'SENHA_FILA_MAX': 4 * processos,
+            'SENHA_ESPERA_SEGUNDOS': 30,
+            'SESSAO_BACKEND': 'memoria',
+            'JOBS_WORKER_THREADS': 0,
+            'TESTING': True,
+        })
+        init_db(app)
+        app.test_client().post('/api/auth/register', json={
+            'nome': 'Bench', 'email': 'bench@teste', 'senha': 'senha-de-teste', 'posicao': 'Atacante'
+        })
+
+        def login():
+            resposta = app.test_client().post('/api/auth/login', json={'email': 'bench@teste', 'senha': 'senha-de-teste'})
+            assert resposta.status_code == 200, resposta.get_json()
+
+        login()  # aquece o pool
+        ponta_a_ponta = medir(login, segundos, threads=2 * processos)
+        print(f'{metodo:<24}{puro:>12.1f}{ponta_a_ponta:>10.1f}{ponta_a_ponta / processos:>16.1f}')
+        pool_senhas.desligar()
+
+
+if __name__ == '__main__':
+    main()
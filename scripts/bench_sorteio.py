@@ -0,0 +1,60 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Compara o sorteio equilibrado (busca local vetorizada) com um sorteio aleatório e
+# com o guloso ingênuo: diferença entre o time mais forte e o mais fraco e tempo.
+#
+# Uso: python scripts/bench_sorteio.py [jogadores] [times] [rodadas]
+
+import statistics
+import time
+import numpy as np
+from src.services.sorteio import sortear_times, sortear_times_guloso, desequilibrio
+
+
+def sortear_aleatorio(notas, goleiros, n_times, rng):
+    times = np.empty(len(notas), dtype=np.int64)
+    for classe in (1, 0):
+        indices = rng.permutation(np.flatnonzero(goleiros == classe))
+        times[indices] = np.arange(len(indices)) % n_times
+    return times
+
+
+def main():
+    n_jogadores = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+    n_times = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    rodadas = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+
+    rng = np.random.default_rng(7)
+    resultados = {'aleatório': ([], []), 'guloso': ([], []), 'busca local': ([], [])}
+
+    # Aquecimento (import/alocação do numpy)
+    sortear_times(rng.normal(15, 6, n_jogadores), np.zeros(n_jogadores, dtype=np.int64), n_times)
+
+    for _ in range(rodadas):
+        notas = np.round(rng.normal(15, 7, n_jogadores), 2)
+        goleiros = np.zeros(n_jogadores, dtype=np.int64)
+        goleiros[rng.choice(n_jogadores, n_times, replace=False)] = 1
+
+        for nome, fn in (
+            ('aleatório', lambda: sortear_aleatorio(notas, goleiros, n_times, rng)),
+            ('guloso', lambda: sortear_times_guloso(notas, goleiros, n_times)),
+            ('busca local', lambda: sortear_times(notas, goleiros, n_times)),
+        ):
+            inicio = time.perf_counter()
+            times = fn()
+            duracao = (time.perf_counter() - inicio) * 1000
+            resultados[nome][0].append(desequilibrio(notas, times, n_times))
+            resultados[nome][1].append(duracao)
+
+    print(f'{n_jogadores} jogadores, {n_times} times, {rodadas} sorteios\n')
+    print(f"{'método':<14}{'diferença média':>17}{'pior diferença':>16}{'tempo médio (ms)':>18}{'p95 (ms)':>10}")
+    for nome, (diferencas, tempos) in resultados.items():
+        p95 = sorted(tempos)[int(len(tempos) * 0.95) - 1]
+        print(f'{nome:<14}{statistics.mean(diferencas):>17.3f}{max(diferencas):>16.3f}'
+              f'{statistics.mean(tempos):>18.2f}{p95:>10.2f}')
+
+
+if __name__ == '__main__':
+    main()
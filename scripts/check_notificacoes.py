@@ -0,0 +1,129 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Confere o envio de notificações contra um servidor SMTP local de mentira.
+#
+# Cria uma pelada com vários membros, marca duas partidas para as próximas horas
+# e roda a fila: cada membro deve receber um único e-mail com as duas novas
+# partidas (resumo) e, depois do agendador de lembretes, um segundo e-mail com
+# os lembretes de presença. Mostra quantas conexões SMTP foram abertas (uma por
+# lote) e quantas mensagens cada membro recebeu.
+#
+# Uso: python scripts/check_notificacoes.py [membros]
+
+import socketserver
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime, timedelta
+
+
+class SMTPDeMentira(socketserver.StreamRequestHandler):
+    # Só o suficiente do protocolo para o smtplib: EHLO, MAIL, RCPT, DATA, QUIT
+    mensagens = []
+    conexoes = 0
+
+    def responder(self, linha):
+        self.wfile.write(linha.encode() + b'\r\n')
+
+    def handle(self):
+        SMTPDeMentira.conexoes += 1
+        self.responder('220 localhost')
+        destinatarios = []
+        while True:
+            linha = self.rfile.readline().decode().strip()
+            comando = linha[:4].upper()
+            if not linha or comando == 'QUIT':
+                self.responder('221 tchau')
+                return
+            if comando in ('EHLO', 'HELO'):
+                self.responder('250 localhost')
+            elif comando == 'RCPT':
+                destinatarios.append(linha.split(':', 1)[1].strip('<> '))
+                self.responder('250 ok')
+            elif comando == 'DATA':
+                self.responder('354 pode mandar')
+                corpo = []
+                while True:
+                    parte = self.rfile.readline().decode()
+                    if parte.rstrip('\r\n') == '.':
+                        break
+                    corpo.append(parte)
+                SMTPDeMentira.mensagens.append((destinatarios, ''.join(corpo)))
+                destinatarios = []
+                self.responder('250 recebida')
+            else:
+                self.responder('250 ok')
+
+
+def main():
+    from src.main import create_app, init_db
+    from src.models.user import db, User, MembroPelada
+    from src.services.jobs import executar_pendentes
+    from src.services.notificacoes import agendar_lembretes
+
+    membros = int(sys.argv[1]) if len(sys.argv) > 1 else 40
+
+    servidor = socketserver.ThreadingTCPServer(('127.0.0.1', 0), SMTPDeMentira)
+    threading.Thread(target=servidor.serve_forever, daemon=True).start()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'notificacoes.db')}",
+            'TESTING': True,
+            'SMTP_HOST': '127.0.0.1',
+            'SMTP_PORT': servidor.server_address[1],
+            'SMTP_TLS': False,
+            'NOTIFICACOES_JANELA': 0,
+            'NOTIFICACOES_LOTE': 25,
+        })
+        init_db(app)
+
+        admin = app.test_client()
+        admin.post('/api/auth/register', json={'nome': 'Admin', 'email': 'admin@teste', 'senha': 'x', 'posicao': 'Goleiro'})
+        pelada_id = admin.post('/api/peladas/create', json={'nome': 'Pelada', 'local': 'Quadra', 'descricao': 'Teste'}).get_json()['pelada']['id']
+        with app.app_context():
+            usuarios = [str(uuid.uuid4()) for _ in range(membros)]
+            db.session.execute(User.__table__.insert(), [
+                {'id': u, 'nome': f'Jogador {i}', 'email': f'j{i}@teste', 'senha_hash': 'x', 'posicao': 'Atacante'}
+                for i, u in enumerate(usuarios)
+            ])
+            db.session.execute(MembroPelada.__table__.insert(), [
+                {'usuario_id': u, 'pelada_id': pelada_id, 'is_admin': False} for u in usuarios
+            ])
+            db.session.commit()
+
+        daqui_a_pouco = datetime.now() + timedelta(hours=3)
+        for minutos in (0, 60):
+            inicio = daqui_a_pouco + timedelta(minutes=minutos)
+            admin.post('/api/partidas/create', json={
+                'pelada_id': pelada_id, 'data_partida': inicio.strftime('%Y-%m-%d'), 'hora_inicio': inicio.strftime('%H:%M')
+            })
+
+        with app.app_context():
+            inicio = time.perf_counter()
+            executar_pendentes()
+            rodada1 = (len(SMTPDeMentira.mensagens), SMTPDeMentira.conexoes, time.perf_counter() - inicio)
+
+            agendar_lembretes()
+            db.session.commit()
+            executar_pendentes()
+
+    servidor.shutdown()
+    # O admin que marcou as partidas só recebe o lembrete
+    por_membro = Counter(d for destinatarios, _ in SMTPDeMentira.mensagens for d in destinatarios if d != 'admin@teste')
+    resumo = next(corpo for _, corpo in SMTPDeMentira.mensagens).replace('\r\n', '\n')
+
+    print(f'{membros} membros, 2 partidas novas')
+    print(f'novas partidas: {rodada1[0]} e-mails em {rodada1[1]} conexões SMTP ({rodada1[2]:.2f}s)')
+    print(f'com lembretes: {len(SMTPDeMentira.mensagens)} e-mails em {SMTPDeMentira.conexoes} conexões SMTP')
+    print(f'e-mails por membro: {sorted(set(por_membro.values()))} (esperado [2])')
+    print('exemplo de resumo:')
+    print(resumo.split('\n\n', 1)[1].strip())
+
+
+if __name__ == '__main__':
+    main()
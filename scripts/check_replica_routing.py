@@ -0,0 +1,72 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Demonstra o roteamento primário/réplica localmente com dois arquivos SQLite
+# (ou dois PostgreSQL locais, via PRIMARY_URL e REPLICA_URL).
+#
+# A "replicação" é simulada: a réplica só recebe os dados quando o script copia
+# o primário para ela. Assim dá para ver de qual banco cada leitura veio.
+
+import shutil
+import sqlite3
+import tempfile
+import time
+from src.main import create_app, init_db
+
+PIN_SECONDS = 1
+
+
+def verificar(descricao, resposta, esperado):
+    ok = resposta.status_code == esperado
+    print(f"[{'OK' if ok else 'FALHOU'}] {descricao}: HTTP {resposta.status_code} (esperado {esperado})")
+    return ok
+
+
+def main():
+    tmp = tempfile.mkdtemp()
+    primario = os.environ.get('PRIMARY_URL', f"sqlite:///{os.path.join(tmp, 'primario.db')}")
+    replica = os.environ.get('REPLICA_URL', f"sqlite:///{os.path.join(tmp, 'replica.db')}")
+
+    # Schema nos dois bancos; a réplica começa vazia
+    init_db(create_app({'SQLALCHEMY_DATABASE_URI': replica}))
+    app = create_app({
+        'SQLALCHEMY_DATABASE_URI': primario,
+        'SQLALCHEMY_BINDS': {'replica': replica},
+        'REPLICA_PIN_SECONDS': PIN_SECONDS,
+        'TESTING': True,
+    })
+    init_db(app)
+
+    client = app.test_client()
+    resultados = []
+
+    resposta = client.post('/api/auth/register', json={
+        'nome': 'Réplica', 'email': 'replica@teste', 'senha': 'senha', 'posicao': 'Atacante'
+    })
+    resultados.append(verificar('POST de cadastro grava no primário', resposta, 201))
+    # /api/auth/me vem do contexto guardado na sessão; o card lê o usuário do banco
+    card = f"/api/ranking/user/{resposta.get_json()['user']['id']}/card"
+
+    resposta = client.get(card)
+    resultados.append(verificar('GET logo após escrever lê do primário (sessão fixada)', resposta, 200))
+
+    time.sleep(PIN_SECONDS + 0.2)
+    resposta = client.get(card)
+    resultados.append(verificar('GET após o prazo lê da réplica (ainda sem o usuário)', resposta, 404))
+
+    if primario.startswith('sqlite') and replica.startswith('sqlite'):
+        origem = sqlite3.connect(primario.replace('sqlite:///', ''))
+        destino = sqlite3.connect(replica.replace('sqlite:///', ''))
+        origem.backup(destino)
+        origem.close()
+        destino.close()
+        resposta = client.get(card)
+        resultados.append(verificar('GET depois da "replicação" encontra o usuário na réplica', resposta, 200))
+
+    shutil.rmtree(tmp, ignore_errors=True)
+    return 0 if all(resultados) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
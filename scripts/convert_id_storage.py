@@ -0,0 +1,79 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Copia um banco existente para um novo banco com outro modo de armazenamento de IDs.
+#
+# Uso:
+#   python scripts/convert_id_storage.py <url_origem> <url_destino> [compacto|texto]
+#
+# O banco de origem é lido por reflexão (qualquer formato de ID); o destino é criado
+# com os modelos atuais no modo escolhido. Depois da conversão, aponte DATABASE_URL
+# para o destino e defina ID_STORAGE com o mesmo modo.
+
+import time
+import uuid
+from sqlalchemy import create_engine, MetaData, select
+from src.main import create_app, init_db
+from src.models.user import db
+from src.models.types import UUIDKey
+
+CHUNK = 1000
+
+
+def _normalizar_id(valor):
+    if isinstance(valor, (bytes, memoryview)):
+        return str(uuid.UUID(bytes=bytes(valor)))
+    if isinstance(valor, uuid.UUID):
+        return str(valor)
+    return valor
+
+
+def converter(url_origem, url_destino, modo):
+    origem = create_engine(url_origem)
+    refletido = MetaData()
+    refletido.reflect(bind=origem)
+
+    app = create_app({'SQLALCHEMY_DATABASE_URI': url_destino, 'ID_STORAGE': modo})
+    init_db(app)
+
+    total = 0
+    inicio = time.perf_counter()
+    with app.app_context(), origem.connect() as conn_origem, db.engine.begin() as conn_destino:
+        # sorted_tables respeita as chaves estrangeiras (pais antes dos filhos)
+        for tabela in db.metadata.sorted_tables:
+            if tabela.name not in refletido.tables:
+                continue
+
+            colunas_id = {c.name for c in tabela.columns if isinstance(c.type, UUIDKey)}
+            colunas = [c.name for c in tabela.columns if c.name in refletido.tables[tabela.name].c]
+            resultado = conn_origem.execution_options(stream_results=True).execute(
+                select(*[refletido.tables[tabela.name].c[c] for c in colunas])
+            )
+
+            copiadas = 0
+            while True:
+                linhas = resultado.fetchmany(CHUNK)
+                if not linhas:
+                    break
+                lote = []
+                for linha in linhas:
+                    registro = dict(zip(colunas, linha))
+                    for coluna in colunas_id:
+                        registro[coluna] = _normalizar_id(registro.get(coluna))
+                    lote.append(registro)
+                conn_destino.execute(tabela.insert(), lote)
+                copiadas += len(lote)
+
+            total += copiadas
+            print(f'{tabela.name}: {copiadas} linhas')
+
+    duracao = time.perf_counter() - inicio
+    print(f'{total} linhas convertidas para o modo {modo} em {duracao:.2f}s')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3:
+        print('Uso: python scripts/convert_id_storage.py <url_origem> <url_destino> [compacto|texto]')
+        sys.exit(1)
+    converter(sys.argv[1], sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else 'compacto')
@@ -0,0 +1,97 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Mostra o plano de execução (EXPLAIN) das consultas mais frequentes e confere
+# se cada uma usa o índice esperado.
+#
+# Uso: DATABASE_URL=... python scripts/explain_hot_queries.py
+# Sem DATABASE_URL usa o SQLite local de desenvolvimento.
+
+from sqlalchemy import select
+from src.main import create_app, init_db
+from src.models.user import (db, MembroPelada, Partida, EstatisticaJogadorPartida,
+                             AvaliacaoPartida, Financeiro, SolicitacaoPelada)
+
+ID = '00000000-0000-0000-0000-000000000000'
+
+HOT_QUERIES = [
+    (
+        'Partidas da pelada por data',
+        select(Partida).where(Partida.pelada_id == ID).order_by(Partida.data_partida.desc()),
+        'ix_partida_pelada_data',
+    ),
+    (
+        'Partidas concluídas da pelada (ranking)',
+        select(Partida.id).where(Partida.pelada_id == ID, Partida.status == 'concluida'),
+        'ix_partida_pelada_status_data',
+    ),
+    (
+        'Partidas por status e data',
+        select(Partida.id).where(Partida.status == 'agendada', Partida.data_partida >= '2024-01-01'),
+        'ix_partida_status_data',
+    ),
+    (
+        'Estatísticas do jogador',
+        select(EstatisticaJogadorPartida).where(EstatisticaJogadorPartida.usuario_id == ID),
+        'ix_estatistica_usuario',
+    ),
+    (
+        'Votos recebidos pelo jogador',
+        select(AvaliacaoPartida).where(AvaliacaoPartida.avaliado_id == ID,
+                                       AvaliacaoPartida.tipo_avaliacao == 'mvp'),
+        'ix_avaliacao_avaliado',
+    ),
+    (
+        'Movimentos financeiros da pelada',
+        select(Financeiro).where(Financeiro.pelada_id == ID).order_by(Financeiro.data_movimento.desc()),
+        'ix_financeiro_pelada_data',
+    ),
+    (
+        'Solicitações pendentes da pelada',
+        select(SolicitacaoPelada).where(SolicitacaoPelada.pelada_id == ID,
+                                        SolicitacaoPelada.status == 'pendente'),
+        'ix_solicitacao_pelada_status',
+    ),
+    (
+        'Membros da pelada',
+        select(MembroPelada).where(MembroPelada.pelada_id == ID),
+        'ix_membro_pelada_pelada',
+    ),
+]
+
+
+def explain(conn, stmt):
+    sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+    if conn.dialect.name == 'sqlite':
+        rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + sql).fetchall()
+        return [row[-1] for row in rows]
+    # Com tabelas pequenas o PostgreSQL prefere seq scan; desligamos para ver se o índice serve
+    conn.exec_driver_sql('SET LOCAL enable_seqscan = off')
+    rows = conn.exec_driver_sql('EXPLAIN ' + sql).fetchall()
+    return [row[0] for row in rows]
+
+
+def main():
+    app = create_app()
+    init_db(app)
+
+    falhas = 0
+    with app.app_context():
+        with db.engine.begin() as conn:
+            print(f'Banco: {conn.dialect.name}\n')
+            for nome, stmt, indice in HOT_QUERIES:
+                plano = explain(conn, stmt)
+                ok = any(indice in linha for linha in plano)
+                falhas += 0 if ok else 1
+                print(f"[{'OK' if ok else 'FALHOU'}] {nome} (esperado: {indice})")
+                for linha in plano:
+                    print(f'    {linha}')
+                print()
+
+    print(f'{len(HOT_QUERIES) - falhas}/{len(HOT_QUERIES)} consultas usando índice')
+    return 1 if falhas else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,110 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Teste de carga da confirmação de presença no SQLite com várias threads.
+#
+# Para cada número de threads, cada thread (um jogador logado) confirma e desconfirma
+# presença repetidamente em partidas da mesma pelada. Mostra a vazão e quantas
+# requisições falharam (ex.: "database is locked"), com e sem a fila de escrita.
+#
+# Uso: python scripts/load_confirm_presence.py [requisicoes_por_thread]
+
+import subprocess
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, time as dtime
+
+THREADS = (1, 2, 4, 8, 16)
+N_PARTIDAS = 10
+
+
+def preparar(app):
+    from src.models.user import db, User, Pelada, MembroPelada, Partida, PresencaPartida
+
+    usuarios = [str(uuid.uuid4()) for _ in range(max(THREADS))]
+    pelada = str(uuid.uuid4())
+    partidas = [str(uuid.uuid4()) for _ in range(N_PARTIDAS)]
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [
+            {'id': u, 'nome': f'Jogador {i}', 'email': f'j{i}@carga', 'senha_hash': 'x', 'posicao': 'Meio Campo'}
+            for i, u in enumerate(usuarios)
+        ])
+        db.session.execute(Pelada.__table__.insert(), [
+            {'id': pelada, 'nome': 'Pelada de carga', 'local': 'Quadra', 'admin_id': usuarios[0]}
+        ])
+        db.session.execute(MembroPelada.__table__.insert(), [
+            {'usuario_id': u, 'pelada_id': pelada, 'is_admin': False} for u in usuarios
+        ])
+        db.session.execute(Partida.__table__.insert(), [
+            {'id': p, 'pelada_id': pelada, 'data_partida': date(2030, 1, 1), 'hora_inicio': dtime(20, 0)}
+            for p in partidas
+        ])
+        db.session.execute(PresencaPartida.__table__.insert(), [
+            {'partida_id': p, 'usuario_id': u} for p in partidas for u in usuarios
+        ])
+        db.session.commit()
+    return usuarios, partidas
+
+
+def rodar(app, usuarios, partidas, n_threads, por_thread):
+    erros = []
+    barreira = threading.Barrier(n_threads + 1)
+
+    def jogador(usuario_id):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = usuario_id
+        barreira.wait()
+        for i in range(por_thread):
+            confirmacao = 'confirmado' if i % 2 == 0 else 'nao_confirmado'
+            resposta = client.post(f'/api/partidas/{partidas[i % len(partidas)]}/confirm-presence',
+                                   json={'confirmacao': confirmacao})
+            if resposta.status_code != 200:
+                erros.append(resposta.get_json().get('error'))
+
+    threads = [threading.Thread(target=jogador, args=(usuarios[i],)) for i in range(n_threads)]
+    for t in threads:
+        t.start()
+    barreira.wait()
+    inicio = time.perf_counter()
+    for t in threads:
+        t.join()
+    duracao = time.perf_counter() - inicio
+    return n_threads * por_thread / duracao, erros
+
+
+def medir(fila, por_thread):
+    from src.main import create_app, init_db
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = create_app({
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{os.path.join(tmp, 'carga.db')}",
+            'SQLITE_WRITE_QUEUE': fila,
+            # Mede o banco sob rajada: sem os limites por rota
+            'LIMITES_ROTAS': {},
+            'TESTING': True,
+        })
+        init_db(app)
+        usuarios, partidas = preparar(app)
+
+        print(f"Fila de escrita: {'ligada' if fila else 'desligada'}")
+        print(f"{'threads':>8}{'req/s':>10}{'erros':>8}")
+        for n in THREADS:
+            vazao, erros = rodar(app, usuarios, partidas, n, por_thread)
+            print(f'{n:>8}{vazao:>10.0f}{len(erros):>8}')
+            if erros:
+                print(f'          ex.: {erros[0]}')
+        print()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 2 and sys.argv[1] == '--medir':
+        medir(sys.argv[2] == '1', int(sys.argv[3]))
+    else:
+        por_thread = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+        # Um processo por configuração: a fila é registrada por engine no create_app
+        for fila in ('0', '1'):
+            subprocess.run([sys.executable, __file__, '--medir', fila, str(por_thread)], check=True)
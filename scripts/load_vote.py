@@ -0,0 +1,125 @@
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Teste de carga da votação com toques duplos simultâneos.
+#
+# Cada jogador é usado por duas threads ao mesmo tempo, que votam nas mesmas
+# partidas (como dois toques no botão). Ao final confere no banco que cada
+# jogador tem exatamente um voto de cada tipo por partida e que a apuração
+# parcial bate com os votos gravados. Mostra a vazão da rota de votação.
+#
+# Uso: python scripts/load_vote.py [jogadores] [partidas] [DATABASE_URL]
+
+import tempfile
+import threading
+import time
+import uuid
+from datetime import date, time as dtime
+from sqlalchemy import func
+
+
+def preparar(app, n_jogadores, n_partidas):
+    from src.models.user import db, User, Pelada, MembroPelada, Partida, PresencaPartida
+
+    usuarios = [str(uuid.uuid4()) for _ in range(n_jogadores)]
+    pelada = str(uuid.uuid4())
+    partidas = [str(uuid.uuid4()) for _ in range(n_partidas)]
+    with app.app_context():
+        db.session.execute(User.__table__.insert(), [
+            {'id': u, 'nome': f'Jogador {i}', 'email': f'{u}@carga', 'senha_hash': 'x', 'posicao': 'Meio Campo'}
+            for i, u in enumerate(usuarios)
+        ])
+        db.session.execute(Pelada.__table__.insert(), [
+            {'id': pelada, 'nome': f'Votação {pelada}', 'local': 'Quadra', 'admin_id': usuarios[0]}
+        ])
+        db.session.execute(MembroPelada.__table__.insert(), [
+            {'usuario_id': u, 'pelada_id': pelada, 'is_admin': False} for u in usuarios
+        ])
+        db.session.execute(Partida.__table__.insert(), [
+            {'id': p, 'pelada_id': pelada, 'data_partida': date(2030, 1, 1), 'hora_inicio': dtime(20, 0),
+             'status': 'avaliacao'}
+            for p in partidas
+        ])
+        db.session.execute(PresencaPartida.__table__.insert(), [
+            {'partida_id': p, 'usuario_id': u, 'confirmacao': 'confirmado'} for p in partidas for u in usuarios
+        ])
+        db.session.commit()
+    return usuarios, partidas
+
+
+def rodar(app, usuarios, partidas):
+    respostas = {}
+    lock = threading.Lock()
+    barreira = threading.Barrier(2 * len(usuarios) + 1)
+
+    def toque(i):
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['user_id'] = usuarios[i]
+        voto = {'mvp_id': usuarios[(i + 1) % len(usuarios)], 'bola_murcha_id': usuarios[(i + 2) % len(usuarios)]}
+        barreira.wait()
+        for partida in partidas:
+            resposta = client.post(f'/api/partidas/{partida}/vote', json=voto)
+            with lock:
+                chave = (resposta.status_code, (resposta.get_json() or {}).get('error'))
+                respostas[chave] = respostas.get(chave, 0) + 1
+
+    threads = [threading.Thread(target=toque, args=(i // 2,)) for i in range(2 * len(usuarios))]
+    for t in threads:
+        t.start()
+    barreira.wait()
+    inicio = time.perf_counter()
+    for t in threads:
+        t.join()
+    return respostas, time.perf_counter() - inicio
+
+
+def conferir(app, partidas):
+    from src.models.user import db, AvaliacaoPartida, ApuracaoVoto
+
+    with app.app_context():
+        duplicados = db.session.query(
+            AvaliacaoPartida.partida_id, AvaliacaoPartida.avaliador_id, AvaliacaoPartida.tipo_avaliacao
+        ).filter(
+            AvaliacaoPartida.partida_id.in_(partidas)
+        ).group_by(
+            AvaliacaoPartida.partida_id, AvaliacaoPartida.avaliador_id, AvaliacaoPartida.tipo_avaliacao
+        ).having(func.count() > 1).count()
+        votos = dict(db.session.query(AvaliacaoPartida.tipo_avaliacao, func.count()).filter(
+            AvaliacaoPartida.partida_id.in_(partidas)
+        ).group_by(AvaliacaoPartida.tipo_avaliacao).all())
+        apurados = dict(db.session.query(ApuracaoVoto.tipo_avaliacao, func.sum(ApuracaoVoto.votos)).filter(
+            ApuracaoVoto.partida_id.in_(partidas)
+        ).group_by(ApuracaoVoto.tipo_avaliacao).all())
+    return duplicados, votos, apurados
+
+
+def main():
+    from src.main import create_app, init_db
+
+    n_jogadores = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    n_partidas = int(sys.argv[2]) if len(sys.argv) > 2 else 25
+
+    with tempfile.TemporaryDirectory() as tmp:
+        url = sys.argv[3] if len(sys.argv) > 3 else f"sqlite:///{os.path.join(tmp, 'votos.db')}"
+        app = create_app({'SQLALCHEMY_DATABASE_URI': url, 'LIMITES_ROTAS': {}, 'TESTING': True})
+        init_db(app)
+        usuarios, partidas = preparar(app, n_jogadores, n_partidas)
+
+        respostas, duracao = rodar(app, usuarios, partidas)
+        duplicados, votos, apurados = conferir(app, partidas)
+
+    total = sum(respostas.values())
+    print(f'{n_jogadores} jogadores x 2 threads x {n_partidas} partidas = {total} requisições em {duracao:.2f}s '
+          f'({total / duracao:.0f} req/s)')
+    for (status, erro), quantidade in sorted(respostas.items(), key=lambda r: r[0][0]):
+        print(f'  {status} {erro or "ok"}: {quantidade}')
+    esperado = n_jogadores * n_partidas
+    print(f"votos gravados: mvp={votos.get('mvp', 0)} bola_murcha={votos.get('bola_murcha', 0)} (esperado {esperado} cada)")
+    print(f"apuração parcial: mvp={apurados.get('mvp', 0)} bola_murcha={apurados.get('bola_murcha', 0)}")
+    print(f'votos duplicados: {duplicados}')
+
+
+if __name__ == '__main__':
+    main()
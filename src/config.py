@@ -0,0 +1,156 @@
+import os
+import json
+import multiprocessing
+from datetime import timedelta
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def _env_int(name, default):
+    valor = os.environ.get(name)
+    return int(valor) if valor else default
+
+
+# Regras padrão de src/services/limites.py; LIMITES_ROTAS (JSON) substitui todas
+LIMITES_ROTAS_PADRAO = {
+    'partidas.vote_partida': {'usuario': {'taxa': 1, 'rajada': 5}, 'pelada': {'taxa': 20, 'rajada': 60}, 'concorrencia': 8},
+    'partidas.confirm_presence': {'usuario': {'taxa': 1, 'rajada': 5}, 'pelada': {'taxa': 20, 'rajada': 60}, 'concorrencia': 8},
+    'partidas.update_presence': {'usuario': {'taxa': 1, 'rajada': 10}, 'concorrencia': 4},
+    'partidas.update_presences': {'usuario': {'taxa': 0.5, 'rajada': 5}, 'concorrencia': 4},
+    'partidas.add_lance': {'usuario': {'taxa': 2, 'rajada': 10}, 'pelada': {'taxa': 5, 'rajada': 30}},
+    'partidas.add_statistics': {'usuario': {'taxa': 0.2, 'rajada': 3}, 'pelada': {'taxa': 0.5, 'rajada': 5}, 'concorrencia': 2},
+}
+
+
+def worker_count():
+    # Regra usual do gunicorn: (2 x CPUs) + 1, limitada para não estourar conexões do banco
+    padrao = min(multiprocessing.cpu_count() * 2 + 1, 12)
+    return _env_int('WEB_CONCURRENCY', padrao)
+
+
+def thread_count():
+    # Threads por worker: as rotas passam a maior parte do tempo esperando o banco
+    padrao = max(2, min(multiprocessing.cpu_count() * 2, 8))
+    return _env_int('GUNICORN_THREADS', padrao)
+
+
+def database_url():
+    database_url = os.environ.get('DATABASE_URL')
+    if database_url:
+        # Railway PostgreSQL
+        return database_url
+    # SQLite local para desenvolvimento
+    return f"sqlite:///{os.path.join(BASE_DIR, 'database', 'app.db')}"
+
+
+def engine_options(url):
+    if url.startswith('sqlite'):
+        if url in ('sqlite://', 'sqlite:///:memory:'):
+            return {}
+        # Perfil SQLite (pragmas em src/database/sqlite.py): conexões compartilhadas entre threads
+        return {
+            'connect_args': {
+                'timeout': _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000) / 1000,
+                'check_same_thread': False,
+            },
+            'pool_size': _env_int('DB_POOL_SIZE', thread_count()),
+            'max_overflow': _env_int('DB_MAX_OVERFLOW', 2),
+            'pool_timeout': _env_int('DB_POOL_TIMEOUT', 10),
+        }
+
+    # Cada worker tem seu próprio pool: uma conexão por thread, com pequena folga
+    return {
+        'pool_size': _env_int('DB_POOL_SIZE', thread_count()),
+        'max_overflow': _env_int('DB_MAX_OVERFLOW', 2),
+        'pool_timeout': _env_int('DB_POOL_TIMEOUT', 10),
+        'pool_recycle': _env_int('DB_POOL_RECYCLE', 1800),
+        'pool_pre_ping': True,
+    }
+
+
+def replica_binds(url):
+    # Réplica de leitura opcional: rotas GET leem dela (src/database/routing.py)
+    if not url:
+        return {}
+    return {'replica': {'url': url, **engine_options(url)}}
+
+
+class Config:
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'asdf#FGSgvasgf$5$WGT')
+    SQLALCHEMY_DATABASE_URI = database_url()
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI)
+    SQLALCHEMY_BINDS = replica_binds(os.environ.get('DATABASE_REPLICA_URL'))
+    SQLALCHEMY_TRACK_MODIFICATIONS = False
+    # Segundos que a sessão lê do primário depois de escrever (read-your-writes)
+    REPLICA_PIN_SECONDS = _env_int('REPLICA_PIN_SECONDS', 5)
+    # Intervalo (s) em que o canal ao vivo de cada worker busca lances gravados por outros workers
+    AO_VIVO_INTERVALO = _env_int('AO_VIVO_INTERVALO', 2)
+    # Fila de tarefas (src/services/jobs.py): threads do executor em cada processo (0 desliga)
+    JOBS_WORKER_THREADS = _env_int('JOBS_WORKER_THREADS', 2)
+    JOBS_INTERVALO = _env_int('JOBS_INTERVALO', 1)
+    JOBS_MAX_TENTATIVAS = _env_int('JOBS_MAX_TENTATIVAS', 5)
+    JOBS_BACKOFF_SEGUNDOS = _env_int('JOBS_BACKOFF_SEGUNDOS', 5)
+    JOBS_LEASE_SEGUNDOS = _env_int('JOBS_LEASE_SEGUNDOS', 300)
+    JOBS_RETENCAO_DIAS = _env_int('JOBS_RETENCAO_DIAS', 7)
+    # E-mails de quem opera a instância: métricas da fila e tarefas do sistema
+    JOBS_OPERADORES = [e.strip().lower() for e in os.environ.get('JOBS_OPERADORES', '').split(',') if e.strip()]
+    # Notificações (src/services/notificacoes.py): SMTP e/ou Web Push (VAPID)
+    SMTP_HOST = os.environ.get('SMTP_HOST', '')
+    SMTP_PORT = _env_int('SMTP_PORT', 587)
+    SMTP_USUARIO = os.environ.get('SMTP_USUARIO', '')
+    SMTP_SENHA = os.environ.get('SMTP_SENHA', '')
+    SMTP_TLS = os.environ.get('SMTP_TLS', '1') == '1'
+    SMTP_REMETENTE = os.environ.get('SMTP_REMETENTE', 'O Rei da Pelada <nao-responda@reidapelada.com>')
+    VAPID_PRIVATE_KEY = os.environ.get('VAPID_PRIVATE_KEY', '')
+    VAPID_EMAIL = os.environ.get('VAPID_EMAIL', 'contato@reidapelada.com')
+    NOTIFICACOES_JANELA = _env_int('NOTIFICACOES_JANELA', 60)
+    NOTIFICACOES_LOTE = _env_int('NOTIFICACOES_LOTE', 500)
+    NOTIFICACOES_LEMBRETE_HORAS = _env_int('NOTIFICACOES_LEMBRETE_HORAS', 24)
+    NOTIFICACOES_INTERVALO = _env_int('NOTIFICACOES_INTERVALO', 900)
+    # Feed de calendário (src/services/calendario.py)
+    CALENDARIO_FUSO = os.environ.get('CALENDARIO_FUSO', 'America/Sao_Paulo')
+    CALENDARIO_DIAS_PASSADOS = _env_int('CALENDARIO_DIAS_PASSADOS', 30)
+    CALENDARIO_DURACAO_MINUTOS = _env_int('CALENDARIO_DURACAO_MINUTOS', 90)
+    CALENDARIO_CACHE_MAX = _env_int('CALENDARIO_CACHE_MAX', 2000)
+    CALENDARIO_MAX_AGE = _env_int('CALENDARIO_MAX_AGE', 300)
+    # Hash de senhas (src/services/senhas.py): método/custo do Werkzeug e pool de processos por worker
+    SENHA_METODO = os.environ.get('SENHA_METODO', 'scrypt:32768:8:1')
+    SENHA_PROCESSOS = _env_int('SENHA_PROCESSOS', 1)
+    SENHA_FILA_MAX = _env_int('SENHA_FILA_MAX', 32)
+    SENHA_ESPERA_SEGUNDOS = _env_int('SENHA_ESPERA_SEGUNDOS', 2)
+    # Sessões no servidor (src/services/sessoes.py): 'banco' ou 'memoria' (um único processo)
+    SESSAO_BACKEND = os.environ.get('SESSAO_BACKEND', 'banco')
+    PERMANENT_SESSION_LIFETIME = timedelta(days=_env_int('SESSAO_DIAS', 30))
+    SESSAO_CACHE_SEGUNDOS = _env_int('SESSAO_CACHE_SEGUNDOS', 30)
+    SESSAO_CACHE_MAX = _env_int('SESSAO_CACHE_MAX', 10000)
+    SESSAO_TOQUE_SEGUNDOS = _env_int('SESSAO_TOQUE_SEGUNDOS', 300)
+    SESSAO_LIMPEZA_INTERVALO = _env_int('SESSAO_LIMPEZA_INTERVALO', 3600)
+    # Limites por rota (src/services/limites.py): baldes na 'memoria' do worker ou no 'banco'
+    LIMITES_BACKEND = os.environ.get('LIMITES_BACKEND', 'memoria')
+    LIMITES_ROTAS = json.loads(os.environ['LIMITES_ROTAS']) if os.environ.get('LIMITES_ROTAS') else LIMITES_ROTAS_PADRAO
+    LIMITES_LIMPEZA_INTERVALO = _env_int('LIMITES_LIMPEZA_INTERVALO', 3600)
+    # Idempotency-Key (src/services/idempotencia.py): rotas aceitas e por quanto tempo a resposta fica guardada
+    IDEMPOTENCIA_ROTAS = os.environ.get(
+        'IDEMPOTENCIA_ROTAS',
+        'partidas.create_partida,financeiro.add_movimento_financeiro,partidas.vote_partida,peladas.create_pelada'
+    ).split(',')
+    IDEMPOTENCIA_TTL_HORAS = _env_int('IDEMPOTENCIA_TTL_HORAS', 24)
+    IDEMPOTENCIA_ESPERA_SEGUNDOS = _env_int('IDEMPOTENCIA_ESPERA_SEGUNDOS', 10)
+    IDEMPOTENCIA_CACHE_MAX = _env_int('IDEMPOTENCIA_CACHE_MAX', 5000)
+    IDEMPOTENCIA_LIMPEZA_INTERVALO = _env_int('IDEMPOTENCIA_LIMPEZA_INTERVALO', 3600)
+    # Arquivamento (src/services/arquivo.py): temporadas encerradas há mais de N dias saem das tabelas quentes (0 desliga)
+    ARQUIVO_HORIZONTE_DIAS = _env_int('ARQUIVO_HORIZONTE_DIAS', 365)
+    ARQUIVO_INTERVALO = _env_int('ARQUIVO_INTERVALO', 86400)
+    ARQUIVO_CACHE_MAX = _env_int('ARQUIVO_CACHE_MAX', 32)
+    # /api/batch: subrequisições por lote e threads do modo paralelo
+    BATCH_MAX_REQUISICOES = _env_int('BATCH_MAX_REQUISICOES', 20)
+    BATCH_THREADS = _env_int('BATCH_THREADS', 4)
+    # texto (VARCHAR(36)) ou compacto (UUID nativo / BLOB de 16 bytes); veja src/models/types.py
+    ID_STORAGE = os.environ.get('ID_STORAGE', 'texto')
+
+    # Perfil SQLite (usado apenas quando o banco é SQLite)
+    SQLITE_BUSY_TIMEOUT_MS = _env_int('SQLITE_BUSY_TIMEOUT_MS', 5000)
+    SQLITE_MMAP_SIZE = _env_int('SQLITE_MMAP_SIZE', 256 * 1024 * 1024)
+    SQLITE_CACHE_SIZE_KB = _env_int('SQLITE_CACHE_SIZE_KB', 64 * 1024)
+    SQLITE_WRITE_QUEUE = os.environ.get('SQLITE_WRITE_QUEUE', '0') == '1'
+    SQLITE_WRITE_QUEUE_TIMEOUT = _env_int('SQLITE_WRITE_QUEUE_TIMEOUT', 30)
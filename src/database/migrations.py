@@ -0,0 +1,138 @@
+from datetime import datetime
+from sqlalchemy import inspect, text
+from src.models.user import (db, User, Pelada, MembroPelada, Partida, EstatisticaJogadorPartida,
+                             AvaliacaoPartida, Financeiro, SolicitacaoPelada, Job)
+
+# Migrações versionadas do schema.
+#
+# Bancos novos são criados por db.create_all() a partir dos modelos; bancos já
+# existentes recebem as alterações pelas migrações abaixo. Cada migração precisa
+# ser idempotente (checkfirst / IF NOT EXISTS), pois em um banco novo os objetos
+# já foram criados pelo create_all().
+
+MIGRATIONS = []
+
+
+def migration(version, descricao):
+    def decorator(fn):
+        MIGRATIONS.append((version, descricao, fn))
+        MIGRATIONS.sort(key=lambda m: m[0])
+        return fn
+    return decorator
+
+
+def _criar_indice(conn, model, nome):
+    indice = next(i for i in model.__table__.indexes if i.name == nome)
+    indice.create(conn, checkfirst=True)
+
+
+def _adicionar_coluna(conn, model, nome):
+    tabela = model.__table__
+    if nome in {c['name'] for c in inspect(conn).get_columns(tabela.name)}:
+        return False
+    coluna = tabela.c[nome]
+    preparer = conn.dialect.identifier_preparer
+    conn.execute(text(
+        f'ALTER TABLE {preparer.format_table(tabela)} '
+        f'ADD COLUMN {preparer.format_column(coluna)} {coluna.type.compile(dialect=conn.dialect)}'
+    ))
+    return True
+
+
+@migration(1, 'Índices para as consultas mais frequentes')
+def _indices_consultas_frequentes(conn):
+    _criar_indice(conn, MembroPelada, 'ix_membro_pelada_pelada')
+    _criar_indice(conn, Partida, 'ix_partida_pelada_data')
+    _criar_indice(conn, Partida, 'ix_partida_pelada_status_data')
+    _criar_indice(conn, Partida, 'ix_partida_status_data')
+    _criar_indice(conn, EstatisticaJogadorPartida, 'ix_estatistica_usuario')
+    _criar_indice(conn, AvaliacaoPartida, 'ix_avaliacao_avaliado')
+    _criar_indice(conn, Financeiro, 'ix_financeiro_pelada_data')
+    _criar_indice(conn, SolicitacaoPelada, 'ix_solicitacao_pelada_status')
+
+
+@migration(2, 'Voto único por tipo, jogador e partida')
+def _voto_unico(conn):
+    # Remove votos duplicados deixados pela corrida entre checagem e inserção
+    conn.execute(text(
+        'DELETE FROM avaliacao_partida WHERE EXISTS ('
+        'SELECT 1 FROM avaliacao_partida a2 '
+        'WHERE a2.partida_id = avaliacao_partida.partida_id '
+        'AND a2.avaliador_id = avaliacao_partida.avaliador_id '
+        'AND a2.tipo_avaliacao = avaliacao_partida.tipo_avaliacao '
+        'AND a2.avaliado_id < avaliacao_partida.avaliado_id)'
+    ))
+    _criar_indice(conn, AvaliacaoPartida, 'uq_avaliacao_voto')
+    # Apuração parcial das partidas já votadas
+    conn.execute(text(
+        'INSERT INTO apuracao_voto (partida_id, usuario_id, tipo_avaliacao, votos) '
+        'SELECT partida_id, avaliado_id, tipo_avaliacao, COUNT(*) FROM avaliacao_partida '
+        'WHERE NOT EXISTS (SELECT 1 FROM apuracao_voto) '
+        'GROUP BY partida_id, avaliado_id, tipo_avaliacao'
+    ))
+
+
+@migration(3, 'Feed de calendário: token do usuário e marcas de alteração')
+def _feed_calendario(conn):
+    _adicionar_coluna(conn, User, 'token_calendario')
+    _adicionar_coluna(conn, User, 'presencas_alteradas_em')
+    if _adicionar_coluna(conn, Pelada, 'partidas_alteradas_em'):
+        conn.execute(Pelada.__table__.update().values(partidas_alteradas_em=datetime.utcnow()))
+    _criar_indice(conn, User, 'uq_user_token_calendario')
+
+
+@migration(4, 'Arquivamento de temporadas antigas')
+def _arquivamento(conn):
+    if _adicionar_coluna(conn, Partida, 'arquivada'):
+        conn.execute(Partida.__table__.update().values(arquivada=False))
+
+
+@migration(5, 'Marca de agregados aplicados por partida')
+def _agregados_partida(conn):
+    if not _adicionar_coluna(conn, Partida, 'agregados_em'):
+        return
+    # Partidas concluídas já foram somadas, menos as que ainda têm a tarefa na fila
+    na_fila = [chave.split(':', 1)[1] for (chave,) in conn.execute(
+        Job.__table__.select().with_only_columns(Job.chave).where(
+            Job.tipo == 'agregados_partida', Job.status.in_(('pendente', 'executando'))
+        )
+    ) if chave]
+    conn.execute(Partida.__table__.update().where(
+        Partida.status == 'concluida', Partida.id.notin_(na_fila)
+    ).values(agregados_em=datetime.utcnow()))
+
+
+def _garantir_tabela_versoes(conn):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS schema_migrations ('
+        'version INTEGER PRIMARY KEY, '
+        'descricao VARCHAR(200) NOT NULL, '
+        'aplicada_em TIMESTAMP NOT NULL)'
+    ))
+
+
+def applied_versions(conn):
+    _garantir_tabela_versoes(conn)
+    return {row[0] for row in conn.execute(text('SELECT version FROM schema_migrations'))}
+
+
+def upgrade(app):
+    aplicadas = []
+    with app.app_context():
+        db.create_all()
+
+        with db.engine.begin() as conn:
+            ja_aplicadas = applied_versions(conn)
+
+            for version, descricao, fn in MIGRATIONS:
+                if version in ja_aplicadas:
+                    continue
+                fn(conn)
+                conn.execute(
+                    text('INSERT INTO schema_migrations (version, descricao, aplicada_em) '
+                         'VALUES (:version, :descricao, :aplicada_em)'),
+                    {'version': version, 'descricao': descricao, 'aplicada_em': datetime.utcnow()}
+                )
+                aplicadas.append((version, descricao))
+
+    return aplicadas
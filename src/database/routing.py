@@ -0,0 +1,55 @@
+import time
+from flask import current_app, has_request_context, request, session as flask_session
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event
+from sqlalchemy.sql.expression import UpdateBase
+
+# Roteamento de leituras para a réplica.
+#
+# Quando SQLALCHEMY_BINDS tem a chave 'replica' (DATABASE_REPLICA_URL), as consultas
+# feitas durante requisições GET/HEAD vão para a réplica; escritas, flushes e
+# qualquer outra requisição usam o primário. Depois de um commit com escrita, a
+# sessão do usuário fica presa ao primário por REPLICA_PIN_SECONDS para que ele
+# leia o que acabou de gravar, mesmo com atraso de replicação.
+
+REPLICA_BIND = 'replica'
+PIN_KEY = '_primario_ate'
+
+
+def _requisicao_de_leitura():
+    if not has_request_context() or request.method not in ('GET', 'HEAD'):
+        return False
+    return flask_session.get(PIN_KEY, 0) < time.time()
+
+
+class RoutingSession(Session):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if (bind is None
+                and not self._flushing
+                and not self.info.get('escreveu')
+                and not isinstance(clause, UpdateBase)
+                and _requisicao_de_leitura()):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, 'before_flush')
+def _marcar_escrita(session, flush_context, instances):
+    session.info['escreveu'] = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _marcar_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        orm_execute_state.session.info['escreveu'] = True
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _fixar_no_primario(session):
+    if not session.info.get('escreveu') or not has_request_context():
+        return
+    if REPLICA_BIND not in session._db.engines:
+        return
+    flask_session[PIN_KEY] = time.time() + current_app.config['REPLICA_PIN_SECONDS']
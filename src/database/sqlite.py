@@ -0,0 +1,97 @@
+import threading
+from sqlalchemy import event
+from src.models.user import db
+
+# Perfil de produção para SQLite: WAL, synchronous=NORMAL, mmap e busy timeout em
+# cada conexão, e uma fila opcional de escrita única por processo.
+#
+# Em WAL os leitores não bloqueiam o escritor (e vice-versa), mas continua
+# existindo só um escritor por vez. Com SQLITE_WRITE_QUEUE=1 as transações que
+# escrevem entram em uma fila FIFO dentro do processo: as leituras seguem em
+# paralelo e as escritas deixam de disputar o lock do arquivo (o que gerava
+# "database is locked" nos picos de votos e confirmações). Entre processos
+# diferentes o busy_timeout continua fazendo a espera.
+
+_filas = {}
+
+
+class WriteQueue:
+    def __init__(self, timeout=30):
+        self.timeout = timeout
+        self._cond = threading.Condition()
+        self._proxima_senha = 0
+        self._atendendo = 0
+        self._desistentes = set()
+
+    def acquire(self):
+        with self._cond:
+            senha = self._proxima_senha
+            self._proxima_senha += 1
+            if not self._cond.wait_for(lambda: self._atendendo == senha, timeout=self.timeout):
+                self._desistentes.add(senha)
+                raise TimeoutError('Tempo esgotado aguardando a fila de escrita do SQLite')
+
+    def release(self):
+        with self._cond:
+            self._atendendo += 1
+            while self._atendendo in self._desistentes:
+                self._desistentes.discard(self._atendendo)
+                self._atendendo += 1
+            self._cond.notify_all()
+
+
+def _pragmas(config):
+    return [
+        'PRAGMA journal_mode=WAL',
+        'PRAGMA synchronous=NORMAL',
+        f"PRAGMA busy_timeout={config['SQLITE_BUSY_TIMEOUT_MS']}",
+        f"PRAGMA mmap_size={config['SQLITE_MMAP_SIZE']}",
+        f"PRAGMA cache_size=-{config['SQLITE_CACHE_SIZE_KB']}",
+        'PRAGMA temp_store=MEMORY',
+    ]
+
+
+def _entrar_na_fila(session):
+    if '_write_queue' in session.info or not _filas:
+        return
+    # Escritas sempre vão para o engine principal (a réplica, se houver, é só leitura)
+    fila = _filas.get(db.engine)
+    if fila is not None:
+        fila.acquire()
+        session.info['_write_queue'] = fila
+
+
+@event.listens_for(db.session, 'before_flush')
+def _antes_do_flush(session, flush_context, instances):
+    _entrar_na_fila(session)
+
+
+@event.listens_for(db.session, 'do_orm_execute')
+def _antes_de_dml(orm_execute_state):
+    if orm_execute_state.is_insert or orm_execute_state.is_update or orm_execute_state.is_delete:
+        _entrar_na_fila(orm_execute_state.session)
+
+
+@event.listens_for(db.session, 'after_transaction_end')
+def _fim_da_transacao(session, transaction):
+    if transaction.parent is None and '_write_queue' in session.info:
+        session.info.pop('_write_queue').release()
+
+
+def configure_sqlite(app):
+    with app.app_context():
+        for engine in db.engines.values():
+            if engine.dialect.name != 'sqlite' or engine.url.database in (None, '', ':memory:'):
+                continue
+
+            pragmas = _pragmas(app.config)
+
+            @event.listens_for(engine, 'connect')
+            def _configurar_conexao(dbapi_connection, connection_record, pragmas=pragmas):
+                cursor = dbapi_connection.cursor()
+                for pragma in pragmas:
+                    cursor.execute(pragma)
+                cursor.close()
+
+            if app.config['SQLITE_WRITE_QUEUE'] and engine is db.engine:
+                _filas[engine] = WriteQueue(timeout=app.config['SQLITE_WRITE_QUEUE_TIMEOUT'])
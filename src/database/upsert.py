@@ -0,0 +1,35 @@
+from sqlalchemy.dialects import postgresql, sqlite
+from src.models.user import db
+
+# INSERT ... ON CONFLICT para PostgreSQL e SQLite (os dois bancos suportados).
+
+
+def insert_do_dialeto(model, dialeto=None):
+    # INSERT com suporte a ON CONFLICT; sem dialeto, usa o do bind da sessão
+    dialeto = dialeto or db.session.get_bind(mapper=model.__mapper__).dialect.name
+    if dialeto == 'postgresql':
+        return postgresql.insert(model.__table__)
+    if dialeto == 'sqlite':
+        return sqlite.insert(model.__table__)
+    raise NotImplementedError(f'ON CONFLICT não suportado em {dialeto}')
+
+
+def inserir_ignorando_conflito(model, linhas):
+    # Linhas que violariam a chave primária/únicas são ignoradas; devolve quantas entraram
+    if not linhas:
+        return 0
+    # Um único INSERT com várias linhas: o rowcount é exato nos dois bancos
+    resultado = db.session.execute(insert_do_dialeto(model).values(linhas).on_conflict_do_nothing())
+    return resultado.rowcount
+
+
+def incrementar_contadores(model, linhas, coluna):
+    # Cria a linha ou soma `coluna` à existente (chave = chave primária do modelo)
+    if not linhas:
+        return
+    stmt = insert_do_dialeto(model).values(linhas)
+    chave = [c.name for c in model.__table__.primary_key.columns]
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=chave,
+        set_={coluna: model.__table__.c[coluna] + stmt.excluded[coluna]}
+    ))
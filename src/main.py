@@ -1,73 +1,209 @@
 import os
 import sys
+import gzip
+import time
 # DON'T CHANGE THIS !!!
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
+import click
 from flask import Flask, send_from_directory
 from flask_cors import CORS
+from src.config import Config, engine_options
 from src.models.user import db
+from src.models.types import set_id_storage
+from src.database.migrations import upgrade
+from src.database.sqlite import configure_sqlite
+from src.services.sessoes import configurar_sessoes
+from src.services.idempotencia import configurar_idempotencia
+from src.services.limites import configurar_limites
 from src.routes.user import user_bp
 from src.routes.auth import auth_bp
 from src.routes.peladas import peladas_bp
 from src.routes.partidas import partidas_bp
 from src.routes.ranking import ranking_bp
 from src.routes.financeiro import financeiro_bp
+from src.routes.jobs import jobs_bp
+from src.routes.notificacoes import notificacoes_bp
+from src.routes.calendario import calendario_bp
+from src.routes.batch import batch_bp
+from src.services.rating import reconstruir_ratings
+from src.services.atributos import reconstruir_atributos
+from src.services.snapshots import reconstruir_todos_snapshots
+from src.services.destaques import reconstruir_todos_destaques
+from src.services.jobs import ExecutorJobs, agendar_periodicas, iniciar_executor, executar_pendentes
+from src.services.exportacao import ErroImportacao, exportar_pelada, importar_pelada
+from src.services.arquivo import arquivar, desarquivar
+from src.services import tarefas  # noqa: F401 (registra as tarefas da fila)
 
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
-
-# Habilitar CORS para todas as rotas
-CORS(app)
-
-# Registrar blueprints
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(peladas_bp, url_prefix='/api/peladas')
-app.register_blueprint(partidas_bp, url_prefix='/api/partidas')
-app.register_blueprint(ranking_bp, url_prefix='/api/ranking')
-app.register_blueprint(financeiro_bp, url_prefix='/api/financeiro')
-
-# Configuração do banco de dados
-database_url = os.environ.get('DATABASE_URL')
-if database_url:
-    # Railway PostgreSQL
-    app.config['SQLALCHEMY_DATABASE_URI'] = database_url
-else:
-    # SQLite local para desenvolvimento
-    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-db.init_app(app)
-
-# Criar diretório de uploads
-uploads_dir = os.path.join(app.static_folder, 'uploads')
-os.makedirs(uploads_dir, exist_ok=True)
-
-with app.app_context():
-    db.create_all()
-
-@app.route('/uploads/<filename>')
-def uploaded_file(filename):
+
+def create_app(config=None):
+    app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
+    app.config.from_object(Config)
+    if config:
+        app.config.update(config)
+        if 'SQLALCHEMY_DATABASE_URI' in config and 'SQLALCHEMY_ENGINE_OPTIONS' not in config:
+            app.config['SQLALCHEMY_ENGINE_OPTIONS'] = engine_options(config['SQLALCHEMY_DATABASE_URI'])
+
+    # Habilitar CORS para todas as rotas
+    CORS(app)
+
+    # Registrar blueprints
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(peladas_bp, url_prefix='/api/peladas')
+    app.register_blueprint(partidas_bp, url_prefix='/api/partidas')
+    app.register_blueprint(ranking_bp, url_prefix='/api/ranking')
+    app.register_blueprint(financeiro_bp, url_prefix='/api/financeiro')
+    app.register_blueprint(jobs_bp, url_prefix='/api/jobs')
+    app.register_blueprint(notificacoes_bp, url_prefix='/api/notificacoes')
+    app.register_blueprint(calendario_bp, url_prefix='/api/calendario')
+    app.register_blueprint(batch_bp, url_prefix='/api/batch')
+
+    set_id_storage(app.config['ID_STORAGE'])
+    db.init_app(app)
+    configure_sqlite(app)
+    configurar_sessoes(app)
+    # Repetições com Idempotency-Key respondem antes dos limites por rota
+    configurar_idempotencia(app)
+    configurar_limites(app)
+
+    # Criar diretório de uploads
     uploads_dir = os.path.join(app.static_folder, 'uploads')
-    return send_from_directory(uploads_dir, filename)
+    os.makedirs(uploads_dir, exist_ok=True)
+
+    @app.route('/uploads/<filename>')
+    def uploaded_file(filename):
+        uploads_dir = os.path.join(app.static_folder, 'uploads')
+        return send_from_directory(uploads_dir, filename)
 
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
-def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
+    @app.route('/', defaults={'path': ''})
+    @app.route('/<path:path>')
+    def serve(path):
+        static_folder_path = app.static_folder
+        if static_folder_path is None:
             return "Static folder not configured", 404
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
+        if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
+            return send_from_directory(static_folder_path, path)
         else:
-            return "index.html not found", 404
+            index_path = os.path.join(static_folder_path, 'index.html')
+            if os.path.exists(index_path):
+                return send_from_directory(static_folder_path, 'index.html')
+            else:
+                return "index.html not found", 404
+
+    @app.cli.command('init-db')
+    def init_db_command():
+        for version, descricao in init_db(app):
+            print(f'Migração {version} aplicada: {descricao}')
+        print('Banco de dados inicializado')
+
+    @app.cli.command('rebuild-ratings')
+    def rebuild_ratings_command():
+        resultado = reconstruir_ratings()
+        print(f"{resultado['ratings']} ratings recalculados a partir de {resultado['partidas']} partidas")
+
+    @app.cli.command('rebuild-atributos')
+    def rebuild_atributos_command():
+        resultado = reconstruir_atributos()
+        print(f"{resultado['atributos']} cards recalculados em {resultado['escopos']} escopos")
+
+    @app.cli.command('rebuild-snapshots')
+    def rebuild_snapshots_command():
+        resultado = reconstruir_todos_snapshots()
+        print(f"{resultado['snapshots']} posições de ranking gravadas em {resultado['peladas']} peladas")
+
+    @app.cli.command('rebuild-destaques')
+    def rebuild_destaques_command():
+        resultado = reconstruir_todos_destaques()
+        print(f"Destaques e temporadas recalculados em {resultado['peladas']} peladas")
+
+    def abrir_ndjson(caminho, modo):
+        # '-' é a entrada/saída padrão; .gz é comprimido
+        if caminho == '-':
+            return click.open_file('-', modo)
+        if caminho.endswith('.gz'):
+            return gzip.open(caminho, modo + 't', encoding='utf-8')
+        return open(caminho, modo, encoding='utf-8')
+
+    @app.cli.command('export-pelada')
+    @click.argument('pelada_id')
+    @click.argument('arquivo', default='-')
+    @click.option('--com-senhas', is_flag=True, help='Inclui os hashes de senha (mover a pelada entre instâncias)')
+    def export_pelada_command(pelada_id, arquivo, com_senhas):
+        contagem = {}
+        inicio = time.perf_counter()
+        try:
+            with abrir_ndjson(arquivo, 'w') as saida:
+                for linha in exportar_pelada(pelada_id, com_senhas=com_senhas, contagem=contagem):
+                    saida.write(linha)
+        except ErroImportacao as e:
+            raise click.ClickException(str(e))
+        duracao = time.perf_counter() - inicio
+        total = sum(contagem.values())
+        click.echo(f'{total} linhas exportadas em {duracao:.2f}s ({total / duracao:.0f} linhas/s)', err=True)
+
+    @app.cli.command('import-pelada')
+    @click.argument('arquivo')
+    @click.option('--nome', default=None, help='Nome da pelada no destino (o nome é único)')
+    def import_pelada_command(arquivo, nome):
+        if arquivo == '-':
+            raise click.ClickException('A importação lê o arquivo duas vezes: informe um caminho')
+        try:
+            resultado = importar_pelada(lambda: abrir_ndjson(arquivo, 'r'), nome=nome)
+        except ErroImportacao as e:
+            raise click.ClickException(str(e))
+        for tabela, linhas in resultado['tabelas'].items():
+            click.echo(f'{tabela}: {linhas} linhas')
+        click.echo(f"{resultado['linhas']} linhas importadas em {resultado['segundos']:.2f}s "
+                   f"({resultado['linhas_por_segundo']:.0f} linhas/s); "
+                   f"{resultado['usuarios_existentes']} usuários já existiam no destino")
+        click.echo(f"Pelada importada: {resultado['pelada_id']} (agregados na fila, tarefa {resultado['job_id']})")
+
+    @app.cli.command('archive-history')
+    @click.option('--horizonte-dias', type=int, default=None, help='Padrão: ARQUIVO_HORIZONTE_DIAS')
+    def archive_history_command(horizonte_dias):
+        resultado = arquivar(horizonte_dias)
+        print(f"{resultado['temporadas']} temporadas arquivadas: {resultado['partidas']} partidas, "
+              f"{resultado['linhas']} linhas movidas ({resultado['bytes']} bytes comprimidos)")
+
+    @app.cli.command('restore-history')
+    @click.argument('pelada_id')
+    @click.option('--ano', type=int, default=None, help='Só esta temporada (padrão: todas)')
+    def restore_history_command(pelada_id, ano):
+        resultado = desarquivar(pelada_id, ano)
+        db.session.commit()
+        print(f"{resultado['temporadas']} temporadas restauradas ({resultado['linhas']} linhas)")
+
+    @app.cli.command('jobs-worker')
+    @click.option('--threads', type=int, default=None, help='Threads do executor (padrão: JOBS_WORKER_THREADS)')
+    @click.option('--uma-vez', is_flag=True, help='Executa o que estiver pendente e sai')
+    def jobs_worker_command(threads, uma_vez):
+        # Worker dedicado da fila; os workers web podem usar JOBS_WORKER_THREADS=0.
+        # Nesse caso ninguém mais agenda as periódicas: a chave evita duplicatas
+        agendar_periodicas()
+        if uma_vez:
+            print(f'{executar_pendentes()} tarefas executadas')
+            return
+        executor = ExecutorJobs(app, threads or app.config['JOBS_WORKER_THREADS'] or 1).iniciar()
+        try:
+            executor.thread.join()
+        except KeyboardInterrupt:
+            executor.parar()
+
+    return app
+
+
+def init_db(app):
+    # Criação do schema fica fora da importação: roda uma vez no master do gunicorn
+    # (gunicorn.conf.py), pelo comando `flask init-db` ou no servidor de desenvolvimento.
+    # Bancos existentes recebem as migrações pendentes (src/database/migrations.py)
+    return upgrade(app)
 
 
 if __name__ == '__main__':
+    app = create_app()
+    init_db(app)
+    iniciar_executor(app)
     port = int(os.environ.get('PORT', 5000))
-    app.run(host='0.0.0.0', port=port, debug=False)
-
+    app.run(host='0.0.0.0', port=port, debug=False, threaded=True)
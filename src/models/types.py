@@ -0,0 +1,55 @@
+import uuid
+from sqlalchemy.types import TypeDecorator, String, LargeBinary
+from sqlalchemy.dialects import postgresql
+
+# Modos de armazenamento das chaves UUID:
+#   texto    - VARCHAR(36), formato original
+#   compacto - UUID nativo (16 bytes) no PostgreSQL e BLOB de 16 bytes no SQLite
+# A API continua recebendo e devolvendo os UUIDs como texto nos dois modos.
+ID_STORAGE_MODES = ('texto', 'compacto')
+
+_id_storage = 'texto'
+
+
+def set_id_storage(mode):
+    global _id_storage
+    if mode not in ID_STORAGE_MODES:
+        raise ValueError(f'Modo de armazenamento de IDs inválido: {mode}')
+    _id_storage = mode
+
+
+def get_id_storage():
+    return _id_storage
+
+
+class UUIDKey(TypeDecorator):
+    impl = String(36)
+    cache_ok = True
+
+    def load_dialect_impl(self, dialect):
+        if _id_storage == 'compacto':
+            if dialect.name == 'postgresql':
+                return dialect.type_descriptor(postgresql.UUID(as_uuid=False))
+            return dialect.type_descriptor(LargeBinary(16))
+        return dialect.type_descriptor(String(36))
+
+    def process_bind_param(self, value, dialect):
+        if value is None or _id_storage != 'compacto':
+            return value
+
+        try:
+            valor = value if isinstance(value, uuid.UUID) else uuid.UUID(str(value))
+        except ValueError:
+            # IDs malformados vindos da URL simplesmente não encontram nada
+            return None if dialect.name == 'postgresql' else str(value).encode()
+
+        if dialect.name == 'postgresql':
+            return str(valor)
+        return valor.bytes
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return value
+        if isinstance(value, (bytes, memoryview)):
+            return str(uuid.UUID(bytes=bytes(value)))
+        return str(value)
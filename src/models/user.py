@@ -1,18 +1,27 @@
 from flask_sqlalchemy import SQLAlchemy
-from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 import uuid
+from src.models.types import UUIDKey
+from src.database.routing import RoutingSession
+from src.services.senhas import gerar_hash, verificar_hash, precisa_rehash
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    __table_args__ = (
+        db.Index('uq_user_token_calendario', 'token_calendario', unique=True),
+    )
+
+    id = db.Column(UUIDKey, primary_key=True, default=lambda: str(uuid.uuid4()))
     nome = db.Column(db.String(100), nullable=False)
     email = db.Column(db.String(120), unique=True, nullable=False)
     senha_hash = db.Column(db.String(255), nullable=False)
     posicao = db.Column(db.String(20), nullable=False)  # Goleiro, Zagueiro, Meio Campo, Atacante
     foto_perfil_url = db.Column(db.String(255))
     data_cadastro = db.Column(db.DateTime, default=datetime.utcnow)
+    # Feed de calendário (.ics): token da URL e última alteração de presença do usuário
+    token_calendario = db.Column(db.String(64))
+    presencas_alteradas_em = db.Column(db.DateTime)
     
     # Relacionamentos
     peladas_admin = db.relationship('Pelada', backref='admin', lazy=True, foreign_keys='Pelada.admin_id')
@@ -28,10 +37,15 @@ class User(db.Model):
         return f'<User {self.nome}>'
 
     def set_password(self, password):
-        self.senha_hash = generate_password_hash(password)
+        # Calculado no pool de senhas (src/services/senhas.py), fora da thread da requisição
+        self.senha_hash = gerar_hash(password)
 
     def check_password(self, password):
-        return check_password_hash(self.senha_hash, password)
+        return verificar_hash(self.senha_hash, password)
+
+    def senha_desatualizada(self):
+        # Hash gravado com método ou custo diferente de SENHA_METODO
+        return precisa_rehash(self.senha_hash)
 
     def to_dict(self):
         return {
@@ -44,13 +58,15 @@ class User(db.Model):
         }
 
 class Pelada(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
+    id = db.Column(UUIDKey, primary_key=True, default=lambda: str(uuid.uuid4()))
     nome = db.Column(db.String(100), unique=True, nullable=False)
     local = db.Column(db.String(200), nullable=False)
     descricao = db.Column(db.Text)
     foto_pelada_url = db.Column(db.String(255))
-    admin_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    admin_id = db.Column(UUIDKey, db.ForeignKey('user.id'), nullable=False)
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+    # Muda sempre que uma partida da pelada é criada ou muda de status (invalida o feed .ics)
+    partidas_alteradas_em = db.Column(db.DateTime, default=datetime.utcnow)
     
     # Relacionamentos
     membros = db.relationship('MembroPelada', backref='pelada', lazy=True)
@@ -71,8 +87,12 @@ class Pelada(db.Model):
         }
 
 class MembroPelada(db.Model):
-    usuario_id = db.Column(db.String(36), db.ForeignKey('user.id'), primary_key=True)
-    pelada_id = db.Column(db.String(36), db.ForeignKey('pelada.id'), primary_key=True)
+    __table_args__ = (
+        db.Index('ix_membro_pelada_pelada', 'pelada_id'),
+    )
+
+    usuario_id = db.Column(UUIDKey, db.ForeignKey('user.id'), primary_key=True)
+    pelada_id = db.Column(UUIDKey, db.ForeignKey('pelada.id'), primary_key=True)
     is_admin = db.Column(db.Boolean, default=False)
     data_entrada = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -85,15 +105,25 @@ class MembroPelada(db.Model):
         }
 
 class Partida(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    pelada_id = db.Column(db.String(36), db.ForeignKey('pelada.id'), nullable=False)
+    __table_args__ = (
+        db.Index('ix_partida_pelada_data', 'pelada_id', 'data_partida'),
+        db.Index('ix_partida_pelada_status_data', 'pelada_id', 'status', 'data_partida'),
+        db.Index('ix_partida_status_data', 'status', 'data_partida'),
+    )
+
+    id = db.Column(UUIDKey, primary_key=True, default=lambda: str(uuid.uuid4()))
+    pelada_id = db.Column(UUIDKey, db.ForeignKey('pelada.id'), nullable=False)
     data_partida = db.Column(db.Date, nullable=False)
     hora_inicio = db.Column(db.Time, nullable=False)
     hora_fim = db.Column(db.Time)
     status = db.Column(db.String(20), default='agendada')  # agendada, em_andamento, finalizada, avaliacao, concluida
-    mvp_id = db.Column(db.String(36), db.ForeignKey('user.id'))
-    bola_murcha_id = db.Column(db.String(36), db.ForeignKey('user.id'))
+    mvp_id = db.Column(UUIDKey, db.ForeignKey('user.id'))
+    bola_murcha_id = db.Column(UUIDKey, db.ForeignKey('user.id'))
     data_criacao = db.Column(db.DateTime, default=datetime.utcnow)
+    # Presenças, estatísticas, votos e lances movidos para ArquivoTemporada
+    arquivada = db.Column(db.Boolean, nullable=False, default=False)
+    # Ratings e temporada já somaram esta partida (tarefa agregados_partida)
+    agregados_em = db.Column(db.DateTime)
     
     # Relacionamentos
     presencas = db.relationship('PresencaPartida', backref='partida', lazy=True)
@@ -110,12 +140,13 @@ class Partida(db.Model):
             'status': self.status,
             'mvp_id': self.mvp_id,
             'bola_murcha_id': self.bola_murcha_id,
-            'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None
+            'data_criacao': self.data_criacao.isoformat() if self.data_criacao else None,
+            'arquivada': bool(self.arquivada)
         }
 
 class PresencaPartida(db.Model):
-    partida_id = db.Column(db.String(36), db.ForeignKey('partida.id'), primary_key=True)
-    usuario_id = db.Column(db.String(36), db.ForeignKey('user.id'), primary_key=True)
+    partida_id = db.Column(UUIDKey, db.ForeignKey('partida.id'), primary_key=True)
+    usuario_id = db.Column(UUIDKey, db.ForeignKey('user.id'), primary_key=True)
     confirmacao = db.Column(db.String(20), default='pendente')  # pendente, confirmado, nao_confirmado
     data_confirmacao = db.Column(db.DateTime)
 
@@ -127,9 +158,25 @@ class PresencaPartida(db.Model):
             'data_confirmacao': self.data_confirmacao.isoformat() if self.data_confirmacao else None
         }
 
+# Pesos usados quando a pelada não configurou regras próprias
+PESOS_PADRAO = {
+    'gol': 8,
+    'assistencia': 5,
+    'defesa': 2,
+    'gol_sofrido': -1,
+    'desarme': 1,
+    'voto_mvp': 3,
+    'voto_bola_murcha': -3,
+    'nao_votou': -5,
+}
+
 class EstatisticaJogadorPartida(db.Model):
-    partida_id = db.Column(db.String(36), db.ForeignKey('partida.id'), primary_key=True)
-    usuario_id = db.Column(db.String(36), db.ForeignKey('user.id'), primary_key=True)
+    __table_args__ = (
+        db.Index('ix_estatistica_usuario', 'usuario_id', 'partida_id'),
+    )
+
+    partida_id = db.Column(UUIDKey, db.ForeignKey('partida.id'), primary_key=True)
+    usuario_id = db.Column(UUIDKey, db.ForeignKey('user.id'), primary_key=True)
     gols = db.Column(db.Integer, default=0)
     assistencias = db.Column(db.Integer, default=0)
     defesas = db.Column(db.Integer, default=0)
@@ -137,17 +184,18 @@ class EstatisticaJogadorPartida(db.Model):
     desarmes = db.Column(db.Integer, default=0)
     pontuacao_total = db.Column(db.Integer, default=0)
 
-    def calcular_pontuacao(self, votos_mvp=0, votos_bola_murcha=0, nao_votou=False):
+    def calcular_pontuacao(self, votos_mvp=0, votos_bola_murcha=0, nao_votou=False, regras=None):
+        pesos = regras.pesos() if regras else PESOS_PADRAO
         pontos = 0
-        pontos += self.gols * 8
-        pontos += self.assistencias * 5
-        pontos += self.defesas * 2
-        pontos -= self.gols_sofridos * 1
-        pontos += self.desarmes * 1
-        pontos += votos_mvp * 3
-        pontos -= votos_bola_murcha * 3
+        pontos += self.gols * pesos['gol']
+        pontos += self.assistencias * pesos['assistencia']
+        pontos += self.defesas * pesos['defesa']
+        pontos += self.gols_sofridos * pesos['gol_sofrido']
+        pontos += self.desarmes * pesos['desarme']
+        pontos += votos_mvp * pesos['voto_mvp']
+        pontos += votos_bola_murcha * pesos['voto_bola_murcha']
         if nao_votou:
-            pontos -= 5
+            pontos += pesos['nao_votou']
         self.pontuacao_total = pontos
         return pontos
 
@@ -163,10 +211,38 @@ class EstatisticaJogadorPartida(db.Model):
             'pontuacao_total': self.pontuacao_total
         }
 
+class RegraPontuacao(db.Model):
+    pelada_id = db.Column(UUIDKey, db.ForeignKey('pelada.id'), primary_key=True)
+    gol = db.Column(db.Integer, nullable=False, default=PESOS_PADRAO['gol'])
+    assistencia = db.Column(db.Integer, nullable=False, default=PESOS_PADRAO['assistencia'])
+    defesa = db.Column(db.Integer, nullable=False, default=PESOS_PADRAO['defesa'])
+    gol_sofrido = db.Column(db.Integer, nullable=False, default=PESOS_PADRAO['gol_sofrido'])
+    desarme = db.Column(db.Integer, nullable=False, default=PESOS_PADRAO['desarme'])
+    voto_mvp = db.Column(db.Integer, nullable=False, default=PESOS_PADRAO['voto_mvp'])
+    voto_bola_murcha = db.Column(db.Integer, nullable=False, default=PESOS_PADRAO['voto_bola_murcha'])
+    nao_votou = db.Column(db.Integer, nullable=False, default=PESOS_PADRAO['nao_votou'])
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def pesos(self):
+        return {campo: getattr(self, campo) if getattr(self, campo) is not None else padrao
+                for campo, padrao in PESOS_PADRAO.items()}
+
+    def to_dict(self):
+        regras = self.pesos()
+        regras['pelada_id'] = self.pelada_id
+        regras['atualizado_em'] = self.atualizado_em.isoformat() if self.atualizado_em else None
+        return regras
+
 class AvaliacaoPartida(db.Model):
-    partida_id = db.Column(db.String(36), db.ForeignKey('partida.id'), primary_key=True)
-    avaliador_id = db.Column(db.String(36), db.ForeignKey('user.id'), primary_key=True)
-    avaliado_id = db.Column(db.String(36), db.ForeignKey('user.id'), primary_key=True)
+    __table_args__ = (
+        db.Index('ix_avaliacao_avaliado', 'avaliado_id', 'tipo_avaliacao'),
+        # Um voto de cada tipo por jogador e partida, garantido pelo banco
+        db.Index('uq_avaliacao_voto', 'partida_id', 'avaliador_id', 'tipo_avaliacao', unique=True),
+    )
+
+    partida_id = db.Column(UUIDKey, db.ForeignKey('partida.id'), primary_key=True)
+    avaliador_id = db.Column(UUIDKey, db.ForeignKey('user.id'), primary_key=True)
+    avaliado_id = db.Column(UUIDKey, db.ForeignKey('user.id'), primary_key=True)
     tipo_avaliacao = db.Column(db.String(20), nullable=False)  # mvp, bola_murcha
     data_avaliacao = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -180,13 +256,17 @@ class AvaliacaoPartida(db.Model):
         }
 
 class Financeiro(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    pelada_id = db.Column(db.String(36), db.ForeignKey('pelada.id'), nullable=False)
+    __table_args__ = (
+        db.Index('ix_financeiro_pelada_data', 'pelada_id', 'data_movimento'),
+    )
+
+    id = db.Column(UUIDKey, primary_key=True, default=lambda: str(uuid.uuid4()))
+    pelada_id = db.Column(UUIDKey, db.ForeignKey('pelada.id'), nullable=False)
     tipo_movimento = db.Column(db.String(20), nullable=False)  # entrada, saida
     descricao = db.Column(db.Text, nullable=False)
     valor = db.Column(db.Numeric(10, 2), nullable=False)
     data_movimento = db.Column(db.DateTime, default=datetime.utcnow)
-    registrado_por = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
+    registrado_por = db.Column(UUIDKey, db.ForeignKey('user.id'), nullable=False)
 
     def to_dict(self):
         return {
@@ -200,8 +280,8 @@ class Financeiro(db.Model):
         }
 
 class Mensalista(db.Model):
-    pelada_id = db.Column(db.String(36), db.ForeignKey('pelada.id'), primary_key=True)
-    usuario_id = db.Column(db.String(36), db.ForeignKey('user.id'), primary_key=True)
+    pelada_id = db.Column(UUIDKey, db.ForeignKey('pelada.id'), primary_key=True)
+    usuario_id = db.Column(UUIDKey, db.ForeignKey('user.id'), primary_key=True)
     status_pagamento = db.Column(db.String(20), default='pendente')  # pago, pendente
     data_ultimo_pagamento = db.Column(db.Date)
 
@@ -214,9 +294,13 @@ class Mensalista(db.Model):
         }
 
 class SolicitacaoPelada(db.Model):
-    id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
-    usuario_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False)
-    pelada_id = db.Column(db.String(36), db.ForeignKey('pelada.id'), nullable=False)
+    __table_args__ = (
+        db.Index('ix_solicitacao_pelada_status', 'pelada_id', 'status'),
+    )
+
+    id = db.Column(UUIDKey, primary_key=True, default=lambda: str(uuid.uuid4()))
+    usuario_id = db.Column(UUIDKey, db.ForeignKey('user.id'), nullable=False)
+    pelada_id = db.Column(UUIDKey, db.ForeignKey('pelada.id'), nullable=False)
     status = db.Column(db.String(20), default='pendente')  # pendente, aprovada, rejeitada
     data_solicitacao = db.Column(db.DateTime, default=datetime.utcnow)
 
@@ -229,3 +313,285 @@ class SolicitacaoPelada(db.Model):
             'data_solicitacao': self.data_solicitacao.isoformat() if self.data_solicitacao else None
         }
 
+
+class RatingJogador(db.Model):
+    __table_args__ = (
+        db.Index('ix_rating_escopo_rating', 'escopo', 'rating'),
+    )
+
+    usuario_id = db.Column(UUIDKey, db.ForeignKey('user.id'), primary_key=True)
+    escopo = db.Column(db.String(36), primary_key=True)  # id da pelada ou 'geral'
+    rating = db.Column(db.Float, nullable=False, default=1500.0)
+    partidas = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'usuario_id': self.usuario_id,
+            'escopo': self.escopo,
+            'rating': round(self.rating, 1),
+            'partidas': self.partidas,
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None
+        }
+
+class AtributosJogador(db.Model):
+    # Atributos do card estilo FIFA (0-99): percentil das taxas por partida do jogador
+    usuario_id = db.Column(UUIDKey, db.ForeignKey('user.id'), primary_key=True)
+    escopo = db.Column(db.String(36), primary_key=True)  # id da pelada ou 'geral'
+    partidas = db.Column(db.Integer, nullable=False, default=0)
+    finalizacao = db.Column(db.Integer, nullable=False, default=0)
+    passe = db.Column(db.Integer, nullable=False, default=0)
+    defesa = db.Column(db.Integer, nullable=False, default=0)
+    goleiro = db.Column(db.Integer, nullable=False, default=0)
+    geral = db.Column(db.Integer, nullable=False, default=0)
+    atualizado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'usuario_id': self.usuario_id,
+            'escopo': self.escopo,
+            'partidas': self.partidas,
+            'finalizacao': self.finalizacao,
+            'passe': self.passe,
+            'defesa': self.defesa,
+            'goleiro': self.goleiro,
+            'geral': self.geral,
+            'atualizado_em': self.atualizado_em.isoformat() if self.atualizado_em else None
+        }
+
+class SnapshotRanking(db.Model):
+    # Posição de cada jogador no ranking da pelada logo após cada partida concluída
+    __table_args__ = (
+        db.Index('ix_snapshot_pelada_usuario_data', 'pelada_id', 'usuario_id', 'data_partida'),
+    )
+
+    pelada_id = db.Column(UUIDKey, db.ForeignKey('pelada.id'), primary_key=True)
+    partida_id = db.Column(UUIDKey, db.ForeignKey('partida.id'), primary_key=True)
+    usuario_id = db.Column(UUIDKey, db.ForeignKey('user.id'), primary_key=True)
+    data_partida = db.Column(db.Date, nullable=False)
+    posicao = db.Column(db.Integer, nullable=False)
+    total_partidas = db.Column(db.Integer, nullable=False)
+    media_pontos = db.Column(db.Float, nullable=False)
+    pontuacao_partida = db.Column(db.Integer)  # nulo se o jogador não atuou nessa partida
+
+    def to_dict(self):
+        return {
+            'partida_id': self.partida_id,
+            'data_partida': self.data_partida.isoformat() if self.data_partida else None,
+            'posicao': self.posicao,
+            'total_partidas': self.total_partidas,
+            'media_pontos': round(self.media_pontos, 2),
+            'pontuacao_partida': self.pontuacao_partida
+        }
+
+class DestaquePartida(db.Model):
+    # Destaques gravados ao finalizar a partida (artilheiro, garcom, xerife, paredao, mvp, bola_murcha)
+    partida_id = db.Column(UUIDKey, db.ForeignKey('partida.id'), primary_key=True)
+    tipo = db.Column(db.String(20), primary_key=True)
+    usuario_id = db.Column(UUIDKey, db.ForeignKey('user.id'), nullable=False)
+    valor = db.Column(db.Integer, nullable=False)
+
+class EstatisticaTemporada(db.Model):
+    # Totais do jogador por pelada e ano, acumulados a cada partida finalizada
+    __table_args__ = (
+        db.Index('ix_temporada_pelada_ano', 'pelada_id', 'ano'),
+    )
+
+    pelada_id = db.Column(UUIDKey, db.ForeignKey('pelada.id'), primary_key=True)
+    ano = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(UUIDKey, db.ForeignKey('user.id'), primary_key=True)
+    partidas = db.Column(db.Integer, default=0, nullable=False)
+    gols = db.Column(db.Integer, default=0, nullable=False)
+    assistencias = db.Column(db.Integer, default=0, nullable=False)
+    defesas = db.Column(db.Integer, default=0, nullable=False)
+    gols_sofridos = db.Column(db.Integer, default=0, nullable=False)
+    desarmes = db.Column(db.Integer, default=0, nullable=False)
+    pontuacao = db.Column(db.Integer, default=0, nullable=False)
+    votos_mvp = db.Column(db.Integer, default=0, nullable=False)
+    mvps = db.Column(db.Integer, default=0, nullable=False)
+
+class EventoPartida(db.Model):
+    # Lances registrados durante a partida ao vivo. O id é sequencial para servir
+    # de Last-Event-ID no stream SSE (retomada sem perder eventos)
+    __table_args__ = (
+        db.Index('ix_evento_partida_id', 'partida_id', 'id'),
+    )
+
+    id = db.Column(db.Integer, primary_key=True, autoincrement=True)
+    partida_id = db.Column(UUIDKey, db.ForeignKey('partida.id'), nullable=False)
+    usuario_id = db.Column(UUIDKey, db.ForeignKey('user.id'), nullable=False)
+    tipo = db.Column(db.String(20), nullable=False)  # gol, assistencia, defesa, gol_sofrido, desarme
+    quantidade = db.Column(db.Integer, nullable=False, default=1)  # -1 desfaz um lance
+    registrado_por = db.Column(UUIDKey, db.ForeignKey('user.id'))
+    criado_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'partida_id': self.partida_id,
+            'usuario_id': self.usuario_id,
+            'tipo': self.tipo,
+            'quantidade': self.quantidade,
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None
+        }
+
+class ApuracaoVoto(db.Model):
+    # Contagem parcial dos votos da partida, incrementada a cada voto
+    partida_id = db.Column(UUIDKey, db.ForeignKey('partida.id'), primary_key=True)
+    usuario_id = db.Column(UUIDKey, db.ForeignKey('user.id'), primary_key=True)
+    tipo_avaliacao = db.Column(db.String(20), primary_key=True)  # mvp, bola_murcha
+    votos = db.Column(db.Integer, nullable=False, default=0)
+
+class Job(db.Model):
+    # Fila de tarefas em segundo plano (src/services/jobs.py)
+    __table_args__ = (
+        db.Index('ix_job_status_executar', 'status', 'executar_em'),
+        # Deduplicação: só uma tarefa pendente por chave
+        db.Index('uq_job_chave_pendente', 'chave', unique=True,
+                 sqlite_where=db.text("status = 'pendente'"),
+                 postgresql_where=db.text("status = 'pendente'")),
+    )
+
+    id = db.Column(UUIDKey, primary_key=True, default=lambda: str(uuid.uuid4()))
+    tipo = db.Column(db.String(50), nullable=False)
+    payload = db.Column(db.Text, nullable=False, default='{}')
+    chave = db.Column(db.String(200))
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, executando, concluido, falhou
+    tentativas = db.Column(db.Integer, nullable=False, default=0)
+    max_tentativas = db.Column(db.Integer, nullable=False, default=5)
+    executar_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    travado_ate = db.Column(db.DateTime)
+    erro = db.Column(db.Text)
+    criado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    iniciado_em = db.Column(db.DateTime)
+    concluido_em = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'tipo': self.tipo,
+            'chave': self.chave,
+            'status': self.status,
+            'tentativas': self.tentativas,
+            'erro': self.erro,
+            'criado_em': self.criado_em.isoformat() if self.criado_em else None,
+            'concluido_em': self.concluido_em.isoformat() if self.concluido_em else None
+        }
+
+class Notificacao(db.Model):
+    # Uma notificação por membro e evento (ex.: nova_partida / lembrete_presenca de uma partida)
+    __table_args__ = (
+        db.Index('uq_notificacao_evento', 'usuario_id', 'evento', 'referencia_id', unique=True),
+        db.Index('ix_notificacao_status_usuario', 'status', 'usuario_id'),
+    )
+
+    id = db.Column(UUIDKey, primary_key=True, default=lambda: str(uuid.uuid4()))
+    usuario_id = db.Column(UUIDKey, db.ForeignKey('user.id'), nullable=False)
+    evento = db.Column(db.String(30), nullable=False)
+    referencia_id = db.Column(UUIDKey, nullable=False)
+    titulo = db.Column(db.String(200), nullable=False)
+    mensagem = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='pendente')  # pendente, enviada, falhou
+    criada_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    enviada_em = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'evento': self.evento,
+            'referencia_id': self.referencia_id,
+            'titulo': self.titulo,
+            'mensagem': self.mensagem,
+            'status': self.status,
+            'criada_em': self.criada_em.isoformat() if self.criada_em else None
+        }
+
+class InscricaoPush(db.Model):
+    # Inscrição Web Push de um navegador do usuário
+    __table_args__ = (
+        db.Index('ix_inscricao_push_usuario', 'usuario_id'),
+    )
+
+    endpoint = db.Column(db.String(500), primary_key=True)
+    usuario_id = db.Column(UUIDKey, db.ForeignKey('user.id'), nullable=False)
+    p256dh = db.Column(db.String(200), nullable=False)
+    auth = db.Column(db.String(100), nullable=False)
+    criada_em = db.Column(db.DateTime, default=datetime.utcnow)
+
+class SessaoUsuario(db.Model):
+    # Sessão de login guardada no servidor (src/services/sessoes.py). O cookie leva
+    # um token aleatório; aqui fica só o hash dele. contexto é o cache do perfil e
+    # das associações do usuário (JSON), apagado quando algum dos dois muda.
+    __table_args__ = (
+        db.Index('uq_sessao_token', 'token_hash', unique=True),
+        db.Index('ix_sessao_usuario', 'usuario_id'),
+        db.Index('ix_sessao_expira', 'expira_em'),
+    )
+
+    id = db.Column(UUIDKey, primary_key=True, default=lambda: str(uuid.uuid4()))
+    token_hash = db.Column(db.String(64), nullable=False)
+    usuario_id = db.Column(UUIDKey, db.ForeignKey('user.id'))
+    dados = db.Column(db.Text, nullable=False, default='{}')
+    contexto = db.Column(db.Text)
+    criada_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    ultimo_acesso = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expira_em = db.Column(db.DateTime, nullable=False)
+    user_agent = db.Column(db.String(200))
+    ip = db.Column(db.String(45))
+
+class BaldeLimite(db.Model):
+    # Token bucket compartilhado entre os workers (src/services/limites.py)
+    __table_args__ = (
+        db.Index('ix_balde_limite_atualizado', 'atualizado_em'),
+    )
+
+    chave = db.Column(db.String(200), primary_key=True)
+    tokens = db.Column(db.Float, nullable=False)
+    atualizado_em = db.Column(db.Float, nullable=False)  # epoch em segundos
+
+class RespostaIdempotente(db.Model):
+    # Resposta guardada para um Idempotency-Key (src/services/idempotencia.py).
+    # status nulo = requisição original ainda em andamento
+    __table_args__ = (
+        db.Index('ix_resposta_idempotente_expira', 'expira_em'),
+    )
+
+    chave = db.Column(db.String(64), primary_key=True)  # sha256 de usuário, rota e chave do cliente
+    usuario_id = db.Column(UUIDKey, nullable=False)
+    endpoint = db.Column(db.String(100), nullable=False)
+    corpo_hash = db.Column(db.String(64), nullable=False)
+    status = db.Column(db.Integer)
+    resposta = db.Column(db.Text)
+    criada_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    expira_em = db.Column(db.DateTime, nullable=False)
+
+class ArquivoTemporada(db.Model):
+    # Presenças, estatísticas, votos, apuração e lances das partidas arquivadas de uma
+    # temporada da pelada, em colunas comprimidas (src/services/arquivo.py)
+    pelada_id = db.Column(UUIDKey, db.ForeignKey('pelada.id'), primary_key=True)
+    ano = db.Column(db.Integer, primary_key=True)
+    partidas = db.Column(db.Integer, nullable=False, default=0)
+    linhas = db.Column(db.Integer, nullable=False, default=0)
+    versao = db.Column(db.Integer, nullable=False, default=1)  # muda a cada regravação (chave do cache)
+    dados = db.Column(db.LargeBinary, nullable=False)
+    atualizado_em = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+class TotalArquivado(db.Model):
+    # Totais por jogador das partidas arquivadas da temporada: o ranking soma estes
+    # totais às estatísticas que continuam nas tabelas quentes
+    __table_args__ = (
+        db.Index('ix_total_arquivado_usuario', 'usuario_id'),
+    )
+
+    pelada_id = db.Column(UUIDKey, db.ForeignKey('pelada.id'), primary_key=True)
+    ano = db.Column(db.Integer, primary_key=True)
+    usuario_id = db.Column(UUIDKey, db.ForeignKey('user.id'), primary_key=True)
+    partidas = db.Column(db.Integer, default=0, nullable=False)
+    gols = db.Column(db.Integer, default=0, nullable=False)
+    assistencias = db.Column(db.Integer, default=0, nullable=False)
+    defesas = db.Column(db.Integer, default=0, nullable=False)
+    gols_sofridos = db.Column(db.Integer, default=0, nullable=False)
+    desarmes = db.Column(db.Integer, default=0, nullable=False)
+    pontuacao = db.Column(db.Integer, default=0, nullable=False)
+    votos_mvp = db.Column(db.Integer, default=0, nullable=False)
+    mvps = db.Column(db.Integer, default=0, nullable=False)
@@ -1,5 +1,8 @@
 from flask import Blueprint, request, jsonify, session
 from src.models.user import db, User
+from src.services.jobs import enfileirar
+from src.services.senhas import SobrecargaSenhas
+from src.services.sessoes import contexto_usuario, invalidar_contexto, sessao_atual, listar_sessoes, revogar_sessoes
 from werkzeug.utils import secure_filename
 import os
 import uuid
@@ -38,12 +41,16 @@ def register():
         
         # Fazer login automático
         session['user_id'] = user.id
+        session.regenerar()
         
         return jsonify({
             'message': 'Usuário cadastrado com sucesso',
             'user': user.to_dict()
         }), 201
         
+    except SobrecargaSenhas as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -59,7 +66,17 @@ def login():
         user = User.query.filter_by(email=data['email']).first()
         
         if user and user.check_password(data['senha']):
+            # Método ou custo do hash mudou: grava de novo com os parâmetros atuais
+            # (sem vaga no pool, fica para o próximo login)
+            if user.senha_desatualizada():
+                try:
+                    user.set_password(data['senha'])
+                    db.session.commit()
+                except SobrecargaSenhas:
+                    db.session.rollback()
+            
             session['user_id'] = user.id
+            session.regenerar()
             return jsonify({
                 'message': 'Login realizado com sucesso',
                 'user': user.to_dict()
@@ -67,12 +84,16 @@ def login():
         else:
             return jsonify({'error': 'Email ou senha inválidos'}), 401
             
+    except SobrecargaSenhas as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/logout', methods=['POST'])
 def logout():
-    session.pop('user_id', None)
+    # Remove a sessão do servidor (e o cookie)
+    session.clear()
     return jsonify({'message': 'Logout realizado com sucesso'}), 200
 
 @auth_bp.route('/me', methods=['GET'])
@@ -80,11 +101,63 @@ def get_current_user():
     if 'user_id' not in session:
         return jsonify({'error': 'Usuário não autenticado'}), 401
     
-    user = User.query.get(session['user_id'])
-    if not user:
+    # Perfil guardado junto com a sessão: sem consulta no caminho comum
+    contexto = contexto_usuario()
+    if not contexto:
         return jsonify({'error': 'Usuário não encontrado'}), 404
     
-    return jsonify({'user': user.to_dict()}), 200
+    return jsonify({'user': contexto['user']}), 200
+
+@auth_bp.route('/sessoes', methods=['GET'])
+def get_sessoes():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        atual = sessao_atual().registro
+        sessoes = [{
+            'id': registro['id'],
+            'criada_em': registro['criada_em'].isoformat(),
+            'ultimo_acesso': registro['ultimo_acesso'].isoformat(),
+            'expira_em': registro['expira_em'].isoformat(),
+            'user_agent': registro['user_agent'],
+            'ip': registro['ip'],
+            'atual': atual is not None and registro['id'] == atual['id']
+        } for registro in listar_sessoes(session['user_id'])]
+        
+        return jsonify({'sessoes': sessoes}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/sessoes/<sessao_id>', methods=['DELETE'])
+def revoke_sessao(sessao_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        if not revogar_sessoes(session['user_id'], sessao_id=sessao_id):
+            return jsonify({'error': 'Sessão não encontrada'}), 404
+        
+        return jsonify({'message': 'Sessão encerrada'}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@auth_bp.route('/sessoes', methods=['DELETE'])
+def revoke_outras_sessoes():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        # Encerra todas as sessões do usuário menos a atual
+        atual = sessao_atual().registro
+        encerradas = revogar_sessoes(session['user_id'], exceto_id=atual['id'] if atual else None)
+        
+        return jsonify({'message': 'Outras sessões encerradas', 'encerradas': encerradas}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/upload-photo', methods=['POST'])
 def upload_photo():
@@ -107,14 +180,18 @@ def upload_photo():
         filepath = os.path.join(UPLOAD_FOLDER, filename)
         file.save(filepath)
         
-        # Atualizar usuário com a URL da foto
+        # Atualizar usuário com a URL da foto (o original vale até a fila processar)
         user = User.query.get(session['user_id'])
         user.foto_perfil_url = f'/uploads/{filename}'
+        job_id = enfileirar('processar_foto', {'usuario_id': user.id, 'pasta': UPLOAD_FOLDER, 'arquivo': filename},
+                            chave=f'processar_foto:{filename}')
+        invalidar_contexto(user.id)
         db.session.commit()
         
         return jsonify({
             'message': 'Foto enviada com sucesso',
-            'foto_url': user.foto_perfil_url
+            'foto_url': user.foto_perfil_url,
+            'job_id': job_id
         }), 200
     
     return jsonify({'error': 'Tipo de arquivo não permitido'}), 400
@@ -0,0 +1,104 @@
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+from flask import Blueprint, current_app, request, jsonify, session
+from flask.ctx import RequestContext
+from werkzeug.exceptions import HTTPException
+from werkzeug.test import EnvironBuilder
+from src.models.user import db
+from src.services.membros import carregar_membros, semear_membros
+
+batch_bp = Blueprint('batch', __name__)
+
+# Rotas que respondem em streaming (SSE) não cabem no lote: são recusadas pelo
+# endpoint antes de rodar a view, que abriria inscrições que ninguém fecharia
+ROTAS_STREAMING = {'partidas.stream_partida'}
+
+def _subrequisicao(app, sessao, base_url, caminho):
+    # Executa um GET interno sem passar de novo pelo WSGI: a sessão já decodificada
+    # é reaproveitada e o contexto da aplicação (db.session e o memo de membros) é o atual
+    partes = urlsplit(caminho)
+    environ = EnvironBuilder(
+        path=partes.path, query_string=partes.query, method='GET',
+        base_url=base_url, headers={'Accept': 'application/json'}
+    ).get_environ()
+
+    with RequestContext(app, environ, session=sessao):
+        if request.endpoint in ROTAS_STREAMING:
+            return 400, {'error': 'Rota com resposta em streaming não pode ir no lote'}
+        try:
+            rv = app.preprocess_request()
+            if rv is None:
+                rv = app.dispatch_request()
+        except HTTPException as e:
+            rv = e.get_response()
+        except Exception as e:
+            db.session.rollback()
+            rv = (jsonify({'error': str(e)}), 500)
+        resposta = app.make_response(rv)
+
+        if resposta.is_streamed:
+            # Arquivos estáticos (a rota coringa do front-end) já foram abertos: só fecha
+            resposta.close()
+            return 400, {'error': 'Rota com resposta em streaming não pode ir no lote'}
+        if resposta.is_json:
+            return resposta.status_code, resposta.get_json()
+        return resposta.status_code, resposta.get_data(as_text=True)
+
+def _em_thread(app, sessao, base_url, usuario_id, membros, caminho):
+    # Cada thread tem seu contexto e sua sessão do banco; o memo de membros é copiado
+    with app.app_context():
+        semear_membros(usuario_id, membros)
+        try:
+            return _subrequisicao(app, sessao, base_url, caminho)
+        finally:
+            db.session.remove()
+
+@batch_bp.route('', methods=['POST'])
+def run_batch():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+
+    try:
+        data = request.get_json()
+
+        if not data or not isinstance(data.get('requisicoes'), list) or not data['requisicoes']:
+            return jsonify({'error': 'Dados incompletos'}), 400
+
+        if len(data['requisicoes']) > current_app.config['BATCH_MAX_REQUISICOES']:
+            return jsonify({'error': f"Máximo de {current_app.config['BATCH_MAX_REQUISICOES']} requisições por lote"}), 400
+
+        # Cada item é o caminho de um GET da API ou {'id': ..., 'path': ...}
+        itens = []
+        for indice, item in enumerate(data['requisicoes']):
+            if isinstance(item, str):
+                item = {'path': item}
+            caminho = item.get('path') if isinstance(item, dict) else None
+            if not isinstance(caminho, str) or not caminho.startswith('/api/') or caminho.startswith('/api/batch'):
+                return jsonify({'error': f'Requisição inválida na posição {indice}'}), 400
+            itens.append((item.get('id', indice), caminho))
+
+        app = current_app._get_current_object()
+        sessao = session._get_current_object()
+        base_url = request.host_url
+        usuario_id = session['user_id']
+        # Associações do usuário em uma consulta, usadas por todas as subrequisições
+        membros = carregar_membros(usuario_id)
+
+        threads = min(current_app.config['BATCH_THREADS'], len(itens))
+        if data.get('paralelo') and threads > 1:
+            with ThreadPoolExecutor(max_workers=threads) as executor:
+                resultados = list(executor.map(
+                    lambda item: _em_thread(app, sessao, base_url, usuario_id, membros, item[1]), itens
+                ))
+        else:
+            resultados = [_subrequisicao(app, sessao, base_url, caminho) for _, caminho in itens]
+
+        return jsonify({
+            'respostas': [
+                {'id': item_id, 'status': status, 'body': corpo}
+                for (item_id, _), (status, corpo) in zip(itens, resultados)
+            ]
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,84 @@
+from flask import Blueprint, Response, current_app, request, jsonify, session, url_for
+from werkzeug.http import is_resource_modified
+from src.models.user import db, User, Pelada, MembroPelada
+from src.services.calendario import gerar_token, versao_feed, feed
+
+calendario_bp = Blueprint('calendario', __name__)
+
+def _links(token):
+    if not token:
+        return {'token': None, 'geral': None, 'peladas': []}
+
+    peladas = db.session.query(Pelada.id, Pelada.nome).join(
+        MembroPelada, MembroPelada.pelada_id == Pelada.id
+    ).filter(MembroPelada.usuario_id == session['user_id']).order_by(Pelada.nome).all()
+
+    return {
+        'token': token,
+        'geral': url_for('calendario.feed_usuario', token=token, _external=True),
+        'peladas': [{
+            'pelada_id': pelada_id,
+            'nome': nome,
+            'url': url_for('calendario.feed_pelada', token=token, pelada_id=pelada_id, _external=True)
+        } for pelada_id, nome in peladas]
+    }
+
+@calendario_bp.route('/links', methods=['GET'])
+def get_links():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+
+    try:
+        token = db.session.query(User.token_calendario).filter(User.id == session['user_id']).scalar()
+        return jsonify(_links(token)), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@calendario_bp.route('/token', methods=['POST'])
+def create_token():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+
+    try:
+        # Gera (ou troca) o token; as URLs antigas deixam de funcionar
+        token = gerar_token(session['user_id'])
+        db.session.commit()
+
+        return jsonify(_links(token)), 201
+
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+def _responder_feed(token, pelada_id=None):
+    try:
+        versao = versao_feed(token, pelada_id)
+        if not versao:
+            return jsonify({'error': 'Calendário não encontrado'}), 404
+
+        resposta = Response(mimetype='text/calendar')
+        resposta.set_etag(versao['etag'])
+        resposta.last_modified = versao['ultima_modificacao']
+        resposta.cache_control.private = True
+        resposta.cache_control.max_age = current_app.config['CALENDARIO_MAX_AGE']
+
+        # Cliente já tem a versão atual: 304 sem montar o feed
+        if not is_resource_modified(request.environ, etag=versao['etag'], last_modified=versao['ultima_modificacao']):
+            resposta.status_code = 304
+            return resposta
+
+        resposta.set_data(feed(versao))
+        resposta.headers['Content-Disposition'] = 'inline; filename="partidas.ics"'
+        return resposta
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@calendario_bp.route('/<token>.ics', methods=['GET'])
+def feed_usuario(token):
+    return _responder_feed(token)
+
+@calendario_bp.route('/<token>/pelada/<pelada_id>.ics', methods=['GET'])
+def feed_pelada(token, pelada_id):
+    return _responder_feed(token, pelada_id)
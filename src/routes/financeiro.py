@@ -1,5 +1,6 @@
 from flask import Blueprint, request, jsonify, session
 from src.models.user import db, User, Pelada, MembroPelada, Financeiro, Mensalista
+from src.services.membros import membro_da_pelada
 from datetime import datetime, date
 
 financeiro_bp = Blueprint('financeiro', __name__)
@@ -11,7 +12,7 @@ def get_movimentos_financeiros(pelada_id):
     
     try:
         # Verificar se o usuário é membro da pelada
-        membro = MembroPelada.query.filter_by(usuario_id=session['user_id'], pelada_id=pelada_id).first()
+        membro = membro_da_pelada(pelada_id)
         if not membro:
             return jsonify({'error': 'Acesso negado'}), 403
         
@@ -56,7 +57,7 @@ def add_movimento_financeiro(pelada_id):
     
     try:
         # Verificar se o usuário é admin da pelada
-        membro = MembroPelada.query.filter_by(usuario_id=session['user_id'], pelada_id=pelada_id).first()
+        membro = membro_da_pelada(pelada_id)
         if not membro or not membro.is_admin:
             return jsonify({'error': 'Acesso negado'}), 403
         
@@ -99,7 +100,7 @@ def delete_movimento_financeiro(movimento_id):
             return jsonify({'error': 'Movimento não encontrado'}), 404
         
         # Verificar se o usuário é admin da pelada
-        membro = MembroPelada.query.filter_by(usuario_id=session['user_id'], pelada_id=movimento.pelada_id).first()
+        membro = membro_da_pelada(movimento.pelada_id)
         if not membro or not membro.is_admin:
             return jsonify({'error': 'Acesso negado'}), 403
         
@@ -119,7 +120,7 @@ def get_mensalistas(pelada_id):
     
     try:
         # Verificar se o usuário é membro da pelada
-        membro = MembroPelada.query.filter_by(usuario_id=session['user_id'], pelada_id=pelada_id).first()
+        membro = membro_da_pelada(pelada_id)
         if not membro:
             return jsonify({'error': 'Acesso negado'}), 403
         
@@ -163,7 +164,7 @@ def update_pagamento_mensalista(pelada_id, usuario_id):
     
     try:
         # Verificar se o usuário é admin da pelada
-        membro = MembroPelada.query.filter_by(usuario_id=session['user_id'], pelada_id=pelada_id).first()
+        membro = membro_da_pelada(pelada_id)
         if not membro or not membro.is_admin:
             return jsonify({'error': 'Acesso negado'}), 403
         
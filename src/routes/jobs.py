@@ -0,0 +1,59 @@
+import json
+from flask import Blueprint, current_app, jsonify, session
+from src.models.user import db, Job, Partida
+from src.services.jobs import metricas
+from src.services.membros import membro_da_pelada
+from src.services.sessoes import contexto_usuario
+
+jobs_bp = Blueprint('jobs', __name__)
+
+def _operador():
+    contexto = contexto_usuario()
+    return bool(contexto) and contexto['user']['email'].lower() in current_app.config['JOBS_OPERADORES']
+
+def _pode_ver(job):
+    # Quem enfileirou (foto de perfil), admins da pelada da tarefa ou operadores
+    payload = json.loads(job.payload)
+    if payload.get('usuario_id') == session['user_id']:
+        return True
+    pelada_id = payload.get('pelada_id')
+    if pelada_id is None and payload.get('partida_id'):
+        partida = db.session.get(Partida, payload['partida_id'])
+        pelada_id = partida.pelada_id if partida else None
+    if pelada_id is not None:
+        membro = membro_da_pelada(pelada_id)
+        if membro and membro.is_admin:
+            return True
+    return _operador()
+
+@jobs_bp.route('/metricas', methods=['GET'])
+def get_metricas():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        # Visão da fila inteira (todas as peladas): só operadores
+        if not _operador():
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        # Profundidade da fila por tipo/status e latência das últimas tarefas concluídas
+        return jsonify({'metricas': metricas()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@jobs_bp.route('/<job_id>', methods=['GET'])
+def get_job(job_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        job = db.session.get(Job, job_id)
+        # Tarefa de outra pessoa responde como inexistente
+        if not job or not _pode_ver(job):
+            return jsonify({'error': 'Tarefa não encontrada'}), 404
+        
+        return jsonify({'job': job.to_dict()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,72 @@
+from flask import Blueprint, request, jsonify, session
+from src.models.user import db, Notificacao, InscricaoPush
+from src.database.upsert import inserir_ignorando_conflito
+
+notificacoes_bp = Blueprint('notificacoes', __name__)
+
+@notificacoes_bp.route('', methods=['GET'])
+def get_notificacoes():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        notificacoes = Notificacao.query.filter_by(usuario_id=session['user_id']).order_by(
+            Notificacao.criada_em.desc()
+        ).limit(50).all()
+        
+        return jsonify({'notificacoes': [n.to_dict() for n in notificacoes]}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@notificacoes_bp.route('/push', methods=['POST'])
+def subscribe_push():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        data = request.get_json()
+        
+        # Formato do PushSubscription.toJSON() do navegador
+        chaves = (data or {}).get('keys') or {}
+        if not data or not data.get('endpoint') or not chaves.get('p256dh') or not chaves.get('auth'):
+            return jsonify({'error': 'Dados incompletos'}), 400
+        
+        # O mesmo navegador pode trocar de usuário: a inscrição passa para o atual
+        db.session.query(InscricaoPush).filter_by(endpoint=data['endpoint']).delete(synchronize_session=False)
+        inserir_ignorando_conflito(InscricaoPush, [{
+            'endpoint': data['endpoint'],
+            'usuario_id': session['user_id'],
+            'p256dh': chaves['p256dh'],
+            'auth': chaves['auth']
+        }])
+        db.session.commit()
+        
+        return jsonify({'message': 'Notificações ativadas'}), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@notificacoes_bp.route('/push', methods=['DELETE'])
+def unsubscribe_push():
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        data = request.get_json()
+        
+        if not data or not data.get('endpoint'):
+            return jsonify({'error': 'Dados incompletos'}), 400
+        
+        db.session.query(InscricaoPush).filter_by(
+            endpoint=data['endpoint'],
+            usuario_id=session['user_id']
+        ).delete(synchronize_session=False)
+        db.session.commit()
+        
+        return jsonify({'message': 'Notificações desativadas'}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
@@ -1,10 +1,22 @@
-from flask import Blueprint, request, jsonify, session
-from src.models.user import db, User, Pelada, MembroPelada, Partida, PresencaPartida, EstatisticaJogadorPartida, AvaliacaoPartida
+import queue
+from flask import Blueprint, Response, current_app, request, jsonify, session
+from src.models.user import db, User, Pelada, MembroPelada, Partida, PresencaPartida, EstatisticaJogadorPartida, AvaliacaoPartida, DestaquePartida, EventoPartida, ApuracaoVoto
+from src.services.sorteio import sortear_times
+from src.services.pontuacao import regras_da_pelada
+from src.services.destaques import calcular_destaques, TIPOS_DESTAQUE
+from src.services.jobs import enfileirar
+from src.database.upsert import inserir_ignorando_conflito, incrementar_contadores
+from src.services.ao_vivo import LANCES, registrar_lance, formatar_sse, transmissor
+from src.services.calendario import marcar_partidas_alteradas, marcar_presencas_alteradas
+from src.services.membros import membro_da_pelada
+from src.services.arquivo import linhas_arquivadas, presencas_arquivadas, totais_por_usuario
 from datetime import datetime, date, time
-from sqlalchemy import func
+from sqlalchemy import func, update, case
 
 partidas_bp = Blueprint('partidas', __name__)
 
+CONFIRMACOES = ('pendente', 'confirmado', 'nao_confirmado')
+
 @partidas_bp.route('/create', methods=['POST'])
 def create_partida():
     if 'user_id' not in session:
@@ -19,7 +31,7 @@ def create_partida():
         pelada_id = data['pelada_id']
         
         # Verificar se o usuário é admin da pelada
-        membro = MembroPelada.query.filter_by(usuario_id=session['user_id'], pelada_id=pelada_id).first()
+        membro = membro_da_pelada(pelada_id)
         if not membro or not membro.is_admin:
             return jsonify({'error': 'Acesso negado'}), 403
         
@@ -50,6 +62,10 @@ def create_partida():
             )
             db.session.add(presenca)
         
+        # Avisar os membros (a fila junta com outros eventos em um resumo por pessoa)
+        enfileirar('notificar_nova_partida', {'partida_id': partida.id, 'criador_id': session['user_id']})
+        marcar_partidas_alteradas(pelada_id)
+        
         db.session.commit()
         
         return jsonify({
@@ -68,20 +84,31 @@ def get_partidas_pelada(pelada_id):
     
     try:
         # Verificar se o usuário é membro da pelada
-        membro = MembroPelada.query.filter_by(usuario_id=session['user_id'], pelada_id=pelada_id).first()
+        membro = membro_da_pelada(pelada_id)
         if not membro:
             return jsonify({'error': 'Acesso negado'}), 403
         
         partidas = Partida.query.filter_by(pelada_id=pelada_id).order_by(Partida.data_partida.desc()).all()
         
         partidas_list = []
+        arquivadas = {}
         for partida in partidas:
             partida_dict = partida.to_dict()
             
             # Contar presenças confirmadas
-            confirmados = PresencaPartida.query.filter_by(partida_id=partida.id, confirmacao='confirmado').count()
-            nao_confirmados = PresencaPartida.query.filter_by(partida_id=partida.id, confirmacao='nao_confirmado').count()
-            pendentes = PresencaPartida.query.filter_by(partida_id=partida.id, confirmacao='pendente').count()
+            if partida.arquivada:
+                # Presenças no arquivo da temporada: uma leitura por ano
+                ano = partida.data_partida.year
+                if ano not in arquivadas:
+                    arquivadas[ano] = presencas_arquivadas(pelada_id, ano)
+                contagem = arquivadas[ano].get(partida.id, {})
+                confirmados = contagem.get('confirmado', 0)
+                nao_confirmados = contagem.get('nao_confirmado', 0)
+                pendentes = contagem.get('pendente', 0)
+            else:
+                confirmados = PresencaPartida.query.filter_by(partida_id=partida.id, confirmacao='confirmado').count()
+                nao_confirmados = PresencaPartida.query.filter_by(partida_id=partida.id, confirmacao='nao_confirmado').count()
+                pendentes = PresencaPartida.query.filter_by(partida_id=partida.id, confirmacao='pendente').count()
             
             partida_dict['confirmados'] = confirmados
             partida_dict['nao_confirmados'] = nao_confirmados
@@ -105,15 +132,18 @@ def get_partida_details(partida_id):
             return jsonify({'error': 'Partida não encontrada'}), 404
         
         # Verificar se o usuário é membro da pelada
-        membro = MembroPelada.query.filter_by(usuario_id=session['user_id'], pelada_id=partida.pelada_id).first()
+        membro = membro_da_pelada(partida.pelada_id)
         if not membro:
             return jsonify({'error': 'Acesso negado'}), 403
         
         partida_dict = partida.to_dict()
         partida_dict['is_admin'] = membro.is_admin
         
-        # Buscar presenças
-        presencas = PresencaPartida.query.filter_by(partida_id=partida_id).all()
+        # Buscar presenças (partidas de temporadas arquivadas: do arquivo)
+        if partida.arquivada:
+            presencas = linhas_arquivadas(partida, PresencaPartida)
+        else:
+            presencas = PresencaPartida.query.filter_by(partida_id=partida_id).all()
         presencas_list = []
         
         for presenca in presencas:
@@ -127,7 +157,10 @@ def get_partida_details(partida_id):
         
         # Se a partida estiver finalizada, buscar estatísticas
         if partida.status in ['finalizada', 'avaliacao', 'concluida']:
-            estatisticas = EstatisticaJogadorPartida.query.filter_by(partida_id=partida_id).all()
+            if partida.arquivada:
+                estatisticas = linhas_arquivadas(partida, EstatisticaJogadorPartida)
+            else:
+                estatisticas = EstatisticaJogadorPartida.query.filter_by(partida_id=partida_id).all()
             estatisticas_list = []
             
             for estatistica in estatisticas:
@@ -150,15 +183,23 @@ def confirm_presence(partida_id):
         return jsonify({'error': 'Usuário não autenticado'}), 401
     
     try:
-        data = request.get_json()
+        data = request.get_json(silent=True) or {}
         confirmacao = data.get('confirmacao', 'confirmado')  # confirmado, nao_confirmado
-        
-        presenca = PresencaPartida.query.filter_by(partida_id=partida_id, usuario_id=session['user_id']).first()
-        if not presenca:
+        if confirmacao not in CONFIRMACOES:
+            return jsonify({'error': 'Confirmação inválida'}), 400
+        
+        # Um UPDATE condicional: rowcount diz se a presença existe
+        resultado = db.session.execute(
+            update(PresencaPartida).where(
+                PresencaPartida.partida_id == partida_id,
+                PresencaPartida.usuario_id == session['user_id']
+            ).values(confirmacao=confirmacao, data_confirmacao=datetime.utcnow()),
+            execution_options={'synchronize_session': False}
+        )
+        if resultado.rowcount == 0:
+            db.session.rollback()
             return jsonify({'error': 'Presença não encontrada'}), 404
-        
-        presenca.confirmacao = confirmacao
-        presenca.data_confirmacao = datetime.utcnow()
+        marcar_presencas_alteradas([session['user_id']])
         
         db.session.commit()
         
@@ -179,21 +220,28 @@ def update_presence(partida_id):
         if not data or not all(k in data for k in ('usuario_id', 'confirmacao')):
             return jsonify({'error': 'Dados incompletos'}), 400
         
+        if data['confirmacao'] not in CONFIRMACOES:
+            return jsonify({'error': 'Confirmação inválida'}), 400
+        
         partida = Partida.query.get(partida_id)
         if not partida:
             return jsonify({'error': 'Partida não encontrada'}), 404
         
         # Verificar se o usuário é admin da pelada
-        membro = MembroPelada.query.filter_by(usuario_id=session['user_id'], pelada_id=partida.pelada_id).first()
+        membro = membro_da_pelada(partida.pelada_id)
         if not membro or not membro.is_admin:
             return jsonify({'error': 'Acesso negado'}), 403
         
+        if partida.arquivada:
+            return jsonify({'error': 'Partida arquivada'}), 409
+        
         presenca = PresencaPartida.query.filter_by(partida_id=partida_id, usuario_id=data['usuario_id']).first()
         if not presenca:
             return jsonify({'error': 'Presença não encontrada'}), 404
         
         presenca.confirmacao = data['confirmacao']
         presenca.data_confirmacao = datetime.utcnow()
+        marcar_presencas_alteradas([presenca.usuario_id])
         
         db.session.commit()
         
@@ -203,6 +251,301 @@ def update_presence(partida_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@partidas_bp.route('/<partida_id>/presencas', methods=['POST'])
+def update_presences(partida_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('presencas'), list) or not data['presencas']:
+            return jsonify({'error': 'Dados incompletos'}), 400
+        
+        # usuario_id -> confirmacao (a última ocorrência vale)
+        alteracoes = {}
+        for item in data['presencas']:
+            if not isinstance(item, dict) or 'usuario_id' not in item or item.get('confirmacao') not in CONFIRMACOES:
+                return jsonify({'error': 'Presença inválida'}), 400
+            alteracoes[item['usuario_id']] = item['confirmacao']
+        
+        partida = Partida.query.get(partida_id)
+        if not partida:
+            return jsonify({'error': 'Partida não encontrada'}), 404
+        
+        # Verificar se o usuário é admin da pelada
+        membro = membro_da_pelada(partida.pelada_id)
+        if not membro or not membro.is_admin:
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        if partida.arquivada:
+            return jsonify({'error': 'Partida arquivada'}), 409
+        
+        # Todas as alterações em um único UPDATE ... CASE
+        resultado = db.session.execute(
+            update(PresencaPartida).where(
+                PresencaPartida.partida_id == partida_id,
+                PresencaPartida.usuario_id.in_(list(alteracoes))
+            ).values(
+                confirmacao=case(
+                    *[(PresencaPartida.usuario_id == usuario_id, confirmacao) for usuario_id, confirmacao in alteracoes.items()],
+                    else_=PresencaPartida.confirmacao
+                ),
+                data_confirmacao=datetime.utcnow()
+            ),
+            execution_options={'synchronize_session': False}
+        )
+        marcar_presencas_alteradas(alteracoes)
+        db.session.commit()
+        
+        nao_encontrados = []
+        if resultado.rowcount < len(alteracoes):
+            existentes = {u for (u,) in db.session.query(PresencaPartida.usuario_id).filter(
+                PresencaPartida.partida_id == partida_id,
+                PresencaPartida.usuario_id.in_(list(alteracoes))
+            )}
+            nao_encontrados = [u for u in alteracoes if u not in existentes]
+        
+        return jsonify({
+            'message': 'Presenças atualizadas com sucesso',
+            'atualizadas': resultado.rowcount,
+            'nao_encontrados': nao_encontrados
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@partidas_bp.route('/<partida_id>/sorteio', methods=['POST'])
+def draw_teams(partida_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        data = request.get_json(silent=True) or {}
+        num_times = data.get('num_times', 2)
+        seed = data.get('seed')
+        
+        # bool é subclasse de int; a semente do numpy não aceita negativos
+        if not isinstance(num_times, int) or isinstance(num_times, bool):
+            return jsonify({'error': 'num_times deve ser um número inteiro'}), 400
+        if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool) or seed < 0):
+            return jsonify({'error': 'seed deve ser um número inteiro não negativo'}), 400
+        
+        partida = Partida.query.get(partida_id)
+        if not partida:
+            return jsonify({'error': 'Partida não encontrada'}), 404
+        
+        # Verificar se o usuário é admin da pelada
+        membro = membro_da_pelada(partida.pelada_id)
+        if not membro or not membro.is_admin:
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        # Média histórica de cada jogador nas partidas concluídas da pelada (inclui temporadas arquivadas)
+        totais = totais_por_usuario(pelada_id=partida.pelada_id)
+        historico = db.session.query(
+            totais.c.usuario_id,
+            (totais.c.pontuacao * 1.0 / totais.c.partidas).label('media_pontos')
+        ).subquery()
+        
+        # Jogadores confirmados com suas médias, em uma única consulta
+        jogadores = db.session.query(User, historico.c.media_pontos).join(
+            PresencaPartida, PresencaPartida.usuario_id == User.id
+        ).outerjoin(
+            historico, historico.c.usuario_id == User.id
+        ).filter(
+            PresencaPartida.partida_id == partida_id,
+            PresencaPartida.confirmacao == 'confirmado'
+        ).all()
+        
+        if num_times < 2 or len(jogadores) < num_times:
+            return jsonify({'error': 'Jogadores confirmados insuficientes para o número de times'}), 400
+        
+        # Quem ainda não tem histórico entra com a mediana do grupo
+        conhecidas = sorted(float(media) for _, media in jogadores if media is not None)
+        nota_padrao = conhecidas[len(conhecidas) // 2] if conhecidas else 0.0
+        notas = [float(media) if media is not None else nota_padrao for _, media in jogadores]
+        goleiros = [1 if usuario.posicao == 'Goleiro' else 0 for usuario, _ in jogadores]
+        
+        times = sortear_times(notas, goleiros, num_times, seed=seed)
+        
+        times_list = []
+        for numero in range(num_times):
+            integrantes = [i for i in range(len(jogadores)) if times[i] == numero]
+            jogadores_time = []
+            for i in sorted(integrantes, key=lambda i: -notas[i]):
+                jogador_dict = jogadores[i][0].to_dict()
+                jogador_dict['nota'] = round(notas[i], 2)
+                jogadores_time.append(jogador_dict)
+            
+            soma = sum(notas[i] for i in integrantes)
+            times_list.append({
+                'numero': numero + 1,
+                'jogadores': jogadores_time,
+                'soma_notas': round(soma, 2),
+                'media_notas': round(soma / len(integrantes), 2) if integrantes else 0
+            })
+        
+        somas = [t['soma_notas'] for t in times_list]
+        
+        return jsonify({
+            'times': times_list,
+            'diferenca': round(max(somas) - min(somas), 2)
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@partidas_bp.route('/<partida_id>/iniciar', methods=['POST'])
+def start_partida(partida_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        partida = Partida.query.get(partida_id)
+        if not partida:
+            return jsonify({'error': 'Partida não encontrada'}), 404
+        
+        # Verificar se o usuário é admin da pelada
+        membro = membro_da_pelada(partida.pelada_id)
+        if not membro or not membro.is_admin:
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        if partida.status != 'agendada':
+            return jsonify({'error': 'Partida não está agendada'}), 400
+        
+        partida.status = 'em_andamento'
+        marcar_partidas_alteradas(partida.pelada_id)
+        db.session.commit()
+        
+        return jsonify({'message': 'Partida iniciada', 'partida': partida.to_dict()}), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@partidas_bp.route('/<partida_id>/lances', methods=['POST'])
+def add_lance(partida_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        data = request.get_json()
+        
+        if not data or not all(k in data for k in ('usuario_id', 'tipo')):
+            return jsonify({'error': 'Dados incompletos'}), 400
+        
+        tipo = data['tipo']
+        quantidade = data.get('quantidade', 1)  # 1 registra, -1 desfaz
+        if tipo not in LANCES or quantidade not in (1, -1):
+            return jsonify({'error': 'Lance inválido'}), 400
+        
+        partida = Partida.query.get(partida_id)
+        if not partida:
+            return jsonify({'error': 'Partida não encontrada'}), 404
+        
+        # Verificar se o usuário é admin da pelada
+        membro = membro_da_pelada(partida.pelada_id)
+        if not membro or not membro.is_admin:
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        if partida.status != 'em_andamento':
+            return jsonify({'error': 'Partida não está em andamento'}), 400
+        
+        jogador = MembroPelada.query.filter_by(usuario_id=data['usuario_id'], pelada_id=partida.pelada_id).first()
+        if not jogador:
+            return jsonify({'error': 'Jogador não é membro da pelada'}), 400
+        
+        pesos = regras_da_pelada(partida.pelada_id).pesos()
+        evento = registrar_lance(partida, data['usuario_id'], tipo, quantidade, pesos, session['user_id'])
+        if evento is None:
+            return jsonify({'error': 'Não há lance para desfazer'}), 400
+        
+        db.session.commit()
+        
+        # Acorda o canal ao vivo deste processo (os demais workers leem no próximo intervalo)
+        transmissor.notificar(partida_id)
+        
+        return jsonify({'evento': evento.to_dict()}), 201
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
+
+@partidas_bp.route('/<partida_id>/ao-vivo', methods=['GET'])
+def stream_partida(partida_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        partida = Partida.query.get(partida_id)
+        if not partida:
+            return jsonify({'error': 'Partida não encontrada'}), 404
+        
+        # Verificar se o usuário é membro da pelada
+        membro = membro_da_pelada(partida.pelada_id)
+        if not membro:
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        if partida.status != 'em_andamento':
+            return jsonify({'error': 'Partida não está em andamento'}), 400
+        
+        # Inscreve antes de ler o estado: nada se perde entre a leitura e o stream
+        # (eventos repetidos são descartados pelo id)
+        maior_id = db.session.query(func.max(EventoPartida.id)).filter(EventoPartida.partida_id == partida_id).scalar() or 0
+        fila = transmissor.inscrever(current_app._get_current_object(), partida_id, maior_id)
+        try:
+            eventos = EventoPartida.query.filter_by(partida_id=partida_id).order_by(EventoPartida.id).all()
+            # A partida pode ter terminado entre a verificação e a inscrição
+            status = db.session.query(Partida.status).filter(Partida.id == partida_id).scalar()
+        except Exception:
+            transmissor.cancelar(partida_id, fila)
+            raise
+        
+        retomada = request.headers.get('Last-Event-ID', type=int)
+        if retomada is not None:
+            # Reconexão: só os lances que o cliente ainda não recebeu
+            iniciais = [formatar_sse('lance', e.to_dict(), id=e.id) for e in eventos if e.id > retomada]
+        else:
+            totais = {}
+            for e in eventos:
+                jogador = totais.setdefault(e.usuario_id, {c: 0 for c, _ in LANCES.values()})
+                jogador[LANCES[e.tipo][0]] += e.quantidade
+            ultimo = eventos[-1].id if eventos else 0
+            iniciais = [formatar_sse('estado', {'partida_id': partida_id, 'totais': totais}, id=ultimo)]
+        visto = max([retomada or 0] + [e.id for e in eventos])
+        encerrada = status != 'em_andamento'
+        if encerrada:
+            transmissor.cancelar(partida_id, fila)
+            iniciais.append(formatar_sse('fim', {'status': status}))
+        db.session.remove()
+        
+        def gerar(visto):
+            try:
+                yield from iniciais
+                if encerrada:
+                    return
+                while True:
+                    try:
+                        evento, dados = fila.get(timeout=15)
+                    except queue.Empty:
+                        yield ': ping\n\n'
+                        continue
+                    if evento != 'lance':
+                        yield formatar_sse(evento, dados)
+                        return
+                    if dados['id'] > visto:
+                        visto = dados['id']
+                        yield formatar_sse('lance', dados, id=visto)
+            finally:
+                transmissor.cancelar(partida_id, fila)
+        
+        return Response(gerar(visto), mimetype='text/event-stream',
+                        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @partidas_bp.route('/<partida_id>/add-statistics', methods=['POST'])
 def add_statistics(partida_id):
     if 'user_id' not in session:
@@ -219,10 +562,15 @@ def add_statistics(partida_id):
             return jsonify({'error': 'Partida não encontrada'}), 404
         
         # Verificar se o usuário é admin da pelada
-        membro = MembroPelada.query.filter_by(usuario_id=session['user_id'], pelada_id=partida.pelada_id).first()
+        membro = membro_da_pelada(partida.pelada_id)
         if not membro or not membro.is_admin:
             return jsonify({'error': 'Acesso negado'}), 403
         
+        if partida.arquivada:
+            return jsonify({'error': 'Partida arquivada'}), 409
+        
+        regras = regras_da_pelada(partida.pelada_id)
+        
         # Adicionar/atualizar estatísticas
         for stat_data in data['estatisticas']:
             estatistica = EstatisticaJogadorPartida.query.filter_by(
@@ -244,13 +592,17 @@ def add_statistics(partida_id):
             estatistica.desarmes = stat_data.get('desarmes', 0)
             
             # Calcular pontuação básica (sem votos ainda)
-            estatistica.calcular_pontuacao()
+            estatistica.calcular_pontuacao(regras=regras)
         
         # Atualizar status da partida
         partida.status = 'avaliacao'
+        marcar_partidas_alteradas(partida.pelada_id)
         
         db.session.commit()
         
+        # Encerra o modo ao vivo para quem estiver acompanhando
+        transmissor.notificar(partida_id)
+        
         return jsonify({'message': 'Estatísticas adicionadas com sucesso'}), 200
         
     except Exception as e:
@@ -268,49 +620,43 @@ def vote_partida(partida_id):
         if not data or not all(k in data for k in ('mvp_id', 'bola_murcha_id')):
             return jsonify({'error': 'Dados incompletos'}), 400
         
-        partida = Partida.query.get(partida_id)
-        if not partida:
+        if data['mvp_id'] == data['bola_murcha_id']:
+            return jsonify({'error': 'MVP e bola murcha devem ser jogadores diferentes'}), 400
+        
+        # Status da partida e presença do votante em uma leitura
+        row = db.session.query(Partida.status, PresencaPartida.confirmacao).outerjoin(
+            PresencaPartida,
+            (PresencaPartida.partida_id == Partida.id) & (PresencaPartida.usuario_id == session['user_id'])
+        ).filter(
+            Partida.id == partida_id
+        ).first()
+        
+        if not row:
             return jsonify({'error': 'Partida não encontrada'}), 404
         
-        if partida.status != 'avaliacao':
+        if row.status != 'avaliacao':
             return jsonify({'error': 'Partida não está em período de avaliação'}), 400
         
-        # Verificar se o usuário confirmou presença
-        presenca = PresencaPartida.query.filter_by(
-            partida_id=partida_id,
-            usuario_id=session['user_id'],
-            confirmacao='confirmado'
-        ).first()
-        
-        if not presenca:
+        if row.confirmacao != 'confirmado':
             return jsonify({'error': 'Apenas jogadores que confirmaram presença podem votar'}), 403
         
-        # Verificar se já votou
-        voto_existente = AvaliacaoPartida.query.filter_by(
-            partida_id=partida_id,
-            avaliador_id=session['user_id']
-        ).first()
-        
-        if voto_existente:
+        # Os dois votos em um único INSERT; o índice único (partida, votante, tipo)
+        # descarta votos repetidos, inclusive de requisições simultâneas
+        agora = datetime.utcnow()
+        votos = [
+            {'partida_id': partida_id, 'avaliador_id': session['user_id'], 'avaliado_id': data['mvp_id'],
+             'tipo_avaliacao': 'mvp', 'data_avaliacao': agora},
+            {'partida_id': partida_id, 'avaliador_id': session['user_id'], 'avaliado_id': data['bola_murcha_id'],
+             'tipo_avaliacao': 'bola_murcha', 'data_avaliacao': agora}
+        ]
+        if inserir_ignorando_conflito(AvaliacaoPartida, votos) != len(votos):
+            db.session.rollback()
             return jsonify({'error': 'Você já votou nesta partida'}), 400
         
-        # Adicionar votos
-        voto_mvp = AvaliacaoPartida(
-            partida_id=partida_id,
-            avaliador_id=session['user_id'],
-            avaliado_id=data['mvp_id'],
-            tipo_avaliacao='mvp'
-        )
-        
-        voto_bola_murcha = AvaliacaoPartida(
-            partida_id=partida_id,
-            avaliador_id=session['user_id'],
-            avaliado_id=data['bola_murcha_id'],
-            tipo_avaliacao='bola_murcha'
-        )
-        
-        db.session.add(voto_mvp)
-        db.session.add(voto_bola_murcha)
+        incrementar_contadores(ApuracaoVoto, [
+            {'partida_id': partida_id, 'usuario_id': v['avaliado_id'], 'tipo_avaliacao': v['tipo_avaliacao'], 'votos': 1}
+            for v in votos
+        ], 'votos')
         db.session.commit()
         
         return jsonify({'message': 'Voto registrado com sucesso'}), 200
@@ -319,6 +665,38 @@ def vote_partida(partida_id):
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@partidas_bp.route('/<partida_id>/votos', methods=['GET'])
+def get_apuracao(partida_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        partida = Partida.query.get(partida_id)
+        if not partida:
+            return jsonify({'error': 'Partida não encontrada'}), 404
+        
+        # Verificar se o usuário é membro da pelada
+        membro = membro_da_pelada(partida.pelada_id)
+        if not membro:
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        # Contagem mantida a cada voto: nada é agregado aqui
+        apuracao = {'mvp': {}, 'bola_murcha': {}}
+        if partida.arquivada:
+            contadores = linhas_arquivadas(partida, ApuracaoVoto)
+        else:
+            contadores = ApuracaoVoto.query.filter_by(partida_id=partida_id).all()
+        for contador in contadores:
+            apuracao[contador.tipo_avaliacao][contador.usuario_id] = contador.votos
+        
+        return jsonify({
+            'votantes': sum(apuracao['mvp'].values()),
+            'apuracao': apuracao
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @partidas_bp.route('/<partida_id>/finalize', methods=['POST'])
 def finalize_partida(partida_id):
     if 'user_id' not in session:
@@ -330,7 +708,7 @@ def finalize_partida(partida_id):
             return jsonify({'error': 'Partida não encontrada'}), 404
         
         # Verificar se o usuário é admin da pelada
-        membro = MembroPelada.query.filter_by(usuario_id=session['user_id'], pelada_id=partida.pelada_id).first()
+        membro = membro_da_pelada(partida.pelada_id)
         if not membro or not membro.is_admin:
             return jsonify({'error': 'Acesso negado'}), 403
         
@@ -338,6 +716,7 @@ def finalize_partida(partida_id):
             return jsonify({'error': 'Partida não está em período de avaliação'}), 400
         
         # Calcular votos e atualizar pontuações
+        regras = regras_da_pelada(partida.pelada_id)
         estatisticas = EstatisticaJogadorPartida.query.filter_by(partida_id=partida_id).all()
         
         for estatistica in estatisticas:
@@ -362,19 +741,23 @@ def finalize_partida(partida_id):
             ).first() is not None
             
             # Recalcular pontuação com votos
-            estatistica.calcular_pontuacao(votos_mvp, votos_bola_murcha, not votou)
+            estatistica.calcular_pontuacao(votos_mvp, votos_bola_murcha, not votou, regras=regras)
         
-        # Determinar MVP e Bola Murcha
-        mvp_stat = max(estatisticas, key=lambda x: x.pontuacao_total)
-        bola_murcha_stat = min(estatisticas, key=lambda x: x.pontuacao_total)
+        # Determinar MVP e Bola Murcha (empates: menor usuario_id, como no recálculo das regras)
+        mvp_stat = min(estatisticas, key=lambda x: (-x.pontuacao_total, x.usuario_id))
+        bola_murcha_stat = min(estatisticas, key=lambda x: (x.pontuacao_total, x.usuario_id))
         
         partida.mvp_id = mvp_stat.usuario_id
         partida.bola_murcha_id = bola_murcha_stat.usuario_id
         partida.status = 'concluida'
         
+        # Ratings, card, evolução do ranking, destaques e temporada ficam para a fila
+        job_id = enfileirar('agregados_partida', {'partida_id': partida.id}, chave=f'agregados_partida:{partida.id}')
+        marcar_partidas_alteradas(partida.pelada_id)
+        
         db.session.commit()
         
-        return jsonify({'message': 'Partida finalizada com sucesso'}), 200
+        return jsonify({'message': 'Partida finalizada com sucesso', 'job_id': job_id}), 200
         
     except Exception as e:
         db.session.rollback()
@@ -391,68 +774,50 @@ def get_partida_ranking(partida_id):
             return jsonify({'error': 'Partida não encontrada'}), 404
         
         # Verificar se o usuário é membro da pelada
-        membro = MembroPelada.query.filter_by(usuario_id=session['user_id'], pelada_id=partida.pelada_id).first()
+        membro = membro_da_pelada(partida.pelada_id)
         if not membro:
             return jsonify({'error': 'Acesso negado'}), 403
         
         if partida.status != 'concluida':
             return jsonify({'error': 'Partida ainda não foi finalizada'}), 400
         
-        # Buscar estatísticas ordenadas por pontuação
-        estatisticas = EstatisticaJogadorPartida.query.filter_by(partida_id=partida_id).order_by(
-            EstatisticaJogadorPartida.pontuacao_total.desc()
-        ).all()
+        # Estatísticas e usuários em uma consulta, ordenadas por pontuação
+        if partida.arquivada:
+            estatisticas = linhas_arquivadas(partida, EstatisticaJogadorPartida)
+            usuarios = {u.id: u for u in User.query.filter(User.id.in_([e.usuario_id for e in estatisticas]))}
+            linhas = sorted(
+                [(e, usuarios[e.usuario_id]) for e in estatisticas if e.usuario_id in usuarios],
+                key=lambda linha: -(linha[0].pontuacao_total or 0)
+            )
+        else:
+            linhas = db.session.query(EstatisticaJogadorPartida, User).join(
+                User, User.id == EstatisticaJogadorPartida.usuario_id
+            ).filter(
+                EstatisticaJogadorPartida.partida_id == partida_id
+            ).order_by(
+                EstatisticaJogadorPartida.pontuacao_total.desc()
+            ).all()
         
         ranking = []
-        artilheiro = None
-        garcom = None
-        xerife = None
-        paredao = None
-        
-        max_gols = 0
-        max_assistencias = 0
-        max_desarmes = 0
-        max_pontos_goleiro = 0
-        
-        for i, estatistica in enumerate(estatisticas):
-            usuario = User.query.get(estatistica.usuario_id)
-            if usuario:
-                estatistica_dict = estatistica.to_dict()
-                estatistica_dict['usuario'] = usuario.to_dict()
-                estatistica_dict['posicao'] = i + 1
-                ranking.append(estatistica_dict)
-                
-                # Determinar destaques
-                if estatistica.gols > max_gols:
-                    max_gols = estatistica.gols
-                    artilheiro = estatistica_dict
-                
-                if estatistica.assistencias > max_assistencias:
-                    max_assistencias = estatistica.assistencias
-                    garcom = estatistica_dict
-                
-                if estatistica.desarmes > max_desarmes:
-                    max_desarmes = estatistica.desarmes
-                    xerife = estatistica_dict
-                
-                if usuario.posicao == 'Goleiro' and estatistica.pontuacao_total > max_pontos_goleiro:
-                    max_pontos_goleiro = estatistica.pontuacao_total
-                    paredao = estatistica_dict
-        
-        # MVP e Bola Murcha
-        mvp = ranking[0] if ranking else None
-        bola_murcha = ranking[-1] if ranking else None
+        por_usuario = {}
+        for i, (estatistica, usuario) in enumerate(linhas):
+            estatistica_dict = estatistica.to_dict()
+            estatistica_dict['usuario'] = usuario.to_dict()
+            estatistica_dict['posicao'] = i + 1
+            ranking.append(estatistica_dict)
+            por_usuario[estatistica.usuario_id] = estatistica_dict
+        
+        # Destaques gravados na finalização; partidas antigas sem registro são calculadas na hora
+        gravados = DestaquePartida.query.filter_by(partida_id=partida_id).all()
+        if gravados:
+            destaques = {d.tipo: d.usuario_id for d in gravados}
+        else:
+            calculados = calcular_destaques(linhas, partida.mvp_id, partida.bola_murcha_id)
+            destaques = {tipo: usuario_id for tipo, (usuario_id, _) in calculados.items()}
         
         return jsonify({
             'ranking': ranking,
-            'destaques': {
-                'artilheiro': artilheiro,
-                'garcom': garcom,
-                'xerife': xerife,
-                'paredao': paredao,
-                'mvp': mvp,
-                'bola_murcha': bola_murcha
-            }
+            'destaques': {tipo: por_usuario.get(destaques.get(tipo)) for tipo in TIPOS_DESTAQUE}
         }), 200
         
     except Exception as e:
@@ -1,5 +1,9 @@
 from flask import Blueprint, request, jsonify, session
-from src.models.user import db, User, Pelada, MembroPelada, SolicitacaoPelada
+from src.models.user import db, User, Pelada, MembroPelada, SolicitacaoPelada, RegraPontuacao, PESOS_PADRAO
+from src.services.pontuacao import regras_da_pelada, recalcular_pontuacao_pelada
+from src.services.membros import membro_da_pelada
+from src.services.sessoes import invalidar_contexto
+from datetime import datetime
 from sqlalchemy import or_
 import uuid
 
@@ -40,6 +44,7 @@ def create_pelada():
         )
         
         db.session.add(membro)
+        invalidar_contexto(session['user_id'])
         db.session.commit()
         
         return jsonify({
@@ -147,7 +152,7 @@ def get_pelada_requests(pelada_id):
     
     try:
         # Verificar se o usuário é admin da pelada
-        membro = MembroPelada.query.filter_by(usuario_id=session['user_id'], pelada_id=pelada_id).first()
+        membro = membro_da_pelada(pelada_id)
         if not membro or not membro.is_admin:
             return jsonify({'error': 'Acesso negado'}), 403
         
@@ -178,7 +183,7 @@ def approve_request(request_id):
             return jsonify({'error': 'Solicitação não encontrada'}), 404
         
         # Verificar se o usuário é admin da pelada
-        membro = MembroPelada.query.filter_by(usuario_id=session['user_id'], pelada_id=solicitacao.pelada_id).first()
+        membro = membro_da_pelada(solicitacao.pelada_id)
         if not membro or not membro.is_admin:
             return jsonify({'error': 'Acesso negado'}), 403
         
@@ -193,6 +198,7 @@ def approve_request(request_id):
         )
         
         db.session.add(novo_membro)
+        invalidar_contexto(solicitacao.usuario_id)
         db.session.commit()
         
         return jsonify({'message': 'Solicitação aprovada com sucesso'}), 200
@@ -212,7 +218,7 @@ def reject_request(request_id):
             return jsonify({'error': 'Solicitação não encontrada'}), 404
         
         # Verificar se o usuário é admin da pelada
-        membro = MembroPelada.query.filter_by(usuario_id=session['user_id'], pelada_id=solicitacao.pelada_id).first()
+        membro = membro_da_pelada(solicitacao.pelada_id)
         if not membro or not membro.is_admin:
             return jsonify({'error': 'Acesso negado'}), 403
         
@@ -237,7 +243,7 @@ def get_pelada_details(pelada_id):
             return jsonify({'error': 'Pelada não encontrada'}), 404
         
         # Verificar se o usuário é membro
-        membro = MembroPelada.query.filter_by(usuario_id=session['user_id'], pelada_id=pelada_id).first()
+        membro = membro_da_pelada(pelada_id)
         if not membro:
             return jsonify({'error': 'Acesso negado'}), 403
         
@@ -261,3 +267,65 @@ def get_pelada_details(pelada_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+
+@peladas_bp.route('/<pelada_id>/regras-pontuacao', methods=['GET'])
+def get_regras_pontuacao(pelada_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        # Verificar se o usuário é membro
+        membro = membro_da_pelada(pelada_id)
+        if not membro:
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        return jsonify({'regras': regras_da_pelada(pelada_id).to_dict()}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@peladas_bp.route('/<pelada_id>/regras-pontuacao', methods=['PUT'])
+def update_regras_pontuacao(pelada_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        # Verificar se o usuário é admin da pelada
+        membro = membro_da_pelada(pelada_id)
+        if not membro or not membro.is_admin:
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        data = request.get_json()
+        
+        if not data or not any(campo in data for campo in PESOS_PADRAO):
+            return jsonify({'error': 'Dados incompletos'}), 400
+        
+        # bool é subclasse de int: true/false não são pesos
+        if not all(isinstance(data[campo], int) and not isinstance(data[campo], bool) for campo in PESOS_PADRAO if campo in data):
+            return jsonify({'error': 'Os pesos devem ser números inteiros'}), 400
+        
+        regras = RegraPontuacao.query.get(pelada_id)
+        if not regras:
+            regras = RegraPontuacao(pelada_id=pelada_id, **PESOS_PADRAO)
+            db.session.add(regras)
+        
+        for campo in PESOS_PADRAO:
+            if campo in data:
+                setattr(regras, campo, data[campo])
+        regras.atualizado_em = datetime.utcnow()
+        db.session.flush()
+        
+        # Reescrever a pontuação de todo o histórico com as novas regras, na mesma
+        # transação: se o recálculo falhar, as regras antigas continuam valendo
+        recalculo = recalcular_pontuacao_pelada(pelada_id)
+        db.session.commit()
+        
+        return jsonify({
+            'message': 'Regras de pontuação atualizadas com sucesso',
+            'regras': regras.to_dict(),
+            'recalculo': recalculo
+        }), 200
+        
+    except Exception as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 500
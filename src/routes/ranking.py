@@ -1,40 +1,60 @@
 from flask import Blueprint, request, jsonify, session
-from src.models.user import db, User, Pelada, MembroPelada, EstatisticaJogadorPartida, Partida
+from src.models.user import db, User, Pelada, MembroPelada, Partida, RatingJogador, AtributosJogador, SnapshotRanking
+from src.services.rating import RATING_INICIAL, ESCOPO_GERAL
+from src.services.snapshots import medias_moveis
+from src.services.historico import carregar_estatisticas
+from src.services.comparacao import comparar_jogadores
+from src.services.destaques import premios_temporada
+from src.services.arquivo import totais_por_usuario
+from src.services.membros import membro_da_pelada
 from sqlalchemy import func, extract
 from datetime import datetime, timedelta
 
 ranking_bp = Blueprint('ranking', __name__)
 
+def _ordenacao(ordem, rating, media):
+    # media: média de pontos (padrão); rating: rating Elo do escopo
+    if ordem == 'rating':
+        return rating.desc()
+    return media.desc()
+
+def _consulta_ranking(totais, escopo):
+    # Totais por jogador (partidas quentes + temporadas arquivadas) com o rating do escopo
+    media = (totais.c.pontuacao * 1.0 / totais.c.partidas).label('media_pontos')
+    rating = func.coalesce(RatingJogador.rating, RATING_INICIAL).label('rating')
+    query = db.session.query(
+        User.id,
+        User.nome,
+        User.posicao,
+        totais.c.partidas.label('total_partidas'),
+        totais.c.gols.label('total_gols'),
+        totais.c.assistencias.label('total_assistencias'),
+        totais.c.defesas.label('total_defesas'),
+        totais.c.gols_sofridos.label('total_gols_sofridos'),
+        totais.c.desarmes.label('total_desarmes'),
+        media,
+        rating
+    ).join(
+        totais, totais.c.usuario_id == User.id
+    ).outerjoin(
+        RatingJogador, (RatingJogador.usuario_id == User.id) & (RatingJogador.escopo == escopo)
+    ).filter(
+        totais.c.partidas > 0
+    )
+    return query, rating, media
+
 @ranking_bp.route('/geral', methods=['GET'])
 def get_ranking_geral():
     if 'user_id' not in session:
         return jsonify({'error': 'Usuário não autenticado'}), 401
     
     try:
+        ordem = request.args.get('ordem', 'media')  # media, rating
+        
         # Calcular estatísticas gerais de todos os usuários
-        ranking_query = db.session.query(
-            User.id,
-            User.nome,
-            User.posicao,
-            func.count(EstatisticaJogadorPartida.partida_id).label('total_partidas'),
-            func.sum(EstatisticaJogadorPartida.gols).label('total_gols'),
-            func.sum(EstatisticaJogadorPartida.assistencias).label('total_assistencias'),
-            func.sum(EstatisticaJogadorPartida.defesas).label('total_defesas'),
-            func.sum(EstatisticaJogadorPartida.gols_sofridos).label('total_gols_sofridos'),
-            func.sum(EstatisticaJogadorPartida.desarmes).label('total_desarmes'),
-            func.avg(EstatisticaJogadorPartida.pontuacao_total).label('media_pontos')
-        ).join(
-            EstatisticaJogadorPartida, User.id == EstatisticaJogadorPartida.usuario_id
-        ).join(
-            Partida, EstatisticaJogadorPartida.partida_id == Partida.id
-        ).filter(
-            Partida.status == 'concluida'
-        ).group_by(
-            User.id
-        ).having(
-            func.count(EstatisticaJogadorPartida.partida_id) > 0
-        ).order_by(
-            func.avg(EstatisticaJogadorPartida.pontuacao_total).desc()
+        query, rating, media = _consulta_ranking(totais_por_usuario(), ESCOPO_GERAL)
+        ranking_query = query.order_by(
+            _ordenacao(ordem, rating, media)
         ).all()
         
         ranking = []
@@ -54,13 +74,14 @@ def get_ranking_geral():
                 'nome': row.nome,
                 'posicao_campo': row.posicao,
                 'pelada': pelada_nome,
-                'total_partidas': row.total_partidas or 0,
-                'total_gols': row.total_gols or 0,
-                'total_assistencias': row.total_assistencias or 0,
-                'total_defesas': row.total_defesas or 0,
-                'total_gols_sofridos': row.total_gols_sofridos or 0,
-                'total_desarmes': row.total_desarmes or 0,
-                'media_pontos': round(float(row.media_pontos or 0), 2)
+                'total_partidas': int(row.total_partidas or 0),
+                'total_gols': int(row.total_gols or 0),
+                'total_assistencias': int(row.total_assistencias or 0),
+                'total_defesas': int(row.total_defesas or 0),
+                'total_gols_sofridos': int(row.total_gols_sofridos or 0),
+                'total_desarmes': int(row.total_desarmes or 0),
+                'media_pontos': round(float(row.media_pontos or 0), 2),
+                'rating': round(float(row.rating), 1)
             }
             
             ranking.append(jogador)
@@ -86,48 +107,27 @@ def get_ranking_pelada(pelada_id):
     
     try:
         # Verificar se o usuário é membro da pelada
-        membro = MembroPelada.query.filter_by(usuario_id=session['user_id'], pelada_id=pelada_id).first()
+        membro = membro_da_pelada(pelada_id)
         if not membro:
             return jsonify({'error': 'Acesso negado'}), 403
         
         tipo = request.args.get('tipo', 'geral')  # geral, ano, mes
-        ano = request.args.get('ano', datetime.now().year)
-        
-        # Base query
-        query = db.session.query(
-            User.id,
-            User.nome,
-            User.posicao,
-            func.count(EstatisticaJogadorPartida.partida_id).label('total_partidas'),
-            func.sum(EstatisticaJogadorPartida.gols).label('total_gols'),
-            func.sum(EstatisticaJogadorPartida.assistencias).label('total_assistencias'),
-            func.sum(EstatisticaJogadorPartida.defesas).label('total_defesas'),
-            func.sum(EstatisticaJogadorPartida.gols_sofridos).label('total_gols_sofridos'),
-            func.sum(EstatisticaJogadorPartida.desarmes).label('total_desarmes'),
-            func.avg(EstatisticaJogadorPartida.pontuacao_total).label('media_pontos')
-        ).join(
-            EstatisticaJogadorPartida, User.id == EstatisticaJogadorPartida.usuario_id
-        ).join(
-            Partida, EstatisticaJogadorPartida.partida_id == Partida.id
-        ).filter(
-            Partida.pelada_id == pelada_id,
-            Partida.status == 'concluida'
-        )
+        ano = request.args.get('ano', datetime.now().year, type=int)
+        ordem = request.args.get('ordem', 'media')  # media, rating
         
         # Filtros por período
         if tipo == 'ano':
-            query = query.filter(extract('year', Partida.data_partida) == ano)
+            totais = totais_por_usuario(pelada_id=pelada_id, ano=ano)
         elif tipo == 'mes':
             # Último mês
             um_mes_atras = datetime.now() - timedelta(days=30)
-            query = query.filter(Partida.data_partida >= um_mes_atras.date())
+            totais = totais_por_usuario(pelada_id=pelada_id, desde=um_mes_atras.date())
+        else:
+            totais = totais_por_usuario(pelada_id=pelada_id)
         
-        ranking_query = query.group_by(
-            User.id
-        ).having(
-            func.count(EstatisticaJogadorPartida.partida_id) > 0
-        ).order_by(
-            func.avg(EstatisticaJogadorPartida.pontuacao_total).desc()
+        query, rating, media = _consulta_ranking(totais, pelada_id)
+        ranking_query = query.order_by(
+            _ordenacao(ordem, rating, media)
         ).all()
         
         ranking = []
@@ -137,13 +137,14 @@ def get_ranking_pelada(pelada_id):
                 'usuario_id': row.id,
                 'nome': row.nome,
                 'posicao_campo': row.posicao,
-                'total_partidas': row.total_partidas or 0,
-                'total_gols': row.total_gols or 0,
-                'total_assistencias': row.total_assistencias or 0,
-                'total_defesas': row.total_defesas or 0,
-                'total_gols_sofridos': row.total_gols_sofridos or 0,
-                'total_desarmes': row.total_desarmes or 0,
-                'media_pontos': round(float(row.media_pontos or 0), 2)
+                'total_partidas': int(row.total_partidas or 0),
+                'total_gols': int(row.total_gols or 0),
+                'total_assistencias': int(row.total_assistencias or 0),
+                'total_defesas': int(row.total_defesas or 0),
+                'total_gols_sofridos': int(row.total_gols_sofridos or 0),
+                'total_desarmes': int(row.total_desarmes or 0),
+                'media_pontos': round(float(row.media_pontos or 0), 2),
+                'rating': round(float(row.rating), 1)
             }
             ranking.append(jogador)
         
@@ -159,7 +160,7 @@ def get_anos_pelada(pelada_id):
     
     try:
         # Verificar se o usuário é membro da pelada
-        membro = MembroPelada.query.filter_by(usuario_id=session['user_id'], pelada_id=pelada_id).first()
+        membro = membro_da_pelada(pelada_id)
         if not membro:
             return jsonify({'error': 'Acesso negado'}), 403
         
@@ -178,6 +179,110 @@ def get_anos_pelada(pelada_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+@ranking_bp.route('/pelada/<pelada_id>/premios', methods=['GET'])
+def get_premios_pelada(pelada_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        # Verificar se o usuário é membro da pelada
+        membro = membro_da_pelada(pelada_id)
+        if not membro:
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        ano = request.args.get('ano', datetime.now().year, type=int)
+        
+        return jsonify({'ano': ano, 'premios': premios_temporada(pelada_id, ano)}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ranking_bp.route('/pelada/<pelada_id>/user/<user_id>/historico', methods=['GET'])
+def get_historico_jogador(pelada_id, user_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        # Verificar se o usuário é membro da pelada
+        membro = membro_da_pelada(pelada_id)
+        if not membro:
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        janela = request.args.get('janela', 5, type=int)
+        if not janela or janela < 1:
+            return jsonify({'error': 'Janela deve ser um inteiro positivo'}), 400
+        
+        # Uma varredura do índice (pelada_id, usuario_id, data_partida)
+        snapshots = SnapshotRanking.query.filter_by(
+            pelada_id=pelada_id,
+            usuario_id=user_id
+        ).order_by(
+            SnapshotRanking.data_partida, SnapshotRanking.partida_id
+        ).all()
+        
+        # Pontuação só nas partidas em que atuou; posição após todas as partidas da pelada
+        jogadas = [s for s in snapshots if s.pontuacao_partida is not None]
+        medias = medias_moveis([s.pontuacao_partida for s in jogadas], janela)
+        
+        pontuacoes = [{
+            'partida_id': s.partida_id,
+            'data_partida': s.data_partida.isoformat(),
+            'pontuacao': s.pontuacao_partida,
+            'media_movel': media
+        } for s, media in zip(jogadas, medias)]
+        
+        posicoes = [s.to_dict() for s in snapshots]
+        
+        return jsonify({
+            'janela': janela,
+            'pontuacoes': pontuacoes,
+            'posicoes': posicoes,
+            'melhor_posicao': min((s.posicao for s in snapshots), default=None),
+            'posicao_atual': snapshots[-1].posicao if snapshots else None
+        }), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@ranking_bp.route('/pelada/<pelada_id>/comparar', methods=['GET'])
+def compare_players(pelada_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        # Verificar se o usuário é membro da pelada
+        membro = membro_da_pelada(pelada_id)
+        if not membro:
+            return jsonify({'error': 'Acesso negado'}), 403
+        
+        # ?usuarios=id1,id2,... (de 2 a 10 jogadores, sem repetição)
+        usuario_ids = list(dict.fromkeys(u for u in request.args.get('usuarios', '').split(',') if u))
+        if not 2 <= len(usuario_ids) <= 10:
+            return jsonify({'error': 'Informe de 2 a 10 jogadores'}), 400
+        
+        membros = db.session.query(User.id, User.nome, User.posicao).join(
+            MembroPelada, MembroPelada.usuario_id == User.id
+        ).filter(
+            MembroPelada.pelada_id == pelada_id,
+            User.id.in_(usuario_ids)
+        ).all()
+        if len(membros) != len(usuario_ids):
+            return jsonify({'error': 'Todos os jogadores devem ser membros da pelada'}), 400
+        
+        # Recorte do histórico carregado uma única vez para todos os pares
+        historico = carregar_estatisticas(pelada_id=pelada_id, usuario_ids=usuario_ids)
+        comparacao = comparar_jogadores(historico, usuario_ids)
+        
+        por_id = {m.id: m for m in membros}
+        for jogador in comparacao['jogadores']:
+            jogador['nome'] = por_id[jogador['usuario_id']].nome
+            jogador['posicao_campo'] = por_id[jogador['usuario_id']].posicao
+        
+        return jsonify({'comparacao': comparacao}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
 @ranking_bp.route('/user/<user_id>/stats', methods=['GET'])
 def get_user_stats(user_id):
     if 'user_id' not in session:
@@ -188,30 +293,26 @@ def get_user_stats(user_id):
         if not user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
         
-        # Calcular estatísticas gerais do usuário
+        # Calcular estatísticas gerais do usuário (inclui temporadas arquivadas)
+        totais = totais_por_usuario(usuario_id=user_id)
         stats_query = db.session.query(
-            func.count(EstatisticaJogadorPartida.partida_id).label('total_partidas'),
-            func.sum(EstatisticaJogadorPartida.gols).label('total_gols'),
-            func.sum(EstatisticaJogadorPartida.assistencias).label('total_assistencias'),
-            func.sum(EstatisticaJogadorPartida.defesas).label('total_defesas'),
-            func.sum(EstatisticaJogadorPartida.gols_sofridos).label('total_gols_sofridos'),
-            func.sum(EstatisticaJogadorPartida.desarmes).label('total_desarmes'),
-            func.avg(EstatisticaJogadorPartida.pontuacao_total).label('media_pontos')
-        ).join(
-            Partida, EstatisticaJogadorPartida.partida_id == Partida.id
-        ).filter(
-            EstatisticaJogadorPartida.usuario_id == user_id,
-            Partida.status == 'concluida'
+            func.sum(totais.c.partidas).label('total_partidas'),
+            func.sum(totais.c.gols).label('total_gols'),
+            func.sum(totais.c.assistencias).label('total_assistencias'),
+            func.sum(totais.c.defesas).label('total_defesas'),
+            func.sum(totais.c.gols_sofridos).label('total_gols_sofridos'),
+            func.sum(totais.c.desarmes).label('total_desarmes'),
+            (func.sum(totais.c.pontuacao) * 1.0 / func.sum(totais.c.partidas)).label('media_pontos')
         ).first()
         
         stats = {
             'usuario': user.to_dict(),
-            'total_partidas': stats_query.total_partidas or 0,
-            'total_gols': stats_query.total_gols or 0,
-            'total_assistencias': stats_query.total_assistencias or 0,
-            'total_defesas': stats_query.total_defesas or 0,
-            'total_gols_sofridos': stats_query.total_gols_sofridos or 0,
-            'total_desarmes': stats_query.total_desarmes or 0,
+            'total_partidas': int(stats_query.total_partidas or 0),
+            'total_gols': int(stats_query.total_gols or 0),
+            'total_assistencias': int(stats_query.total_assistencias or 0),
+            'total_defesas': int(stats_query.total_defesas or 0),
+            'total_gols_sofridos': int(stats_query.total_gols_sofridos or 0),
+            'total_desarmes': int(stats_query.total_desarmes or 0),
             'media_pontos': round(float(stats_query.media_pontos or 0), 2)
         }
         
@@ -220,3 +321,40 @@ def get_user_stats(user_id):
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+
+@ranking_bp.route('/user/<user_id>/card', methods=['GET'])
+def get_user_card(user_id):
+    if 'user_id' not in session:
+        return jsonify({'error': 'Usuário não autenticado'}), 401
+    
+    try:
+        # Atributos pré-calculados (pelada ou geral): uma única leitura
+        pelada_id = request.args.get('pelada_id')
+        escopo = pelada_id or ESCOPO_GERAL
+        
+        # Card de uma pelada: só para os membros dela
+        if pelada_id:
+            membro = membro_da_pelada(pelada_id)
+            if not membro:
+                return jsonify({'error': 'Acesso negado'}), 403
+        
+        row = db.session.query(User, AtributosJogador).outerjoin(
+            AtributosJogador, (AtributosJogador.usuario_id == User.id) & (AtributosJogador.escopo == escopo)
+        ).filter(
+            User.id == user_id
+        ).first()
+        
+        if not row:
+            return jsonify({'error': 'Usuário não encontrado'}), 404
+        
+        user, atributos = row
+        card = {
+            'usuario': user.to_dict(),
+            'escopo': escopo,
+            'atributos': atributos.to_dict() if atributos else None
+        }
+        
+        return jsonify({'card': card}), 200
+        
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -0,0 +1,185 @@
+import json
+import queue
+import threading
+from sqlalchemy import update, func
+from src.models.user import db, Partida, EstatisticaJogadorPartida, EventoPartida
+from src.database.upsert import inserir_ignorando_conflito
+
+# Modo ao vivo das partidas em andamento.
+#
+# Os lances são gravados como EventoPartida e somados atomicamente às
+# estatísticas do jogador. Quem acompanha recebe os eventos por SSE: em cada
+# processo existe um canal por partida, com uma única thread que lê os eventos
+# novos do banco e os distribui para as filas de todos os inscritos. A thread
+# consulta o banco a cada AO_VIVO_INTERVALO segundos, haja lance ou não (é assim
+# que chegam os lances registrados em outros workers), e também na hora quando o
+# lance é registrado no mesmo processo. A carga no banco é uma leitura por
+# intervalo por canal (partida ao vivo x worker), independente de quantos
+# espectadores estejam inscritos.
+
+# tipo do lance -> (coluna da estatística, chave do peso na regra de pontuação)
+LANCES = {
+    'gol': ('gols', 'gol'),
+    'assistencia': ('assistencias', 'assistencia'),
+    'defesa': ('defesas', 'defesa'),
+    'gol_sofrido': ('gols_sofridos', 'gol_sofrido'),
+    'desarme': ('desarmes', 'desarme'),
+}
+
+
+def registrar_lance(partida, usuario_id, tipo, quantidade, pesos, registrado_por):
+    # Incremento atômico no banco (sem ler e regravar o objeto); não deixa o total negativo
+    coluna, peso = LANCES[tipo]
+    E = EstatisticaJogadorPartida
+    campo = getattr(E, coluna)
+
+    def incrementar():
+        return db.session.execute(
+            update(E).where(
+                E.partida_id == partida.id,
+                E.usuario_id == usuario_id,
+                func.coalesce(campo, 0) + quantidade >= 0
+            ).values({
+                coluna: func.coalesce(campo, 0) + quantidade,
+                'pontuacao_total': func.coalesce(E.pontuacao_total, 0) + quantidade * pesos[peso]
+            }),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+
+    if not incrementar():
+        existe = db.session.query(E.usuario_id).filter_by(partida_id=partida.id, usuario_id=usuario_id).first()
+        if existe or quantidade < 0:
+            return None
+        # Primeiro lance do jogador: cria a linha zerada (outra requisição pode ter criado antes)
+        inserir_ignorando_conflito(E, [{
+            'partida_id': partida.id, 'usuario_id': usuario_id, 'gols': 0, 'assistencias': 0,
+            'defesas': 0, 'gols_sofridos': 0, 'desarmes': 0, 'pontuacao_total': 0
+        }])
+        incrementar()
+
+    evento = EventoPartida(partida_id=partida.id, usuario_id=usuario_id, tipo=tipo,
+                           quantidade=quantidade, registrado_por=registrado_por)
+    db.session.add(evento)
+    db.session.flush()
+    return evento
+
+
+def formatar_sse(evento, dados, id=None):
+    linhas = []
+    if id is not None:
+        linhas.append(f'id: {id}')
+    linhas.append(f'event: {evento}')
+    linhas.append(f'data: {json.dumps(dados)}')
+    return '\n'.join(linhas) + '\n\n'
+
+
+class CanalPartida:
+    def __init__(self, transmissor, app, partida_id, ultimo_id):
+        self.transmissor = transmissor
+        self.app = app
+        self.partida_id = partida_id
+        self.ultimo_id = ultimo_id
+        self.inscritos = set()
+        self.acordar = threading.Event()
+        self.thread = threading.Thread(target=self._executar, name=f'ao-vivo-{partida_id}', daemon=True)
+
+    def _ler_novidades(self):
+        with self.app.app_context():
+            try:
+                eventos = EventoPartida.query.filter(
+                    EventoPartida.partida_id == self.partida_id,
+                    EventoPartida.id > self.ultimo_id
+                ).order_by(EventoPartida.id).all()
+                status = db.session.query(Partida.status).filter(Partida.id == self.partida_id).scalar()
+                return [e.to_dict() for e in eventos], status
+            finally:
+                db.session.remove()
+
+    def _executar(self):
+        intervalo = self.app.config['AO_VIVO_INTERVALO']
+        while True:
+            self.acordar.wait(intervalo)
+            self.acordar.clear()
+            if not self.transmissor._manter(self):
+                return
+
+            try:
+                eventos, status = self._ler_novidades()
+            except Exception:
+                continue
+
+            mensagens = [('lance', e) for e in eventos]
+            if eventos:
+                self.ultimo_id = eventos[-1]['id']
+            encerrada = status != 'em_andamento'
+            if encerrada:
+                mensagens.append(('fim', {'status': status}))
+                # Sai do registro e fecha a lista de inscritos de uma vez: quem se
+                # inscrever depois cai num canal novo, que lê o status e recebe o fim
+                filas = self.transmissor._encerrar(self)
+            else:
+                filas = self.transmissor._filas(self)
+
+            for fila in filas:
+                for mensagem in mensagens:
+                    fila.put(mensagem)
+            if encerrada:
+                return
+
+
+class Transmissor:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._canais = {}
+
+    def inscrever(self, app, partida_id, ultimo_id):
+        fila = queue.Queue()
+        with self._lock:
+            canal = self._canais.get(partida_id)
+            if canal is None:
+                canal = CanalPartida(self, app, partida_id, ultimo_id)
+                self._canais[partida_id] = canal
+                canal.thread.start()
+            canal.inscritos.add(fila)
+        return fila
+
+    def cancelar(self, partida_id, fila):
+        with self._lock:
+            canal = self._canais.get(partida_id)
+            if canal is not None:
+                canal.inscritos.discard(fila)
+
+    def notificar(self, partida_id):
+        # Chamado depois do commit de um lance ou de mudança de status
+        with self._lock:
+            canal = self._canais.get(partida_id)
+        if canal is not None:
+            canal.acordar.set()
+
+    def espectadores(self, partida_id):
+        with self._lock:
+            canal = self._canais.get(partida_id)
+            return len(canal.inscritos) if canal else 0
+
+    def _filas(self, canal):
+        with self._lock:
+            return list(canal.inscritos)
+
+    def _manter(self, canal):
+        # O canal some quando o último espectador sai
+        with self._lock:
+            if canal.inscritos:
+                return True
+            if self._canais.get(canal.partida_id) is canal:
+                del self._canais[canal.partida_id]
+            return False
+
+    def _encerrar(self, canal):
+        # Devolve os inscritos finais; a inscrição só acontece com o canal registrado
+        with self._lock:
+            if self._canais.get(canal.partida_id) is canal:
+                del self._canais[canal.partida_id]
+            return list(canal.inscritos)
+
+
+transmissor = Transmissor()
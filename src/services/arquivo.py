@@ -0,0 +1,403 @@
+import json
+import threading
+import zlib
+from collections import OrderedDict
+from datetime import date, datetime, time as hora, timedelta
+from flask import current_app
+from sqlalchemy import select, func, extract, union_all, Date, DateTime, Time
+from src.models.user import (db, User, Partida, PresencaPartida, EstatisticaJogadorPartida, AvaliacaoPartida,
+                             EventoPartida, ApuracaoVoto, ArquivoTemporada, TotalArquivado, DestaquePartida)
+from src.models.types import UUIDKey
+from src.services.destaques import calcular_destaques
+
+# Arquivamento das temporadas antigas.
+#
+# Temporadas (ano) inteiras que terminaram antes de hoje - ARQUIVO_HORIZONTE_DIAS
+# saem das tabelas quentes: presenças, estatísticas, votos, apuração e lances das
+# partidas concluídas viram uma linha de ArquivoTemporada por pelada e ano, em
+# JSON colunar comprimido (IDs codificados como índices de uma lista única). A
+# partida continua em Partida, com arquivada = True.
+#
+# O ranking soma TotalArquivado (totais por jogador e temporada) às estatísticas
+# quentes; ratings, cards, evolução e comparação leem as linhas arquivadas junto
+# com as quentes (carregar_estatisticas); os detalhes de uma partida arquivada
+# vêm do arquivo descomprimido, guardado em um cache do processo. Quando as regras
+# de pontuação mudam, a tarefa agregados_pelada repontua as linhas dentro do
+# próprio arquivo (repontuar), sem devolvê-las às tabelas quentes.
+
+TABELAS = (PresencaPartida, EstatisticaJogadorPartida, AvaliacaoPartida, EventoPartida, ApuracaoVoto)
+CAMPOS_TOTAIS = ('partidas', 'gols', 'assistencias', 'defesas', 'gols_sofridos', 'desarmes',
+                 'pontuacao', 'votos_mvp', 'mvps')
+# O ranking do último mês (tipo=mes) nunca precisa das temporadas arquivadas
+HORIZONTE_MINIMO_DIAS = 31
+
+_cache = OrderedDict()
+_lock = threading.Lock()
+
+
+def _codificar(conteudo):
+    ids, indice = [], {}
+
+    def codigo(valor):
+        if valor is None:
+            return None
+        if valor not in indice:
+            indice[valor] = len(ids)
+            ids.append(valor)
+        return indice[valor]
+
+    tabelas = {}
+    for model in TABELAS:
+        linhas = conteudo.get(model.__tablename__, [])
+        colunas = {}
+        for coluna in model.__table__.columns:
+            valores = [linha.get(coluna.name) for linha in linhas]
+            if isinstance(coluna.type, UUIDKey):
+                valores = [codigo(v) for v in valores]
+            elif isinstance(coluna.type, (DateTime, Date, Time)):
+                valores = [v.isoformat() if v is not None else None for v in valores]
+            colunas[coluna.name] = valores
+        tabelas[model.__tablename__] = colunas
+    return zlib.compress(json.dumps({'ids': ids, 'tabelas': tabelas}, separators=(',', ':')).encode(), 6)
+
+
+def _decodificar(dados):
+    bruto = json.loads(zlib.decompress(dados))
+    ids = bruto['ids']
+    conteudo = {}
+    for model in TABELAS:
+        colunas = bruto['tabelas'].get(model.__tablename__, {})
+        total = len(next(iter(colunas.values()), []))
+        nomes, valores = [], []
+        for coluna in model.__table__.columns:
+            lista = colunas.get(coluna.name, [None] * total)
+            if isinstance(coluna.type, UUIDKey):
+                lista = [ids[v] if v is not None else None for v in lista]
+            elif isinstance(coluna.type, (DateTime, Date, Time)):
+                converter = {DateTime: datetime, Date: date, Time: hora}[type(coluna.type)].fromisoformat
+                lista = [converter(v) if v is not None else None for v in lista]
+            nomes.append(coluna.name)
+            valores.append(lista)
+        conteudo[model.__tablename__] = [dict(zip(nomes, linha)) for linha in zip(*valores)]
+    return conteudo
+
+
+def carregar_arquivo(pelada_id, ano):
+    # Conteúdo descomprimido da temporada ({tabela: [linhas]}) ou None
+    # A versão recomeça se a temporada for restaurada e arquivada de novo: a data entra na chave
+    versao = db.session.execute(select(ArquivoTemporada.versao, ArquivoTemporada.atualizado_em).where(
+        ArquivoTemporada.pelada_id == pelada_id, ArquivoTemporada.ano == ano
+    )).first()
+    if versao is None:
+        return None
+
+    chave = (str(pelada_id), ano, *versao)
+    with _lock:
+        if chave in _cache:
+            _cache.move_to_end(chave)
+            return _cache[chave]
+
+    dados = db.session.execute(select(ArquivoTemporada.dados).where(
+        ArquivoTemporada.pelada_id == pelada_id, ArquivoTemporada.ano == ano
+    )).scalar()
+    conteudo = _decodificar(dados)
+    with _lock:
+        _cache[chave] = conteudo
+        while len(_cache) > current_app.config.get('ARQUIVO_CACHE_MAX', 32):
+            _cache.popitem(last=False)
+    return conteudo
+
+
+def linhas_arquivadas(partida, model):
+    # Objetos (não persistidos) de `model` da partida arquivada, para os mesmos to_dict()
+    conteudo = carregar_arquivo(partida.pelada_id, partida.data_partida.year) or {}
+    return [model(**linha) for linha in conteudo.get(model.__tablename__, ()) if linha['partida_id'] == partida.id]
+
+
+def presencas_arquivadas(pelada_id, ano):
+    # partida_id -> {confirmacao: total} numa passada pela temporada
+    contagem = {}
+    for linha in (carregar_arquivo(pelada_id, ano) or {}).get(PresencaPartida.__tablename__, ()):
+        por_confirmacao = contagem.setdefault(linha['partida_id'], {})
+        por_confirmacao[linha['confirmacao']] = por_confirmacao.get(linha['confirmacao'], 0) + 1
+    return contagem
+
+
+def anos_arquivados(pelada_id):
+    return [ano for (ano,) in db.session.query(ArquivoTemporada.ano).filter(
+        ArquivoTemporada.pelada_id == pelada_id
+    ).order_by(ArquivoTemporada.ano)]
+
+
+def usuarios_arquivados(pelada_id):
+    # Todo usuário referenciado pelas linhas arquivadas da pelada
+    usuarios = set()
+    for ano in anos_arquivados(pelada_id):
+        for model in TABELAS:
+            colunas = [c.name for c in model.__table__.columns
+                       if isinstance(c.type, UUIDKey) and c.name not in ('id', 'partida_id')]
+            for linha in carregar_arquivo(pelada_id, ano)[model.__tablename__]:
+                usuarios.update(linha[c] for c in colunas if linha[c] is not None)
+    return usuarios
+
+
+def estatisticas_arquivadas(colunas, pelada_id=None, usuario_ids=None):
+    # Linhas (partida_id, pelada_id, usuario_id, data_partida, *colunas, hora_inicio)
+    # das partidas arquivadas, no mesmo formato da consulta de carregar_estatisticas
+    consulta = db.session.query(Partida.id, Partida.pelada_id, Partida.data_partida, Partida.hora_inicio).filter(
+        Partida.arquivada.is_(True),
+        Partida.status == 'concluida'
+    )
+    if pelada_id is not None:
+        consulta = consulta.filter(Partida.pelada_id == pelada_id)
+    partidas = {p.id: p for p in consulta}
+    if not partidas:
+        return []
+
+    filtro = set(usuario_ids) if usuario_ids is not None else None
+    linhas = []
+    for pelada, ano in sorted({(p.pelada_id, p.data_partida.year) for p in partidas.values()}):
+        conteudo = carregar_arquivo(pelada, ano) or {}
+        for e in conteudo.get(EstatisticaJogadorPartida.__tablename__, ()):
+            p = partidas.get(e['partida_id'])
+            if p is None or (filtro is not None and e['usuario_id'] not in filtro):
+                continue
+            linhas.append((p.id, p.pelada_id, e['usuario_id'], p.data_partida,
+                           *[e[c] for c in colunas], p.hora_inicio))
+    return linhas
+
+
+def totais_por_usuario(pelada_id=None, usuario_id=None, ano=None, desde=None):
+    # Subconsulta (usuario_id, partidas, gols, ..., pontuacao) das partidas concluídas:
+    # estatísticas quentes + totais das temporadas arquivadas
+    E, T = EstatisticaJogadorPartida, TotalArquivado
+    quentes = select(
+        E.usuario_id.label('usuario_id'),
+        func.count(E.partida_id).label('partidas'),
+        func.coalesce(func.sum(E.gols), 0).label('gols'),
+        func.coalesce(func.sum(E.assistencias), 0).label('assistencias'),
+        func.coalesce(func.sum(E.defesas), 0).label('defesas'),
+        func.coalesce(func.sum(E.gols_sofridos), 0).label('gols_sofridos'),
+        func.coalesce(func.sum(E.desarmes), 0).label('desarmes'),
+        func.coalesce(func.sum(E.pontuacao_total), 0).label('pontuacao'),
+    ).join(Partida, E.partida_id == Partida.id).where(Partida.status == 'concluida')
+    arquivados = select(T.usuario_id, T.partidas, T.gols, T.assistencias, T.defesas,
+                        T.gols_sofridos, T.desarmes, T.pontuacao)
+
+    if pelada_id is not None:
+        quentes = quentes.where(Partida.pelada_id == pelada_id)
+        arquivados = arquivados.where(T.pelada_id == pelada_id)
+    if usuario_id is not None:
+        quentes = quentes.where(E.usuario_id == usuario_id)
+        arquivados = arquivados.where(T.usuario_id == usuario_id)
+    if ano is not None:
+        quentes = quentes.where(extract('year', Partida.data_partida) == ano)
+        arquivados = arquivados.where(T.ano == ano)
+    if desde is not None:
+        # Depois do horizonte mínimo: nada arquivado entra
+        uniao = quentes.where(Partida.data_partida >= desde).group_by(E.usuario_id).subquery()
+    else:
+        uniao = union_all(quentes.group_by(E.usuario_id), arquivados).subquery()
+    return select(
+        uniao.c.usuario_id,
+        *[func.sum(uniao.c[c]).label(c) for c in CAMPOS_TOTAIS[:-2]]
+    ).group_by(uniao.c.usuario_id).subquery()
+
+
+def _recalcular_totais(pelada_id, ano, conteudo):
+    # Totais por jogador das partidas arquivadas da temporada
+    mvp_da_partida = dict(db.session.query(Partida.id, Partida.mvp_id).filter(
+        Partida.pelada_id == pelada_id,
+        Partida.arquivada.is_(True),
+        extract('year', Partida.data_partida) == ano
+    ).all())
+
+    totais = {}
+    for e in conteudo[EstatisticaJogadorPartida.__tablename__]:
+        if e['partida_id'] not in mvp_da_partida:
+            continue
+        t = totais.setdefault(e['usuario_id'], dict.fromkeys(CAMPOS_TOTAIS, 0))
+        t['partidas'] += 1
+        for campo in ('gols', 'assistencias', 'defesas', 'gols_sofridos', 'desarmes'):
+            t[campo] += e[campo] or 0
+        t['pontuacao'] += e['pontuacao_total'] or 0
+        if mvp_da_partida[e['partida_id']] == e['usuario_id']:
+            t['mvps'] += 1
+    for a in conteudo[AvaliacaoPartida.__tablename__]:
+        if a['tipo_avaliacao'] == 'mvp' and a['avaliado_id'] in totais and a['partida_id'] in mvp_da_partida:
+            totais[a['avaliado_id']]['votos_mvp'] += 1
+
+    db.session.query(TotalArquivado).filter(
+        TotalArquivado.pelada_id == pelada_id, TotalArquivado.ano == ano
+    ).delete(synchronize_session=False)
+    if totais:
+        db.session.execute(TotalArquivado.__table__.insert(), [
+            {'pelada_id': pelada_id, 'ano': ano, 'usuario_id': usuario_id, **campos}
+            for usuario_id, campos in totais.items()
+        ])
+
+
+def _pontos(e, pesos, votos, votantes):
+    # A mesma conta de pontuacao._expressao_pontuacao (partidas arquivadas estão concluídas)
+    return (
+        (e['gols'] or 0) * pesos['gol']
+        + (e['assistencias'] or 0) * pesos['assistencia']
+        + (e['defesas'] or 0) * pesos['defesa']
+        + (e['gols_sofridos'] or 0) * pesos['gol_sofrido']
+        + (e['desarmes'] or 0) * pesos['desarme']
+        + votos.get((e['partida_id'], e['usuario_id'], 'mvp'), 0) * pesos['voto_mvp']
+        + votos.get((e['partida_id'], e['usuario_id'], 'bola_murcha'), 0) * pesos['voto_bola_murcha']
+        + (0 if (e['partida_id'], e['usuario_id']) in votantes else pesos['nao_votou'])
+    )
+
+
+def repontuar(pelada_id, pesos):
+    # Aplica `pesos` às temporadas arquivadas da pelada: pontuação, MVP e bola
+    # murcha (empate: menor usuario_id), destaques e totais. Só regrava as
+    # temporadas em que alguma pontuação mudou. Não faz commit.
+    resultado = {'temporadas': 0, 'estatisticas': 0}
+    for registro in ArquivoTemporada.query.filter(ArquivoTemporada.pelada_id == pelada_id).all():
+        conteudo = _decodificar(registro.dados)
+        votos, votantes = {}, set()
+        for a in conteudo[AvaliacaoPartida.__tablename__]:
+            chave = (a['partida_id'], a['avaliado_id'], a['tipo_avaliacao'])
+            votos[chave] = votos.get(chave, 0) + 1
+            votantes.add((a['partida_id'], a['avaliador_id']))
+
+        alteradas = 0
+        por_partida = {}
+        for e in conteudo[EstatisticaJogadorPartida.__tablename__]:
+            pontos = _pontos(e, pesos, votos, votantes)
+            if pontos != e['pontuacao_total']:
+                e['pontuacao_total'] = pontos
+                alteradas += 1
+            por_partida.setdefault(e['partida_id'], []).append(e)
+        if not alteradas:
+            continue
+
+        posicoes = dict(db.session.query(User.id, User.posicao).filter(
+            User.id.in_({e['usuario_id'] for linhas in por_partida.values() for e in linhas})
+        ))
+        destaques = []
+        for partida_id, linhas in por_partida.items():
+            mvp_id = min(linhas, key=lambda e: (-e['pontuacao_total'], e['usuario_id']))['usuario_id']
+            bola_murcha_id = min(linhas, key=lambda e: (e['pontuacao_total'], e['usuario_id']))['usuario_id']
+            db.session.execute(
+                Partida.__table__.update().where(Partida.id == partida_id).values(
+                    mvp_id=mvp_id, bola_murcha_id=bola_murcha_id
+                )
+            )
+            ordenadas = sorted(linhas, key=lambda e: -e['pontuacao_total'])
+            calculados = calcular_destaques(
+                [(EstatisticaJogadorPartida(**e), User(posicao=posicoes.get(e['usuario_id']))) for e in ordenadas],
+                mvp_id, bola_murcha_id
+            )
+            destaques.extend({'partida_id': partida_id, 'tipo': tipo, 'usuario_id': usuario_id, 'valor': int(valor)}
+                             for tipo, (usuario_id, valor) in calculados.items())
+        db.session.query(DestaquePartida).filter(
+            DestaquePartida.partida_id.in_(list(por_partida))
+        ).delete(synchronize_session=False)
+        if destaques:
+            db.session.execute(DestaquePartida.__table__.insert(), destaques)
+
+        _recalcular_totais(pelada_id, registro.ano, conteudo)
+        registro.dados = _codificar(conteudo)
+        registro.versao += 1
+        registro.atualizado_em = datetime.utcnow()
+        resultado['temporadas'] += 1
+        resultado['estatisticas'] += alteradas
+    return resultado
+
+
+def arquivar_temporada(pelada_id, ano, partida_ids):
+    # Move as linhas das partidas para o arquivo da temporada (somando ao que já
+    # estiver arquivado). Não faz commit.
+    registro = db.session.get(ArquivoTemporada, (pelada_id, ano))
+    if registro is not None:
+        conteudo = _decodificar(registro.dados)
+    else:
+        conteudo = {model.__tablename__: [] for model in TABELAS}
+
+    movidas = 0
+    for model in TABELAS:
+        tabela = model.__table__
+        condicao = tabela.c.partida_id.in_(partida_ids)
+        linhas = db.session.execute(
+            select(tabela).where(condicao).order_by(*tabela.primary_key.columns)
+        ).mappings().all()
+        conteudo[model.__tablename__].extend(dict(linha) for linha in linhas)
+        db.session.execute(tabela.delete().where(condicao))
+        movidas += len(linhas)
+
+    db.session.execute(
+        Partida.__table__.update().where(Partida.id.in_(partida_ids)).values(arquivada=True)
+    )
+    db.session.flush()
+    _recalcular_totais(pelada_id, ano, conteudo)
+
+    dados = _codificar(conteudo)
+    if registro is None:
+        registro = ArquivoTemporada(pelada_id=pelada_id, ano=ano, versao=0)
+        db.session.add(registro)
+    registro.dados = dados
+    registro.partidas = (registro.partidas or 0) + len(partida_ids)
+    registro.linhas = sum(len(linhas) for linhas in conteudo.values())
+    registro.versao += 1
+    registro.atualizado_em = datetime.utcnow()
+    return {'linhas': movidas, 'bytes': len(dados)}
+
+
+def arquivar(horizonte_dias=None):
+    # Arquiva as temporadas que terminaram antes do horizonte; uma transação por temporada
+    if horizonte_dias is None:
+        horizonte_dias = current_app.config['ARQUIVO_HORIZONTE_DIAS']
+    resultado = {'temporadas': 0, 'partidas': 0, 'linhas': 0, 'bytes': 0}
+    if not horizonte_dias:
+        return resultado
+    corte = date((date.today() - timedelta(days=max(horizonte_dias, HORIZONTE_MINIMO_DIAS))).year, 1, 1)
+
+    candidatas = db.session.query(Partida.pelada_id, Partida.id, Partida.data_partida).filter(
+        Partida.status == 'concluida',
+        Partida.arquivada.is_(False),
+        Partida.data_partida < corte
+    ).order_by(Partida.pelada_id, Partida.data_partida).all()
+
+    temporadas = OrderedDict()
+    for pelada_id, partida_id, data_partida in candidatas:
+        temporadas.setdefault((pelada_id, data_partida.year), []).append(partida_id)
+
+    for (pelada_id, ano), partida_ids in temporadas.items():
+        movido = arquivar_temporada(pelada_id, ano, partida_ids)
+        db.session.commit()
+        resultado['temporadas'] += 1
+        resultado['partidas'] += len(partida_ids)
+        resultado['linhas'] += movido['linhas']
+        resultado['bytes'] += movido['bytes']
+    return resultado
+
+
+def desarquivar(pelada_id, ano=None):
+    # Devolve as temporadas arquivadas às tabelas quentes. Não faz commit.
+    consulta = ArquivoTemporada.query.filter(ArquivoTemporada.pelada_id == pelada_id)
+    if ano is not None:
+        consulta = consulta.filter(ArquivoTemporada.ano == ano)
+
+    resultado = {'temporadas': 0, 'linhas': 0}
+    for registro in consulta.all():
+        conteudo = _decodificar(registro.dados)
+        for model in TABELAS:
+            linhas = conteudo[model.__tablename__]
+            if linhas:
+                db.session.execute(model.__table__.insert(), linhas)
+            resultado['linhas'] += len(linhas)
+        db.session.execute(Partida.__table__.update().where(
+            Partida.pelada_id == pelada_id,
+            Partida.arquivada.is_(True),
+            extract('year', Partida.data_partida) == registro.ano
+        ).values(arquivada=False))
+        db.session.query(TotalArquivado).filter(
+            TotalArquivado.pelada_id == pelada_id, TotalArquivado.ano == registro.ano
+        ).delete(synchronize_session=False)
+        db.session.delete(registro)
+        resultado['temporadas'] += 1
+    return resultado
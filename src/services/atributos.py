@@ -0,0 +1,85 @@
+from datetime import datetime
+import numpy as np
+from src.models.user import db, AtributosJogador
+from src.services.historico import carregar_estatisticas
+from src.services.rating import ESCOPO_GERAL
+
+# Atributos do card estilo FIFA.
+#
+# Para cada jogador calcula-se a taxa por partida de cada fundamento e o atributo
+# é o percentil dessa taxa entre os jogadores do escopo (pelada ou geral), na
+# escala 0-99. O cálculo é feito em lote sobre a matriz de estatísticas e o
+# resultado fica gravado em AtributosJogador: ver o card é a leitura de uma linha.
+
+
+def percentis(valores):
+    # Percentil médio (empates dividem a posição), escalado para 0-99
+    n = len(valores)
+    if n == 0:
+        return np.array([], dtype=np.int64)
+    ordenados = np.sort(valores)
+    abaixo = np.searchsorted(ordenados, valores, side='left')
+    ate = np.searchsorted(ordenados, valores, side='right')
+    return np.rint((abaixo + ate) / (2.0 * n) * 99).astype(np.int64)
+
+
+def calcular_atributos(historico):
+    usuarios, idx = np.unique(historico['usuario_id'].astype(str), return_inverse=True)
+    if len(usuarios) == 0:
+        return usuarios, {}
+
+    partidas = np.bincount(idx, minlength=len(usuarios)).astype(np.float64)
+
+    def taxa(coluna):
+        return np.bincount(idx, weights=historico[coluna], minlength=len(usuarios)) / partidas
+
+    taxas = {
+        'finalizacao': taxa('gols'),
+        'passe': taxa('assistencias'),
+        'defesa': taxa('desarmes'),
+        'goleiro': taxa('defesas') - taxa('gols_sofridos'),
+        'geral': taxa('pontuacao_total'),
+    }
+    atributos = {nome: percentis(valores) for nome, valores in taxas.items()}
+    atributos['partidas'] = partidas.astype(np.int64)
+    return usuarios, atributos
+
+
+def atualizar_atributos(escopo, historico=None):
+    if historico is None:
+        historico = carregar_estatisticas(pelada_id=None if escopo == ESCOPO_GERAL else escopo)
+    usuarios, atributos = calcular_atributos(historico)
+
+    agora = datetime.utcnow()
+    linhas = [
+        {'usuario_id': str(usuario), 'escopo': escopo, 'atualizado_em': agora,
+         **{nome: int(valores[i]) for nome, valores in atributos.items()}}
+        for i, usuario in enumerate(usuarios)
+    ]
+
+    db.session.query(AtributosJogador).filter(AtributosJogador.escopo == escopo).delete(synchronize_session=False)
+    if linhas:
+        db.session.execute(AtributosJogador.__table__.insert(), linhas)
+    return len(linhas)
+
+
+def atualizar_atributos_partida(partida):
+    # Uma partida concluída muda os percentis da própria pelada e do geral;
+    # as demais peladas ficam intactas
+    atualizar_atributos(partida.pelada_id)
+    atualizar_atributos(ESCOPO_GERAL)
+
+
+def reconstruir_atributos():
+    # Uma única carga do histórico; cada pelada é uma fatia dos mesmos arrays
+    historico = carregar_estatisticas()
+    peladas = historico['pelada_id'].astype(str)
+
+    total = atualizar_atributos(ESCOPO_GERAL, historico)
+    escopos = np.unique(peladas)
+    for pelada_id in escopos:
+        mascara = peladas == pelada_id
+        total += atualizar_atributos(str(pelada_id), {coluna: valores[mascara] for coluna, valores in historico.items()})
+
+    db.session.commit()
+    return {'escopos': len(escopos) + 1, 'atributos': total}
@@ -0,0 +1,210 @@
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+from datetime import datetime, date, time, timedelta, timezone
+from zoneinfo import ZoneInfo
+from flask import current_app
+from sqlalchemy import and_, func, update
+from src.models.user import db, User, Pelada, MembroPelada, Partida, PresencaPartida
+
+# Feeds iCalendar (.ics) das partidas.
+#
+# Cada usuário tem um token na URL do feed (o app de calendário não manda cookie).
+# A versão de um feed vem das marcas Pelada.partidas_alteradas_em (partida criada
+# ou mudou de status) e User.presencas_alteradas_em (presença do usuário mudou):
+# uma consulta pequena lê as marcas, o ETag é derivado delas e o corpo só é
+# montado de novo, com uma única consulta, quando alguma marca muda.
+#
+# Os horários vão em UTC (sufixo Z), convertidos do CALENDARIO_FUSO: um TZID sem o
+# VTIMEZONE correspondente faz vários clientes tratarem a hora como flutuante.
+
+VERSAO_FORMATO = 2
+
+PRESENCAS = {
+    'confirmado': 'Presença confirmada',
+    'nao_confirmado': 'Não vou',
+    'pendente': 'Presença pendente',
+}
+
+
+def marcar_partidas_alteradas(pelada_id):
+    db.session.execute(
+        update(Pelada).where(Pelada.id == pelada_id).values(partidas_alteradas_em=datetime.utcnow()),
+        execution_options={'synchronize_session': False}
+    )
+
+
+def marcar_presencas_alteradas(usuario_ids):
+    db.session.execute(
+        update(User).where(User.id.in_(list(usuario_ids))).values(presencas_alteradas_em=datetime.utcnow()),
+        execution_options={'synchronize_session': False}
+    )
+
+
+def gerar_token(usuario_id):
+    # Um token novo invalida as URLs antigas
+    token = secrets.token_urlsafe(32)
+    db.session.execute(
+        update(User).where(User.id == usuario_id).values(token_calendario=token),
+        execution_options={'synchronize_session': False}
+    )
+    return token
+
+
+def versao_feed(token, pelada_id=None):
+    # Marcas do feed em uma consulta; None se o token não existe ou o usuário não é membro
+    if pelada_id:
+        row = db.session.query(
+            User.id, User.presencas_alteradas_em, Pelada.partidas_alteradas_em, Pelada.nome
+        ).join(MembroPelada, MembroPelada.usuario_id == User.id).join(
+            Pelada, Pelada.id == MembroPelada.pelada_id
+        ).filter(User.token_calendario == token, MembroPelada.pelada_id == pelada_id).first()
+        if not row:
+            return None
+        usuario_id, presencas_em, partidas_em, nome = row
+        membros = 1
+    else:
+        row = db.session.query(
+            User.id, User.presencas_alteradas_em,
+            func.max(Pelada.partidas_alteradas_em), func.count(MembroPelada.pelada_id)
+        ).outerjoin(MembroPelada, MembroPelada.usuario_id == User.id).outerjoin(
+            Pelada, Pelada.id == MembroPelada.pelada_id
+        ).filter(User.token_calendario == token).group_by(User.id, User.presencas_alteradas_em).first()
+        if not row:
+            return None
+        usuario_id, presencas_em, partidas_em, membros = row
+        nome = 'O Rei da Pelada'
+
+    # A janela de partidas passadas anda com o dia, então o dia também entra na versão
+    hoje = date.today()
+    marcas = [m for m in (presencas_em, partidas_em) if m]
+    ultima_modificacao = max(marcas + [datetime.combine(hoje, time())])
+    versao = f'{VERSAO_FORMATO}:{usuario_id}:{pelada_id}:{partidas_em}:{presencas_em}:{membros}:{hoje}'
+    return {
+        'usuario_id': usuario_id,
+        'pelada_id': pelada_id,
+        'nome': nome,
+        'hoje': hoje,
+        'etag': hashlib.sha1(versao.encode()).hexdigest(),
+        'ultima_modificacao': ultima_modificacao.replace(microsecond=0),
+    }
+
+
+def _escapar(texto):
+    return (texto or '').replace('\\', '\\\\').replace(';', '\\;').replace(',', '\\,').replace('\n', '\\n')
+
+
+def _dobrar(linha):
+    # RFC 5545: linhas de no máximo 75 octetos, continuação começa com espaço
+    partes = []
+    atual, tamanho = '', 0
+    for caractere in linha:
+        octetos = len(caractere.encode('utf-8'))
+        if tamanho + octetos > 75:
+            partes.append(atual)
+            atual, tamanho = ' ', 1
+        atual += caractere
+        tamanho += octetos
+    partes.append(atual)
+    return '\r\n'.join(partes)
+
+
+def _horarios(data_partida, hora_inicio, hora_fim, duracao_minutos):
+    inicio = datetime.combine(data_partida, hora_inicio)
+    if hora_fim is None:
+        return inicio, inicio + timedelta(minutes=duracao_minutos)
+    fim = datetime.combine(data_partida, hora_fim)
+    if fim <= inicio:
+        fim += timedelta(days=1)
+    return inicio, fim
+
+
+def _utc(horario, fuso):
+    # Hora local da partida -> DATE-TIME em UTC (horário de verão resolvido pelo zoneinfo)
+    return horario.replace(tzinfo=fuso).astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')
+
+
+def montar_feed(versao):
+    config = current_app.config
+    fuso = ZoneInfo(config['CALENDARIO_FUSO'])
+    usuario_id = versao['usuario_id']
+
+    # Uma consulta: partidas das peladas do usuário com a presença dele
+    consulta = db.session.query(
+        Partida.id, Partida.data_partida, Partida.hora_inicio, Partida.hora_fim, Partida.status,
+        Pelada.nome, Pelada.local, PresencaPartida.confirmacao
+    ).join(Pelada, Pelada.id == Partida.pelada_id).join(
+        MembroPelada, and_(MembroPelada.pelada_id == Partida.pelada_id, MembroPelada.usuario_id == usuario_id)
+    ).outerjoin(
+        PresencaPartida, and_(PresencaPartida.partida_id == Partida.id, PresencaPartida.usuario_id == usuario_id)
+    ).filter(Partida.data_partida >= versao['hoje'] - timedelta(days=config['CALENDARIO_DIAS_PASSADOS']))
+    if versao['pelada_id']:
+        consulta = consulta.filter(Partida.pelada_id == versao['pelada_id'])
+
+    carimbo = versao['ultima_modificacao'].strftime('%Y%m%dT%H%M%SZ')
+    linhas = [
+        'BEGIN:VCALENDAR',
+        'VERSION:2.0',
+        'PRODID:-//O Rei da Pelada//Partidas//PT-BR',
+        'CALSCALE:GREGORIAN',
+        'METHOD:PUBLISH',
+        f"X-WR-CALNAME:{_escapar(versao['nome'])}",
+        f"X-WR-TIMEZONE:{config['CALENDARIO_FUSO']}",
+    ]
+    for partida_id, data_partida, hora_inicio, hora_fim, status, nome, local, confirmacao in consulta.order_by(
+            Partida.data_partida, Partida.hora_inicio):
+        inicio, fim = _horarios(data_partida, hora_inicio, hora_fim, config['CALENDARIO_DURACAO_MINUTOS'])
+        presenca = PRESENCAS.get(confirmacao or 'pendente', confirmacao)
+        linhas += [
+            'BEGIN:VEVENT',
+            f'UID:{partida_id}@reidapelada',
+            f'DTSTAMP:{carimbo}',
+            f'DTSTART:{_utc(inicio, fuso)}',
+            f'DTEND:{_utc(fim, fuso)}',
+            f'SUMMARY:{_escapar(nome)}',
+            f'LOCATION:{_escapar(local)}',
+            f'DESCRIPTION:{_escapar(presenca)}\\nPartida: {_escapar(status)}',
+            'STATUS:CONFIRMED',
+            # Quem avisou que não vai não fica com o horário ocupado
+            'TRANSP:TRANSPARENT' if confirmacao == 'nao_confirmado' else 'TRANSP:OPAQUE',
+            'END:VEVENT',
+        ]
+    linhas.append('END:VCALENDAR')
+    return '\r\n'.join(_dobrar(linha) for linha in linhas) + '\r\n'
+
+
+class CacheFeeds:
+    # LRU por processo: (usuario_id, pelada_id) -> (etag, corpo)
+
+    def __init__(self):
+        self._itens = OrderedDict()
+        self._lock = threading.Lock()
+
+    def obter(self, versao):
+        chave = (versao['usuario_id'], versao['pelada_id'])
+        with self._lock:
+            item = self._itens.get(chave)
+            if item and item[0] == versao['etag']:
+                self._itens.move_to_end(chave)
+                return item[1]
+        return None
+
+    def guardar(self, versao, corpo, maximo):
+        chave = (versao['usuario_id'], versao['pelada_id'])
+        with self._lock:
+            self._itens[chave] = (versao['etag'], corpo)
+            self._itens.move_to_end(chave)
+            while len(self._itens) > maximo:
+                self._itens.popitem(last=False)
+
+
+cache_feeds = CacheFeeds()
+
+
+def feed(versao):
+    corpo = cache_feeds.obter(versao)
+    if corpo is None:
+        corpo = montar_feed(versao)
+        cache_feeds.guardar(versao, corpo, current_app.config['CALENDARIO_CACHE_MAX'])
+    return corpo
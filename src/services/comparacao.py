@@ -0,0 +1,60 @@
+import numpy as np
+from src.services.historico import COLUNAS_ESTATISTICA
+
+# Comparação entre jogadores de uma mesma pelada.
+#
+# Recebe o recorte colunar do histórico (carregar_estatisticas com pelada_id e
+# usuario_ids) e monta matrizes jogador x partida; todas as métricas por par
+# saem de operações de broadcast sobre essas matrizes, sem laço por par.
+
+
+def comparar_jogadores(historico, usuario_ids):
+    n = len(usuario_ids)
+    posicao = {usuario_id: i for i, usuario_id in enumerate(usuario_ids)}
+    linha = np.array([posicao[str(u)] for u in historico['usuario_id']], dtype=np.int64)
+    partidas, coluna = np.unique(historico['partida_id'].astype(str), return_inverse=True)
+
+    jogou = np.zeros((n, len(partidas)), dtype=bool)
+    pontos = np.zeros((n, len(partidas)))
+    jogou[linha, coluna] = True
+    pontos[linha, coluna] = historico['pontuacao_total']
+
+    total_partidas = jogou.sum(axis=1)
+    divisor = np.maximum(total_partidas, 1)
+    totais = {c: np.bincount(linha, weights=historico[c], minlength=n) for c in COLUNAS_ESTATISTICA}
+
+    jogadores = []
+    for i, usuario_id in enumerate(usuario_ids):
+        jogadores.append({
+            'usuario_id': usuario_id,
+            'total_partidas': int(total_partidas[i]),
+            'totais': {c: int(totais[c][i]) for c in COLUNAS_ESTATISTICA},
+            'por_partida': {c: round(float(totais[c][i] / divisor[i]), 2) for c in COLUNAS_ESTATISTICA}
+        })
+
+    # juntos[i, j, p]: i e j atuaram na partida p
+    juntos = jogou[:, None, :] & jogou[None, :, :]
+    partidas_juntos = juntos.sum(axis=2)
+    vitorias = ((pontos[:, None, :] > pontos[None, :, :]) & juntos).sum(axis=2)
+    soma_juntos = (pontos[:, None, :] * juntos).sum(axis=2)
+    media_juntos = soma_juntos / np.maximum(partidas_juntos, 1)
+
+    confrontos = []
+    for i, j in zip(*np.triu_indices(n, k=1)):
+        confrontos.append({
+            'usuario_a': usuario_ids[i],
+            'usuario_b': usuario_ids[j],
+            'partidas_juntos': int(partidas_juntos[i, j]),
+            'vitorias_a': int(vitorias[i, j]),
+            'vitorias_b': int(vitorias[j, i]),
+            'empates': int(partidas_juntos[i, j] - vitorias[i, j] - vitorias[j, i]),
+            'media_a': round(float(media_juntos[i, j]), 2),
+            'media_b': round(float(media_juntos[j, i]), 2)
+        })
+
+    return {
+        'jogadores': jogadores,
+        'confrontos': confrontos,
+        'partidas_juntos': partidas_juntos.tolist(),
+        'partidas_todos_juntos': int(jogou.all(axis=0).sum())
+    }
@@ -0,0 +1,220 @@
+from itertools import groupby
+from sqlalchemy import select, func, extract
+from src.models.user import (db, User, Partida, EstatisticaJogadorPartida, AvaliacaoPartida,
+                             DestaquePartida, EstatisticaTemporada, TotalArquivado)
+
+# Destaques da partida e prêmios da temporada.
+#
+# Uma partida concluída não muda mais (exceto quando as regras de pontuação da
+# pelada mudam, e aí tudo é reconstruído), então os destaques são calculados uma
+# vez na finalização e os totais da temporada são acumulados incrementalmente.
+
+TIPOS_DESTAQUE = ('artilheiro', 'garcom', 'xerife', 'paredao', 'mvp', 'bola_murcha')
+CAMPOS_TEMPORADA = ('partidas', 'gols', 'assistencias', 'defesas', 'gols_sofridos', 'desarmes',
+                    'pontuacao', 'votos_mvp', 'mvps')
+
+
+def calcular_destaques(linhas, mvp_id, bola_murcha_id):
+    # linhas: (estatistica, usuario) ordenadas por pontuação decrescente.
+    # Mesmo critério de antes: o primeiro a superar o máximo leva (empate fica com
+    # quem pontuou mais) e zero não dá destaque.
+    destaques = {}
+    maximos = {'artilheiro': 0, 'garcom': 0, 'xerife': 0, 'paredao': 0}
+
+    for estatistica, usuario in linhas:
+        valores = {
+            'artilheiro': estatistica.gols or 0,
+            'garcom': estatistica.assistencias or 0,
+            'xerife': estatistica.desarmes or 0,
+            'paredao': (estatistica.pontuacao_total or 0) if usuario.posicao == 'Goleiro' else 0
+        }
+        for tipo, valor in valores.items():
+            if valor > maximos[tipo]:
+                maximos[tipo] = valor
+                destaques[tipo] = (estatistica.usuario_id, valor)
+
+        if estatistica.usuario_id == mvp_id:
+            destaques['mvp'] = (mvp_id, estatistica.pontuacao_total or 0)
+        if estatistica.usuario_id == bola_murcha_id:
+            destaques['bola_murcha'] = (bola_murcha_id, estatistica.pontuacao_total or 0)
+
+    return destaques
+
+
+def _linhas_destaque(partida_id):
+    return db.session.query(EstatisticaJogadorPartida, User).join(
+        User, User.id == EstatisticaJogadorPartida.usuario_id
+    ).filter(
+        EstatisticaJogadorPartida.partida_id == partida_id
+    ).order_by(
+        EstatisticaJogadorPartida.pontuacao_total.desc()
+    ).all()
+
+
+def registrar_destaques(partida):
+    # Chamado ao finalizar a partida (antes do commit), com MVP e bola murcha definidos
+    destaques = calcular_destaques(_linhas_destaque(partida.id), partida.mvp_id, partida.bola_murcha_id)
+
+    db.session.query(DestaquePartida).filter(
+        DestaquePartida.partida_id == partida.id
+    ).delete(synchronize_session=False)
+    if destaques:
+        db.session.execute(DestaquePartida.__table__.insert(), [
+            {'partida_id': partida.id, 'tipo': tipo, 'usuario_id': usuario_id, 'valor': int(valor)}
+            for tipo, (usuario_id, valor) in destaques.items()
+        ])
+
+
+def atualizar_temporada_partida(partida):
+    # Soma a partida recém-finalizada aos totais da temporada de cada jogador
+    ano = partida.data_partida.year
+    estatisticas = EstatisticaJogadorPartida.query.filter_by(partida_id=partida.id).all()
+    if not estatisticas:
+        return
+
+    votos = dict(db.session.query(
+        AvaliacaoPartida.avaliado_id, func.count()
+    ).filter(
+        AvaliacaoPartida.partida_id == partida.id,
+        AvaliacaoPartida.tipo_avaliacao == 'mvp'
+    ).group_by(AvaliacaoPartida.avaliado_id).all())
+
+    usuario_ids = [e.usuario_id for e in estatisticas]
+    existentes = {t.usuario_id: t for t in EstatisticaTemporada.query.filter(
+        EstatisticaTemporada.pelada_id == partida.pelada_id,
+        EstatisticaTemporada.ano == ano,
+        EstatisticaTemporada.usuario_id.in_(usuario_ids)
+    ).order_by(EstatisticaTemporada.usuario_id).with_for_update()}
+
+    for estatistica in estatisticas:
+        temporada = existentes.get(estatistica.usuario_id)
+        if temporada is None:
+            temporada = EstatisticaTemporada(pelada_id=partida.pelada_id, ano=ano, usuario_id=estatistica.usuario_id,
+                                             **{campo: 0 for campo in CAMPOS_TEMPORADA})
+            db.session.add(temporada)
+
+        temporada.partidas += 1
+        temporada.gols += estatistica.gols or 0
+        temporada.assistencias += estatistica.assistencias or 0
+        temporada.defesas += estatistica.defesas or 0
+        temporada.gols_sofridos += estatistica.gols_sofridos or 0
+        temporada.desarmes += estatistica.desarmes or 0
+        temporada.pontuacao += estatistica.pontuacao_total or 0
+        temporada.votos_mvp += votos.get(estatistica.usuario_id, 0)
+        if estatistica.usuario_id == partida.mvp_id:
+            temporada.mvps += 1
+
+
+def reconstruir_destaques(pelada_id):
+    # Uma consulta para todas as partidas concluídas da pelada
+    linhas = db.session.query(
+        EstatisticaJogadorPartida, User, Partida.mvp_id, Partida.bola_murcha_id
+    ).join(
+        User, User.id == EstatisticaJogadorPartida.usuario_id
+    ).join(
+        Partida, Partida.id == EstatisticaJogadorPartida.partida_id
+    ).filter(
+        Partida.pelada_id == pelada_id,
+        Partida.status == 'concluida'
+    ).order_by(
+        Partida.id, EstatisticaJogadorPartida.pontuacao_total.desc()
+    ).all()
+
+    novos = []
+    for partida_id, grupo in groupby(linhas, key=lambda linha: linha[0].partida_id):
+        grupo = list(grupo)
+        destaques = calcular_destaques([(e, u) for e, u, _, _ in grupo], grupo[0][2], grupo[0][3])
+        novos.extend({'partida_id': partida_id, 'tipo': tipo, 'usuario_id': usuario_id, 'valor': int(valor)}
+                     for tipo, (usuario_id, valor) in destaques.items())
+
+    # Destaques das partidas arquivadas ficam como estão (as estatísticas não estão mais aqui)
+    partidas_da_pelada = select(Partida.id).where(Partida.pelada_id == pelada_id, Partida.arquivada.is_(False))
+    db.session.query(DestaquePartida).filter(
+        DestaquePartida.partida_id.in_(partidas_da_pelada)
+    ).delete(synchronize_session=False)
+    if novos:
+        db.session.execute(DestaquePartida.__table__.insert(), novos)
+
+
+def reconstruir_temporadas(pelada_id):
+    # Partidas quentes somadas aos totais das temporadas arquivadas
+    E = EstatisticaJogadorPartida
+    ano = extract('year', Partida.data_partida)
+    da_pelada = (Partida.pelada_id == pelada_id, Partida.status == 'concluida', Partida.arquivada.is_(False))
+
+    totais = db.session.query(
+        ano.label('ano'), E.usuario_id,
+        func.count(E.partida_id), func.sum(E.gols), func.sum(E.assistencias), func.sum(E.defesas),
+        func.sum(E.gols_sofridos), func.sum(E.desarmes), func.sum(E.pontuacao_total)
+    ).join(Partida, Partida.id == E.partida_id).filter(*da_pelada).group_by(ano, E.usuario_id).all()
+
+    votos = db.session.query(
+        ano.label('ano'), AvaliacaoPartida.avaliado_id, func.count()
+    ).join(Partida, Partida.id == AvaliacaoPartida.partida_id).filter(
+        *da_pelada, AvaliacaoPartida.tipo_avaliacao == 'mvp'
+    ).group_by(ano, AvaliacaoPartida.avaliado_id).all()
+
+    mvps = db.session.query(
+        ano.label('ano'), Partida.mvp_id, func.count(Partida.id)
+    ).filter(*da_pelada, Partida.mvp_id.isnot(None)).group_by(ano, Partida.mvp_id).all()
+
+    linhas = {}
+    for row in totais:
+        chave = (int(row[0]), row[1])
+        linhas[chave] = dict(zip(CAMPOS_TEMPORADA, [int(v or 0) for v in row[2:]] + [0, 0]))
+    for a, usuario_id, total in votos:
+        if (int(a), usuario_id) in linhas:
+            linhas[(int(a), usuario_id)]['votos_mvp'] = total
+    for a, usuario_id, total in mvps:
+        if (int(a), usuario_id) in linhas:
+            linhas[(int(a), usuario_id)]['mvps'] = total
+    for arquivado in TotalArquivado.query.filter_by(pelada_id=pelada_id):
+        campos = linhas.setdefault((arquivado.ano, arquivado.usuario_id), dict.fromkeys(CAMPOS_TEMPORADA, 0))
+        for campo in CAMPOS_TEMPORADA:
+            campos[campo] += getattr(arquivado, campo)
+
+    db.session.query(EstatisticaTemporada).filter(
+        EstatisticaTemporada.pelada_id == pelada_id
+    ).delete(synchronize_session=False)
+    if linhas:
+        db.session.execute(EstatisticaTemporada.__table__.insert(), [
+            {'pelada_id': pelada_id, 'ano': a, 'usuario_id': usuario_id, **campos}
+            for (a, usuario_id), campos in linhas.items()
+        ])
+
+
+def reconstruir_todos_destaques():
+    peladas = [p for (p,) in db.session.query(Partida.pelada_id).filter(Partida.status == 'concluida').distinct()]
+    for pelada_id in peladas:
+        reconstruir_destaques(pelada_id)
+        reconstruir_temporadas(pelada_id)
+    db.session.commit()
+    return {'peladas': len(peladas)}
+
+
+def premios_temporada(pelada_id, ano):
+    # Prêmios a partir dos totais já acumulados: uma leitura pelo índice (pelada_id, ano)
+    linhas = db.session.query(EstatisticaTemporada, User).join(
+        User, User.id == EstatisticaTemporada.usuario_id
+    ).filter(
+        EstatisticaTemporada.pelada_id == pelada_id,
+        EstatisticaTemporada.ano == ano
+    ).all()
+
+    def melhor(valor, candidatos=linhas):
+        candidatos = [(valor(t), t, u) for t, u in candidatos]
+        candidatos = [c for c in candidatos if c[0] > 0]
+        if not candidatos:
+            return None
+        v, temporada, usuario = max(candidatos, key=lambda c: (c[0], c[1].partidas))
+        return {'usuario': usuario.to_dict(), 'valor': round(v, 2) if isinstance(v, float) else v,
+                'partidas': temporada.partidas}
+
+    goleiros = [(t, u) for t, u in linhas if u.posicao == 'Goleiro']
+    return {
+        'artilheiro': melhor(lambda t: t.gols),
+        'garcom': melhor(lambda t: t.assistencias),
+        'mais_votado_mvp': melhor(lambda t: t.votos_mvp),
+        'melhor_goleiro': melhor(lambda t: t.pontuacao / t.partidas if t.partidas else 0.0, goleiros),
+        'jogadores': len(linhas)
+    }
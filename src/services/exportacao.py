@@ -0,0 +1,327 @@
+import json
+import time
+import uuid
+from datetime import datetime, date, time as hora
+from decimal import Decimal, InvalidOperation
+from sqlalchemy import select, union, or_, Date, DateTime, Time, Float, Numeric, Integer
+from src.models.user import (
+    db, User, Pelada, RegraPontuacao, MembroPelada, SolicitacaoPelada, Mensalista, Financeiro,
+    Partida, PresencaPartida, EstatisticaJogadorPartida, EventoPartida, AvaliacaoPartida, ApuracaoVoto
+)
+from src.models.types import UUIDKey
+from src.services.jobs import enfileirar
+from src.services import arquivo
+
+# Exportação e importação do histórico completo de uma pelada em NDJSON.
+#
+# A primeira linha é o cabeçalho ({"formato": "rei-da-pelada", "versao": 1, ...});
+# cada linha seguinte é {"tabela": ..., "linha": {...}}, com as tabelas na ordem de
+# TABELAS (pais antes dos filhos). Só vão os dados de origem: ratings, cards,
+# evolução do ranking, destaques e temporadas são recalculados depois da importação.
+# Hashes de senha só vão com com_senhas=True; tokens de calendário e sessões nunca.
+# Linhas de temporadas arquivadas saem junto com as quentes da mesma tabela e
+# voltam como linhas quentes (a partida importada não fica arquivada).
+#
+# A importação lê o arquivo duas vezes: a primeira só valida, a segunda grava em
+# lotes de LOTE linhas (um INSERT por lote), todos na mesma transação. Todos os IDs ganham valores novos;
+# usuários cujo e-mail já existe no destino são reaproveitados.
+
+FORMATO = 'rei-da-pelada'
+VERSAO = 1
+LOTE = 1000
+SENHA_INVALIDA = '!'  # nunca confere: o usuário importado sem senha precisa de uma nova
+
+
+class ErroImportacao(Exception):
+    pass
+
+
+def _da_partida(model):
+    return lambda pelada_id: model.partida_id.in_(select(Partida.id).where(Partida.pelada_id == pelada_id))
+
+
+def _usuarios_da_pelada(pelada_id):
+    # Todo usuário referenciado por alguma linha da pelada
+    P, E, A, Ev = Partida, EstatisticaJogadorPartida, AvaliacaoPartida, EventoPartida
+    partidas = select(P.id).where(P.pelada_id == pelada_id)
+    arquivados = arquivo.usuarios_arquivados(pelada_id)
+    filtro = User.id.in_(union(
+        select(Pelada.admin_id).where(Pelada.id == pelada_id),
+        select(MembroPelada.usuario_id).where(MembroPelada.pelada_id == pelada_id),
+        select(SolicitacaoPelada.usuario_id).where(SolicitacaoPelada.pelada_id == pelada_id),
+        select(Mensalista.usuario_id).where(Mensalista.pelada_id == pelada_id),
+        select(Financeiro.registrado_por).where(Financeiro.pelada_id == pelada_id),
+        select(P.mvp_id).where(P.pelada_id == pelada_id, P.mvp_id.isnot(None)),
+        select(P.bola_murcha_id).where(P.pelada_id == pelada_id, P.bola_murcha_id.isnot(None)),
+        select(PresencaPartida.usuario_id).where(PresencaPartida.partida_id.in_(partidas)),
+        select(E.usuario_id).where(E.partida_id.in_(partidas)),
+        select(A.avaliador_id).where(A.partida_id.in_(partidas)),
+        select(A.avaliado_id).where(A.partida_id.in_(partidas)),
+        select(Ev.usuario_id).where(Ev.partida_id.in_(partidas)),
+        select(Ev.registrado_por).where(Ev.partida_id.in_(partidas), Ev.registrado_por.isnot(None)),
+    ))
+    return or_(filtro, User.id.in_(list(arquivados))) if arquivados else filtro
+
+
+# (modelo, filtro pela pelada, colunas que não saem, ordenação)
+TABELAS = [
+    (User, _usuarios_da_pelada, {'senha_hash', 'token_calendario', 'presencas_alteradas_em'}, None),
+    (Pelada, lambda pelada_id: Pelada.id == pelada_id, {'partidas_alteradas_em'}, None),
+    (RegraPontuacao, lambda pelada_id: RegraPontuacao.pelada_id == pelada_id, set(), None),
+    (MembroPelada, lambda pelada_id: MembroPelada.pelada_id == pelada_id, set(), None),
+    (SolicitacaoPelada, lambda pelada_id: SolicitacaoPelada.pelada_id == pelada_id, set(), None),
+    (Mensalista, lambda pelada_id: Mensalista.pelada_id == pelada_id, set(), None),
+    (Financeiro, lambda pelada_id: Financeiro.pelada_id == pelada_id, set(), Financeiro.data_movimento),
+    (Partida, lambda pelada_id: Partida.pelada_id == pelada_id, {'arquivada', 'agregados_em'}, Partida.data_partida),
+    (PresencaPartida, _da_partida(PresencaPartida), set(), None),
+    (EstatisticaJogadorPartida, _da_partida(EstatisticaJogadorPartida), set(), None),
+    # O id dos lances é sequencial no banco: sai a ordem, o destino numera de novo
+    (EventoPartida, _da_partida(EventoPartida), {'id'}, EventoPartida.id),
+    (AvaliacaoPartida, _da_partida(AvaliacaoPartida), set(), None),
+    (ApuracaoVoto, _da_partida(ApuracaoVoto), set(), None),
+]
+
+ORDEM = {model.__tablename__: indice for indice, (model, _, _, _) in enumerate(TABELAS)}
+
+
+def _colunas(model, excluidas, com_senhas=False):
+    return [
+        c for c in model.__table__.columns
+        if c.name not in excluidas or (com_senhas and c.name == 'senha_hash')
+    ]
+
+
+def _para_json(valor):
+    if isinstance(valor, (datetime, date, hora)):
+        return valor.isoformat()
+    if isinstance(valor, Decimal):
+        return str(valor)
+    raise TypeError(f'{type(valor).__name__} não serializável')
+
+
+def _linha_ndjson(nome, linha):
+    return json.dumps(
+        {'tabela': nome, 'linha': linha},
+        default=_para_json, ensure_ascii=False, separators=(',', ':')
+    ) + '\n'
+
+
+def exportar_pelada(pelada_id, com_senhas=False, contagem=None):
+    # Gerador de linhas NDJSON; lê cada tabela em streaming (memória constante)
+    if db.session.get(Pelada, pelada_id) is None:
+        raise ErroImportacao('Pelada não encontrada')
+    anos = arquivo.anos_arquivados(pelada_id)
+
+    yield json.dumps({
+        'formato': FORMATO, 'versao': VERSAO, 'pelada_id': pelada_id,
+        'exportado_em': datetime.utcnow().isoformat(), 'com_senhas': com_senhas
+    }) + '\n'
+
+    with db.engine.connect() as conn:
+        for model, filtro, excluidas, ordem in TABELAS:
+            colunas = _colunas(model, excluidas, com_senhas)
+            consulta = select(*colunas).where(filtro(pelada_id))
+            if ordem is not None:
+                consulta = consulta.order_by(ordem)
+            resultado = conn.execution_options(stream_results=True, yield_per=LOTE).execute(consulta)
+            nome = model.__tablename__
+            for linha in resultado:
+                if contagem is not None:
+                    contagem[nome] = contagem.get(nome, 0) + 1
+                yield _linha_ndjson(nome, dict(linha._mapping))
+
+            if model not in arquivo.TABELAS:
+                continue
+            # Uma temporada descomprimida por vez
+            nomes = [c.name for c in colunas]
+            for ano in anos:
+                for linha in arquivo.carregar_arquivo(pelada_id, ano)[nome]:
+                    if contagem is not None:
+                        contagem[nome] = contagem.get(nome, 0) + 1
+                    yield _linha_ndjson(nome, {c: linha[c] for c in nomes})
+
+
+def _conversor(coluna):
+    tipo = coluna.type
+    if isinstance(tipo, DateTime):
+        return datetime.fromisoformat
+    if isinstance(tipo, Date):
+        return date.fromisoformat
+    if isinstance(tipo, Time):
+        return hora.fromisoformat
+    if isinstance(tipo, Float):
+        return float
+    if isinstance(tipo, Numeric):
+        return lambda valor: Decimal(str(valor))
+    if isinstance(tipo, Integer):
+        return int
+    return None
+
+
+class _Leitor:
+    # Valida e converte as linhas do arquivo; mapa leva cada ID antigo ao novo
+
+    def __init__(self, gravar):
+        self.gravar = gravar
+        self.mapa = {}
+        self.esquemas = {}
+        for model, _, excluidas, _ in TABELAS:
+            colunas = {c.name: c for c in _colunas(model, excluidas, com_senhas=True)}
+            self.esquemas[model.__tablename__] = (model, colunas, {n: _conversor(c) for n, c in colunas.items()})
+
+    def _id(self, numero, coluna, valor):
+        if valor is None:
+            if not coluna.nullable or coluna.primary_key:
+                raise ErroImportacao(f'linha {numero}: {coluna.table.name}.{coluna.name} é obrigatório')
+            return None
+        if not isinstance(valor, str):
+            raise ErroImportacao(f'linha {numero}: {coluna.table.name}.{coluna.name} inválido')
+        if coluna.primary_key and not coluna.foreign_keys:
+            # Entidade nova: ganha outro ID
+            if valor in self.mapa:
+                raise ErroImportacao(f'linha {numero}: ID {valor} repetido')
+            self.mapa[valor] = str(uuid.uuid4()) if self.gravar else valor
+            return self.mapa[valor]
+        if valor not in self.mapa:
+            raise ErroImportacao(f'linha {numero}: {coluna.table.name}.{coluna.name} aponta para {valor}, que não veio antes no arquivo')
+        return self.mapa[valor]
+
+    def converter(self, numero, tabela, linha):
+        model, colunas, conversores = self.esquemas[tabela]
+        if not isinstance(linha, dict):
+            raise ErroImportacao(f'linha {numero}: linha deve ser um objeto')
+        desconhecidas = set(linha) - set(colunas)
+        if desconhecidas:
+            raise ErroImportacao(f"linha {numero}: colunas desconhecidas em {tabela}: {', '.join(sorted(desconhecidas))}")
+
+        registro = {}
+        for nome, coluna in colunas.items():
+            valor = linha.get(nome)
+            if isinstance(coluna.type, UUIDKey):
+                registro[nome] = self._id(numero, coluna, valor)
+            elif nome not in linha and coluna.default is not None:
+                padrao = coluna.default
+                registro[nome] = padrao.arg(None) if padrao.is_callable else padrao.arg
+            elif valor is None:
+                if not coluna.nullable and nome != 'senha_hash':
+                    raise ErroImportacao(f'linha {numero}: {tabela}.{nome} é obrigatório')
+                registro[nome] = None
+            else:
+                try:
+                    registro[nome] = conversores[nome](valor) if conversores[nome] else valor
+                except (TypeError, ValueError, InvalidOperation):
+                    raise ErroImportacao(f'linha {numero}: {tabela}.{nome} inválido: {valor!r}')
+        if model is User and registro['senha_hash'] is None:
+            registro['senha_hash'] = SENHA_INVALIDA
+        return model, registro
+
+    def linhas(self, arquivo):
+        # Gera (número, tabela, linha crua) conferindo cabeçalho e ordem das tabelas
+        cabecalho = None
+        atual = -1
+        peladas = 0
+        for numero, texto in enumerate(arquivo, start=1):
+            if not texto.strip():
+                continue
+            try:
+                dado = json.loads(texto)
+            except ValueError:
+                raise ErroImportacao(f'linha {numero}: JSON inválido')
+            if cabecalho is None:
+                if not isinstance(dado, dict) or dado.get('formato') != FORMATO:
+                    raise ErroImportacao('Arquivo não é uma exportação de pelada')
+                if dado.get('versao') != VERSAO:
+                    raise ErroImportacao(f"Versão {dado.get('versao')} não suportada")
+                cabecalho = dado
+                continue
+            tabela = dado.get('tabela') if isinstance(dado, dict) else None
+            if tabela not in ORDEM:
+                raise ErroImportacao(f'linha {numero}: tabela desconhecida {tabela!r}')
+            if ORDEM[tabela] < atual:
+                raise ErroImportacao(f'linha {numero}: {tabela} fora da ordem de dependência')
+            atual = ORDEM[tabela]
+            if tabela == Pelada.__tablename__:
+                peladas += 1
+                if peladas > 1:
+                    raise ErroImportacao(f'linha {numero}: mais de uma pelada no arquivo')
+            yield numero, tabela, dado.get('linha')
+        if cabecalho is None or not peladas:
+            raise ErroImportacao('Arquivo sem pelada')
+
+
+def _gravar_lote(model, lote, resultado):
+    # Sem commit: a importação inteira é uma transação só
+    if model is User:
+        # E-mail já cadastrado no destino: usa o usuário existente
+        existentes = dict(db.session.execute(
+            select(User.email, User.id).where(User.email.in_([r['email'] for r in lote]))
+        ).all())
+        if existentes:
+            resultado['usuarios_existentes'] += len(existentes)
+            lote = [r for r in lote if r['email'] not in existentes]
+    else:
+        existentes = {}
+    if lote:
+        db.session.execute(model.__table__.insert(), lote)
+    nome = model.__tablename__
+    resultado['tabelas'][nome] = resultado['tabelas'].get(nome, 0) + len(lote)
+    resultado['linhas'] += len(lote)
+    return existentes
+
+
+def importar_pelada(abrir, nome=None):
+    # abrir() devolve o arquivo aberto de novo a cada chamada
+    leitor = _Leitor(gravar=False)
+    emails = set()
+    with abrir() as arquivo:
+        for numero, tabela, linha in leitor.linhas(arquivo):
+            model, registro = leitor.converter(numero, tabela, linha)
+            if model is User:
+                if registro['email'] in emails:
+                    raise ErroImportacao(f"linha {numero}: e-mail {registro['email']} repetido")
+                emails.add(registro['email'])
+            if model is Pelada:
+                nome_final = nome or registro['nome']
+                if db.session.execute(select(Pelada.id).where(Pelada.nome == nome_final)).first():
+                    raise ErroImportacao(f'Já existe uma pelada chamada {nome_final}')
+
+    inicio = time.perf_counter()
+    resultado = {'pelada_id': None, 'linhas': 0, 'usuarios_existentes': 0, 'tabelas': {}}
+    leitor = _Leitor(gravar=True)
+    emails_antigos = {}
+    lote, model_lote = [], None
+    try:
+        with abrir() as arquivo:
+            for numero, tabela, linha in leitor.linhas(arquivo):
+                # Lote de outra tabela vai para o banco antes de converter a linha: os usuários
+                # reaproveitados precisam estar no mapa antes dos filhos
+                if lote and (len(lote) >= LOTE or model_lote.__tablename__ != tabela):
+                    existentes = _gravar_lote(model_lote, lote, resultado)
+                    for email, usuario_id in existentes.items():
+                        leitor.mapa[emails_antigos[email]] = usuario_id
+                    lote, emails_antigos = [], {}
+                model, registro = leitor.converter(numero, tabela, linha)
+                if model is User:
+                    emails_antigos[registro['email']] = linha['id']
+                elif model is Pelada:
+                    registro['partidas_alteradas_em'] = datetime.utcnow()
+                    if nome:
+                        registro['nome'] = nome
+                    resultado['pelada_id'] = registro['id']
+                lote.append(registro)
+                model_lote = model
+        if lote:
+            _gravar_lote(model_lote, lote, resultado)
+
+        # Agregados derivados (ratings, cards, evolução, destaques, temporadas) pela fila
+        resultado['job_id'] = enfileirar('agregados_pelada', {'pelada_id': resultado['pelada_id']},
+                                         chave=f"agregados_pelada:{resultado['pelada_id']}")
+        db.session.commit()
+    except Exception:
+        # Nada fica pela metade: uma falha em qualquer lote desfaz a importação inteira
+        db.session.rollback()
+        raise
+
+    resultado['segundos'] = time.perf_counter() - inicio
+    resultado['linhas_por_segundo'] = resultado['linhas'] / resultado['segundos'] if resultado['segundos'] else 0
+    return resultado
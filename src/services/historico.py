@@ -0,0 +1,59 @@
+import numpy as np
+from src.models.user import db, Partida, EstatisticaJogadorPartida
+from src.services.arquivo import estatisticas_arquivadas
+
+# Carregamento do histórico de estatísticas em formato colunar.
+#
+# Uma única consulta (sem instanciar objetos do ORM) traz as estatísticas das
+# partidas concluídas, ordenadas cronologicamente, e devolve um dicionário de
+# arrays NumPy alinhados (uma posição por linha jogador x partida). Partidas de
+# temporadas arquivadas entram na mesma ordem, lidas do arquivo (src/services/arquivo.py).
+
+COLUNAS_ESTATISTICA = ('gols', 'assistencias', 'defesas', 'gols_sofridos', 'desarmes', 'pontuacao_total')
+
+
+def carregar_estatisticas(pelada_id=None, usuario_ids=None):
+    query = db.session.query(
+        EstatisticaJogadorPartida.partida_id,
+        Partida.pelada_id,
+        EstatisticaJogadorPartida.usuario_id,
+        Partida.data_partida,
+        *[getattr(EstatisticaJogadorPartida, coluna) for coluna in COLUNAS_ESTATISTICA],
+        Partida.hora_inicio
+    ).join(
+        Partida, EstatisticaJogadorPartida.partida_id == Partida.id
+    ).filter(
+        Partida.status == 'concluida'
+    )
+
+    if pelada_id is not None:
+        query = query.filter(Partida.pelada_id == pelada_id)
+    if usuario_ids is not None:
+        query = query.filter(EstatisticaJogadorPartida.usuario_id.in_(usuario_ids))
+
+    linhas = query.order_by(Partida.data_partida, Partida.hora_inicio, Partida.id).all()
+    arquivadas = estatisticas_arquivadas(COLUNAS_ESTATISTICA, pelada_id=pelada_id, usuario_ids=usuario_ids)
+    if arquivadas:
+        linhas = sorted([tuple(linha) for linha in linhas] + arquivadas, key=lambda l: (l[3], l[-1], str(l[0])))
+
+    colunas = list(zip(*linhas)) if linhas else [()] * (5 + len(COLUNAS_ESTATISTICA))
+    historico = {
+        'partida_id': np.array(colunas[0], dtype=object),
+        'pelada_id': np.array(colunas[1], dtype=object),
+        'usuario_id': np.array(colunas[2], dtype=object),
+        'data_partida': np.array(colunas[3], dtype=object),
+    }
+    for i, coluna in enumerate(COLUNAS_ESTATISTICA):
+        historico[coluna] = np.array([v or 0 for v in colunas[4 + i]], dtype=np.float64)
+
+    return historico
+
+
+def limites_por_partida(partida_ids):
+    # Índices [inicio, fim) de cada partida em arrays já ordenados por partida
+    if len(partida_ids) == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    mudancas = np.flatnonzero(partida_ids[1:] != partida_ids[:-1]) + 1
+    inicios = np.concatenate(([0], mudancas))
+    fins = np.concatenate((mudancas, [len(partida_ids)]))
+    return inicios, fins
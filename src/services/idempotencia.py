@@ -0,0 +1,196 @@
+import hashlib
+import json
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import Response, current_app, g, jsonify, request, session
+from sqlalchemy import delete, select, update
+from src.models.user import db, RespostaIdempotente
+from src.database.upsert import insert_do_dialeto
+
+# Idempotency-Key nas rotas de criação.
+#
+# Nas rotas de IDEMPOTENCIA_ROTAS, um POST com o cabeçalho Idempotency-Key reserva
+# a chave (por usuário e rota) antes de rodar; a resposta fica guardada por
+# IDEMPOTENCIA_TTL_HORAS e as repetições recebem a mesma resposta sem passar pela
+# rota. Repetições que chegam enquanto a original roda esperam por ela (até
+# IDEMPOTENCIA_ESPERA_SEGUNDOS, depois 409). Respostas 5xx e 429 não são guardadas:
+# a repetição roda de novo.
+
+# Reserva sem resposta há mais que isso: o worker morreu no meio, pode ser retomada
+RESERVA_SEGUNDOS = 60
+
+
+class EmAndamento(Exception):
+    pass
+
+
+def _sha256(dados):
+    return hashlib.sha256(dados).hexdigest()
+
+
+class RespostasIdempotentes:
+    # Reservas e respostas na tabela resposta_idempotente, em transações próprias
+    # (independentes da db.session da requisição); respostas prontas também ficam
+    # em um cache do processo, então a repetição custa uma consulta ao dicionário.
+
+    def __init__(self, ttl_horas, espera_segundos, cache_max):
+        self.tabela = RespostaIdempotente.__table__
+        self.ttl = timedelta(hours=ttl_horas)
+        self.espera_segundos = espera_segundos
+        self.cache_max = cache_max
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _do_cache(self, chave):
+        with self._lock:
+            registro = self._cache.get(chave)
+            if registro and registro['expira_em'] > datetime.utcnow():
+                self._cache.move_to_end(chave)
+                return registro
+            self._cache.pop(chave, None)
+            return None
+
+    def _guardar_cache(self, chave, registro):
+        with self._lock:
+            self._cache[chave] = registro
+            self._cache.move_to_end(chave)
+            while len(self._cache) > self.cache_max:
+                self._cache.popitem(last=False)
+
+    def _tentar_reservar(self, chave, usuario_id, endpoint, corpo_hash):
+        # True se reservou; senão a linha que já existe (pronta ou em andamento)
+        T = self.tabela
+        agora = datetime.utcnow()
+        with db.engine.begin() as conn:
+            reservou = conn.execute(insert_do_dialeto(RespostaIdempotente, conn.dialect.name).values(
+                chave=chave, usuario_id=usuario_id, endpoint=endpoint, corpo_hash=corpo_hash,
+                criada_em=agora, expira_em=agora + self.ttl
+            ).on_conflict_do_nothing()).rowcount
+            if reservou:
+                return True
+            linha = conn.execute(select(T).where(T.c.chave == chave)).first()
+            if linha is None:
+                return None
+            # Resposta vencida ou reserva abandonada: apaga e tenta de novo
+            if linha.expira_em <= agora or (
+                linha.status is None and linha.criada_em < agora - timedelta(seconds=RESERVA_SEGUNDOS)
+            ):
+                conn.execute(delete(T).where(T.c.chave == chave, T.c.criada_em == linha.criada_em))
+                return None
+            return linha
+
+    def reservar(self, chave, usuario_id, endpoint, corpo_hash):
+        # None se esta requisição reservou a chave; senão a resposta guardada
+        registro = self._do_cache(chave)
+        if registro:
+            return registro
+
+        limite = time.monotonic() + self.espera_segundos
+        intervalo = 0.02
+        while True:
+            linha = self._tentar_reservar(chave, usuario_id, endpoint, corpo_hash)
+            if linha is True:
+                return None
+            if linha is not None and linha.status is not None:
+                resposta = json.loads(linha.resposta)
+                registro = {
+                    'corpo_hash': linha.corpo_hash, 'status': linha.status,
+                    'corpo': resposta['corpo'], 'tipo': resposta['tipo'], 'expira_em': linha.expira_em
+                }
+                self._guardar_cache(chave, registro)
+                return registro
+            if linha is not None:
+                # A original ainda está rodando (aqui ou em outro worker): espera por ela
+                if time.monotonic() >= limite:
+                    raise EmAndamento()
+                time.sleep(intervalo)
+                intervalo = min(intervalo * 2, 0.25)
+
+    def concluir(self, chave, corpo_hash, status, corpo, tipo):
+        T = self.tabela
+        expira_em = datetime.utcnow() + self.ttl
+        with db.engine.begin() as conn:
+            conn.execute(update(T).where(T.c.chave == chave).values(
+                status=status, resposta=json.dumps({'corpo': corpo, 'tipo': tipo}), expira_em=expira_em
+            ))
+        self._guardar_cache(chave, {
+            'corpo_hash': corpo_hash, 'status': status, 'corpo': corpo, 'tipo': tipo, 'expira_em': expira_em
+        })
+
+    def liberar(self, chave):
+        T = self.tabela
+        with db.engine.begin() as conn:
+            conn.execute(delete(T).where(T.c.chave == chave, T.c.status.is_(None)))
+
+    def limpar(self):
+        T = self.tabela
+        agora = datetime.utcnow()
+        with self._lock:
+            for chave in [c for c, r in self._cache.items() if r['expira_em'] <= agora]:
+                del self._cache[chave]
+        with db.engine.begin() as conn:
+            return conn.execute(delete(T).where(T.c.expira_em <= agora)).rowcount
+
+
+def _antes_da_requisicao():
+    if request.endpoint not in current_app.config['IDEMPOTENCIA_ROTAS'] or 'user_id' not in session:
+        return None
+    chave_cliente = request.headers.get('Idempotency-Key')
+    if not chave_cliente:
+        return None
+    if len(chave_cliente) > 255:
+        return jsonify({'error': 'Idempotency-Key muito longa'}), 400
+
+    usuario_id = session['user_id']
+    chave = _sha256(f'{usuario_id}:{request.endpoint}:{chave_cliente}'.encode())
+    corpo_hash = _sha256(request.get_data())
+    respostas = current_app.extensions['idempotencia']
+    try:
+        registro = respostas.reservar(chave, usuario_id, request.endpoint, corpo_hash)
+    except EmAndamento:
+        return jsonify({'error': 'Requisição com esta Idempotency-Key ainda em andamento'}), 409, {'Retry-After': '1'}
+
+    if registro is None:
+        g.idempotencia = (chave, corpo_hash)
+        return None
+    if registro['corpo_hash'] != corpo_hash:
+        return jsonify({'error': 'Idempotency-Key já usada com outros dados'}), 422
+    resposta = Response(registro['corpo'], status=registro['status'], mimetype=registro['tipo'])
+    resposta.headers['Idempotent-Replayed'] = 'true'
+    return resposta
+
+
+def _depois_da_requisicao(resposta):
+    reserva = g.pop('idempotencia', None)
+    if reserva is None:
+        return resposta
+    chave, corpo_hash = reserva
+    respostas = current_app.extensions['idempotencia']
+    if resposta.status_code >= 500 or resposta.status_code == 429 or resposta.is_streamed:
+        respostas.liberar(chave)
+    else:
+        respostas.concluir(chave, corpo_hash, resposta.status_code, resposta.get_data(as_text=True), resposta.mimetype)
+    return resposta
+
+
+def _liberar_reserva(exc=None):
+    # Exceção que não virou resposta: a chave volta a ficar livre
+    reserva = g.pop('idempotencia', None)
+    if reserva is not None:
+        current_app.extensions['idempotencia'].liberar(reserva[0])
+
+
+def configurar_idempotencia(app):
+    app.extensions['idempotencia'] = RespostasIdempotentes(
+        app.config['IDEMPOTENCIA_TTL_HORAS'], app.config['IDEMPOTENCIA_ESPERA_SEGUNDOS'],
+        app.config['IDEMPOTENCIA_CACHE_MAX']
+    )
+    app.before_request(_antes_da_requisicao)
+    app.after_request(_depois_da_requisicao)
+    app.teardown_request(_liberar_reserva)
+
+
+def limpar_respostas():
+    return current_app.extensions['idempotencia'].limpar()
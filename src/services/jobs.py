@@ -0,0 +1,329 @@
+import json
+import logging
+import random
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+import numpy as np
+from sqlalchemy import event, update, delete, func, or_, and_
+from sqlalchemy.exc import IntegrityError
+from src.models.user import db, Job
+from src.database.upsert import inserir_ignorando_conflito
+from src.database.routing import RoutingSession
+
+# Fila de tarefas em segundo plano guardada no próprio banco.
+#
+# As rotas enfileiram com enfileirar() na mesma transação da requisição (a tarefa
+# só existe se o commit acontecer) e respondem na hora. Um executor em cada
+# processo (threads do worker do gunicorn, do servidor de desenvolvimento ou do
+# comando `flask jobs-worker`) reserva tarefas com um UPDATE condicional, então
+# vários processos podem consumir a mesma fila sem broker externo.
+#
+# - Deduplicação: uma tarefa pendente por chave (índice único parcial).
+# - Retentativas: backoff exponencial com jitter até max_tentativas.
+# - Reserva com prazo (travado_ate): tarefas de um processo que morreu voltam à fila.
+# - A conclusão é gravada na transação da própria tarefa: uma tarefa que não faz
+#   commit por conta própria nunca é aplicada duas vezes.
+
+logger = logging.getLogger(__name__)
+
+TAREFAS = {}
+PERIODICAS = {}
+
+
+def tarefa(tipo):
+    # Registra a função que executa as tarefas do tipo; recebe o payload como kwargs
+    def decorator(fn):
+        TAREFAS[tipo] = fn
+        return fn
+    return decorator
+
+
+def periodica(tipo, intervalo_config):
+    # Tarefa que se reagenda ao terminar, a cada app.config[intervalo_config] segundos.
+    # A chave (= tipo) mantém uma única pendente mesmo com vários processos.
+    def decorator(fn):
+        TAREFAS[tipo] = fn
+        PERIODICAS[tipo] = intervalo_config
+        return fn
+    return decorator
+
+
+def agendar_periodicas():
+    for tipo in PERIODICAS:
+        enfileirar(tipo, chave=tipo)
+    db.session.commit()
+
+
+def enfileirar(tipo, payload=None, chave=None, atraso=0, max_tentativas=None):
+    # Não faz commit: a tarefa entra junto com a transação de quem chamou.
+    # Devolve o id da tarefa ou None se já havia uma pendente com a mesma chave.
+    agora = datetime.utcnow()
+    job_id = str(uuid.uuid4())
+    inseridos = inserir_ignorando_conflito(Job, [{
+        'id': job_id,
+        'tipo': tipo,
+        'payload': json.dumps(payload or {}),
+        'chave': chave,
+        'status': 'pendente',
+        'tentativas': 0,
+        'max_tentativas': max_tentativas or _config('JOBS_MAX_TENTATIVAS', 5),
+        'executar_em': agora + timedelta(seconds=atraso),
+        'criado_em': agora,
+    }])
+    if inseridos:
+        db.session.info['jobs_enfileirados'] = True
+        return job_id
+    return None
+
+
+def _config(nome, padrao):
+    from flask import current_app
+    return current_app.config.get(nome, padrao)
+
+
+def _backoff(tentativas, base):
+    espera = min(base * 2 ** (tentativas - 1), 600)
+    return espera * random.uniform(0.9, 1.1)
+
+
+def reservar(limite, lease):
+    # Candidatas: pendentes vencidas ou reservas expiradas. A reserva de cada uma
+    # é um UPDATE condicional; se outro processo pegou antes, rowcount = 0.
+    agora = datetime.utcnow()
+    disponivel = or_(
+        and_(Job.status == 'pendente', Job.executar_em <= agora),
+        and_(Job.status == 'executando', Job.travado_ate < agora)
+    )
+    candidatas = db.session.query(Job.id, Job.status).filter(disponivel).order_by(Job.executar_em).limit(limite).all()
+
+    reservadas = []
+    for job_id, status in candidatas:
+        resultado = db.session.execute(
+            update(Job).where(Job.id == job_id, Job.status == status, disponivel).values(
+                status='executando',
+                tentativas=Job.tentativas + 1,
+                travado_ate=agora + timedelta(seconds=lease),
+                iniciado_em=agora
+            ),
+            execution_options={'synchronize_session': False}
+        )
+        if resultado.rowcount:
+            reservadas.append(job_id)
+    db.session.commit()
+    return reservadas
+
+
+def executar(job_id):
+    # Roda uma tarefa já reservada (dentro de um app context)
+    job = db.session.get(Job, job_id)
+    if job is None or job.status != 'executando':
+        return
+    tipo, payload = job.tipo, json.loads(job.payload)
+    tentativas, max_tentativas = job.tentativas, job.max_tentativas
+    db.session.rollback()
+
+    # A reserva é identificada pela tentativa: se o prazo venceu e outro processo
+    # pegou a tarefa, os UPDATEs abaixo não casam mais
+    reserva = (Job.id == job_id, Job.status == 'executando', Job.tentativas == tentativas)
+    try:
+        funcao = TAREFAS.get(tipo)
+        if funcao is None:
+            raise LookupError(f'Tarefa desconhecida: {tipo}')
+        funcao(**payload)
+        # Conclusão na mesma transação das escritas da tarefa: ou as duas valem ou nenhuma
+        concluida = db.session.execute(
+            update(Job).where(*reserva).values(
+                status='concluido', concluido_em=datetime.utcnow(), travado_ate=None, erro=None
+            ),
+            execution_options={'synchronize_session': False}
+        ).rowcount
+        if not concluida:
+            db.session.rollback()
+            logger.warning('Tarefa %s (%s) perdeu a reserva na tentativa %s; resultado descartado', job_id, tipo, tentativas)
+            return
+        if tipo in PERIODICAS:
+            enfileirar(tipo, chave=tipo, atraso=_config(PERIODICAS[tipo], 900))
+        db.session.commit()
+        return
+    except Exception as e:
+        db.session.rollback()
+        logger.exception('Tarefa %s (%s) falhou na tentativa %s', job_id, tipo, tentativas)
+        if tentativas >= max_tentativas:
+            valores = {'status': 'falhou', 'concluido_em': datetime.utcnow(), 'travado_ate': None, 'erro': str(e)}
+        else:
+            espera = _backoff(tentativas, _config('JOBS_BACKOFF_SEGUNDOS', 5))
+            valores = {'status': 'pendente', 'executar_em': datetime.utcnow() + timedelta(seconds=espera),
+                       'travado_ate': None, 'erro': str(e)}
+
+    try:
+        db.session.execute(
+            update(Job).where(*reserva).values(**valores),
+            execution_options={'synchronize_session': False}
+        )
+        if tipo in PERIODICAS and valores['status'] != 'pendente':
+            enfileirar(tipo, chave=tipo, atraso=_config(PERIODICAS[tipo], 900))
+        db.session.commit()
+    except IntegrityError:
+        # Já existe outra pendente com a mesma chave, que fará o trabalho: esta é encerrada
+        db.session.rollback()
+        db.session.execute(
+            update(Job).where(*reserva).values(
+                status='falhou', travado_ate=None, concluido_em=datetime.utcnow(),
+                erro=f"{valores['erro']} (substituída por tarefa pendente com a mesma chave)"
+            ),
+            execution_options={'synchronize_session': False}
+        )
+        db.session.commit()
+
+
+def executar_pendentes(limite=100):
+    # Execução síncrona do que estiver vencido (comando `flask jobs-worker --uma-vez`)
+    total = 0
+    while True:
+        reservadas = reservar(limite, _config('JOBS_LEASE_SEGUNDOS', 300))
+        if not reservadas:
+            return total
+        for job_id in reservadas:
+            executar(job_id)
+        total += len(reservadas)
+
+
+def limpar_antigas(dias):
+    limite = datetime.utcnow() - timedelta(days=dias)
+    resultado = db.session.execute(
+        delete(Job).where(Job.status.in_(('concluido', 'falhou')), Job.concluido_em < limite),
+        execution_options={'synchronize_session': False}
+    )
+    db.session.commit()
+    return resultado.rowcount
+
+
+def metricas(amostra=500):
+    agora = datetime.utcnow()
+    profundidade = {}
+    for tipo, status, total in db.session.query(Job.tipo, Job.status, func.count()).group_by(Job.tipo, Job.status):
+        profundidade.setdefault(tipo, {})[status] = total
+
+    mais_antiga = db.session.query(func.min(Job.executar_em)).filter(
+        Job.status == 'pendente', Job.executar_em <= agora
+    ).scalar()
+
+    recentes = db.session.query(Job.criado_em, Job.iniciado_em, Job.concluido_em).filter(
+        Job.status == 'concluido'
+    ).order_by(Job.concluido_em.desc()).limit(amostra).all()
+
+    def percentis(valores):
+        if not valores:
+            return None
+        p50, p95, p99 = np.percentile(valores, [50, 95, 99])
+        return {'p50': round(float(p50), 3), 'p95': round(float(p95), 3), 'p99': round(float(p99), 3)}
+
+    return {
+        'profundidade': profundidade,
+        'pendentes': sum(s.get('pendente', 0) for s in profundidade.values()),
+        'atraso_mais_antiga_s': round((agora - mais_antiga).total_seconds(), 3) if mais_antiga else 0,
+        # espera: criação -> início da última tentativa; total: criação -> conclusão
+        'espera_s': percentis([(i - c).total_seconds() for c, i, _ in recentes if i]),
+        'latencia_s': percentis([(f - c).total_seconds() for c, _, f in recentes if f]),
+        'amostra': len(recentes)
+    }
+
+
+class ExecutorJobs:
+    # Uma thread reserva tarefas e as entrega a um pool de threads do processo
+    def __init__(self, app, threads):
+        self.app = app
+        self.threads = threads
+        self.intervalo = app.config['JOBS_INTERVALO']
+        self.pool = ThreadPoolExecutor(max_workers=threads, thread_name_prefix='jobs')
+        self.livres = threading.Semaphore(threads)
+        self.acordar = threading.Event()
+        self.parar_evento = threading.Event()
+        self.thread = threading.Thread(target=self._executar, name='jobs-reserva', daemon=True)
+        self._ultima_limpeza = datetime.min
+
+    def iniciar(self):
+        self.thread.start()
+        return self
+
+    def parar(self, esperar=True):
+        self.parar_evento.set()
+        self.acordar.set()
+        self.thread.join(timeout=5)
+        self.pool.shutdown(wait=esperar)
+
+    def _rodar(self, job_id):
+        try:
+            with self.app.app_context():
+                executar(job_id)
+        finally:
+            self.livres.release()
+            self.acordar.set()
+
+    def _reservar(self):
+        vagas = 0
+        while self.livres.acquire(blocking=False):
+            vagas += 1
+        if not vagas:
+            return 0
+        try:
+            with self.app.app_context():
+                reservadas = reservar(vagas, self.app.config['JOBS_LEASE_SEGUNDOS'])
+                if datetime.utcnow() - self._ultima_limpeza > timedelta(hours=1):
+                    self._ultima_limpeza = datetime.utcnow()
+                    limpar_antigas(self.app.config['JOBS_RETENCAO_DIAS'])
+        except Exception:
+            logger.exception('Falha ao reservar tarefas')
+            reservadas = []
+        for _ in range(vagas - len(reservadas)):
+            self.livres.release()
+        for job_id in reservadas:
+            self.pool.submit(self._rodar, job_id)
+        return len(reservadas)
+
+    def _executar(self):
+        while not self.parar_evento.is_set():
+            if self._reservar():
+                continue
+            self.acordar.wait(self.intervalo)
+            self.acordar.clear()
+
+
+_executor = None
+
+
+def iniciar_executor(app):
+    # Um executor por processo; JOBS_WORKER_THREADS=0 desliga (ex.: worker dedicado)
+    global _executor
+    threads = app.config['JOBS_WORKER_THREADS']
+    if _executor is None and threads > 0:
+        with app.app_context():
+            agendar_periodicas()
+        _executor = ExecutorJobs(app, threads).iniciar()
+    return _executor
+
+
+def parar_executor():
+    global _executor
+    if _executor is not None:
+        _executor.parar()
+        _executor = None
+
+
+def notificar_executor():
+    # Acorda o executor local logo após o commit de quem enfileirou
+    if _executor is not None:
+        _executor.acordar.set()
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _acordar_apos_commit(session):
+    if session.info.pop('jobs_enfileirados', False):
+        notificar_executor()
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _descartar_aviso(session):
+    session.info.pop('jobs_enfileirados', None)
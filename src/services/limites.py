@@ -0,0 +1,173 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g, jsonify, request, session
+from sqlalchemy import case, delete, select
+from src.models.user import db, Pelada, Partida, BaldeLimite
+from src.database.upsert import insert_do_dialeto
+
+# Limites de taxa e de concorrência por rota.
+#
+# LIMITES_ROTAS liga o nome do endpoint (blueprint.função) às regras:
+#   {'usuario': {'taxa': 1, 'rajada': 5},   token bucket por usuário (tokens/s e capacidade)
+#    'pelada': {'taxa': 20, 'rajada': 60},  token bucket por pelada (da URL ou da partida; do corpo só sem elas)
+#    'concorrencia': 8}                     requisições simultâneas da rota por worker
+# Os baldes ficam na memória do worker (LIMITES_BACKEND=memoria) ou na tabela
+# balde_limite, compartilhada pelos workers (banco). Passou do limite: 429 com
+# Retry-After na hora, antes de qualquer trabalho no banco da requisição.
+
+
+class BaldesMemoria:
+
+    def __init__(self, maximo=100000):
+        self._baldes = {}
+        self._lock = threading.Lock()
+        self.maximo = maximo
+
+    def consumir(self, chave, taxa, rajada, agora):
+        # Devolve 0 se consumiu um token ou os segundos até o próximo token
+        with self._lock:
+            tokens, atualizado_em = self._baldes.get(chave, (rajada, agora))
+            tokens = min(rajada, tokens + (agora - atualizado_em) * taxa)
+            if tokens >= 1:
+                self._baldes[chave] = (tokens - 1, agora)
+                return 0
+            self._baldes[chave] = (tokens, agora)
+            if len(self._baldes) > self.maximo:
+                # Balde parado há uma hora já encheu: equivale a não existir
+                for antigo in [c for c, (_, a) in self._baldes.items() if agora - a > 3600]:
+                    del self._baldes[antigo]
+            return (1 - tokens) / taxa
+
+    def limpar(self, antes_de):
+        with self._lock:
+            for chave in [c for c, (_, a) in self._baldes.items() if a < antes_de]:
+                del self._baldes[chave]
+
+
+class BaldesBanco:
+    # Um único INSERT ... ON CONFLICT DO UPDATE ... WHERE por consumo: a recarga e
+    # o consumo acontecem no banco, atômicos entre workers
+
+    def consumir(self, chave, taxa, rajada, agora):
+        T = BaldeLimite.__table__
+        recarga = T.c.tokens + (agora - T.c.atualizado_em) * taxa
+        cheio = case((recarga > rajada, float(rajada)), else_=recarga)
+        with db.engine.begin() as conn:
+            stmt = insert_do_dialeto(BaldeLimite, conn.dialect.name).values(
+                chave=chave, tokens=float(rajada - 1), atualizado_em=agora
+            )
+            consumido = conn.execute(stmt.on_conflict_do_update(
+                index_elements=['chave'],
+                set_={'tokens': cheio - 1, 'atualizado_em': agora},
+                where=cheio >= 1
+            )).rowcount
+            if consumido:
+                return 0
+            tokens, atualizado_em = conn.execute(
+                select(T.c.tokens, T.c.atualizado_em).where(T.c.chave == chave)
+            ).one()
+        tokens = min(rajada, tokens + (agora - atualizado_em) * taxa)
+        return max(1 - tokens, 0) / taxa
+
+    def limpar(self, antes_de):
+        with db.engine.begin() as conn:
+            return conn.execute(delete(BaldeLimite.__table__).where(BaldeLimite.__table__.c.atualizado_em < antes_de)).rowcount
+
+
+class Limitador:
+
+    def __init__(self, backend, regras):
+        self.baldes = BaldesBanco() if backend == 'banco' else BaldesMemoria()
+        self.regras = regras
+        self._semaforos = {
+            endpoint: threading.BoundedSemaphore(regra['concorrencia'])
+            for endpoint, regra in regras.items() if regra.get('concorrencia')
+        }
+        # partida -> pelada nunca muda (nem o id de uma pelada que existe): cache simples por worker
+        self._peladas = OrderedDict()
+        self._lock = threading.Lock()
+
+    def pelada_da_requisicao(self):
+        # A URL manda: com partida_id na rota, o pelada_id do corpo é ignorado (um
+        # valor inventado a cada requisição abriria um balde novo). O corpo só vale
+        # onde é a única fonte (criação) e se a pelada existir.
+        argumentos = request.view_args or {}
+        if argumentos.get('pelada_id'):
+            return argumentos['pelada_id']
+        if argumentos.get('partida_id'):
+            return self._pelada_em_cache(('partida', argumentos['partida_id']),
+                                         select(Partida.pelada_id).where(Partida.id == argumentos['partida_id']))
+        corpo = request.get_json(silent=True)
+        if isinstance(corpo, dict) and isinstance(corpo.get('pelada_id'), str):
+            return self._pelada_em_cache(('pelada', corpo['pelada_id']),
+                                         select(Pelada.id).where(Pelada.id == corpo['pelada_id']))
+        return None
+
+    def _pelada_em_cache(self, chave, consulta):
+        with self._lock:
+            if chave in self._peladas:
+                return self._peladas[chave]
+        pelada_id = db.session.execute(consulta).scalar()
+        if pelada_id is not None:
+            with self._lock:
+                self._peladas[chave] = pelada_id
+                while len(self._peladas) > 10000:
+                    self._peladas.popitem(last=False)
+        return pelada_id
+
+    def verificar(self, endpoint):
+        # None se pode seguir; senão os segundos para tentar de novo
+        regra = self.regras[endpoint]
+        semaforo = self._semaforos.get(endpoint)
+        if semaforo is not None:
+            if not semaforo.acquire(blocking=False):
+                return 1
+            g.semaforo_limite = semaforo
+
+        agora = time.time()
+        escopos = []
+        if regra.get('usuario') and 'user_id' in session:
+            escopos.append((f"u:{endpoint}:{session['user_id']}", regra['usuario']))
+        if regra.get('pelada'):
+            pelada_id = self.pelada_da_requisicao()
+            if pelada_id:
+                escopos.append((f'p:{endpoint}:{pelada_id}', regra['pelada']))
+
+        for chave, balde in escopos:
+            espera = self.baldes.consumir(chave, balde['taxa'], balde['rajada'], agora)
+            if espera:
+                liberar_concorrencia()
+                return espera
+        return None
+
+
+def liberar_concorrencia(exc=None):
+    semaforo = g.pop('semaforo_limite', None)
+    if semaforo is not None:
+        semaforo.release()
+
+
+def _antes_da_requisicao():
+    limitador = current_app.extensions['limites']
+    if request.endpoint not in limitador.regras:
+        return None
+    espera = limitador.verificar(request.endpoint)
+    if espera is None:
+        return None
+    segundos = max(1, math.ceil(espera))
+    return jsonify({
+        'error': 'Muitas requisições, tente novamente em instantes',
+        'retry_after': round(espera, 2)
+    }), 429, {'Retry-After': str(segundos)}
+
+
+def configurar_limites(app):
+    app.extensions['limites'] = Limitador(app.config['LIMITES_BACKEND'], app.config['LIMITES_ROTAS'])
+    app.before_request(_antes_da_requisicao)
+    app.teardown_request(liberar_concorrencia)
+
+
+def limpar_baldes(horas=24):
+    current_app.extensions['limites'].baldes.limpar(time.time() - horas * 3600)
@@ -0,0 +1,49 @@
+from flask import g, session
+from sqlalchemy import inspect
+from src.models.user import db, MembroPelada
+from src.services.sessoes import contexto_usuario
+
+# Memo de associação usuário x pelada por contexto da aplicação.
+#
+# Várias rotas checam se o usuário é membro (ou admin) da pelada; dentro de uma
+# mesma requisição, ou de um lote de /api/batch, a consulta é feita uma vez só.
+# Para o usuário logado, as associações guardadas no contexto da sessão
+# respondem sem consulta; só a ausência é conferida no banco (ele pode ter
+# acabado de entrar na pelada por outro worker).
+
+
+def membro_da_pelada(pelada_id, usuario_id=None):
+    usuario_id = usuario_id or session['user_id']
+    memo = g.setdefault('membros', {})
+    chave = (usuario_id, str(pelada_id))
+    if chave not in memo:
+        if g.get('membros_carregados') == usuario_id:
+            # Todas as associações do usuário já estão no memo
+            return None
+        if usuario_id == session.get('user_id'):
+            contexto = contexto_usuario()
+            is_admin = contexto['membros'].get(str(pelada_id)) if contexto else None
+            if is_admin is not None:
+                memo[chave] = MembroPelada(usuario_id=usuario_id, pelada_id=pelada_id, is_admin=is_admin)
+                return memo[chave]
+        memo[chave] = MembroPelada.query.filter_by(usuario_id=usuario_id, pelada_id=pelada_id).first()
+    return memo[chave]
+
+
+def carregar_membros(usuario_id):
+    # Uma consulta com todas as peladas do usuário; devolve o memo para ser
+    # reaproveitado em outras sessões (semear_membros)
+    memo = g.setdefault('membros', {})
+    for membro in MembroPelada.query.filter_by(usuario_id=usuario_id).all():
+        memo[(usuario_id, str(membro.pelada_id))] = membro
+    g.membros_carregados = usuario_id
+    return dict(memo)
+
+
+def semear_membros(usuario_id, memo):
+    # Copia o memo para a sessão do contexto atual sem consultar o banco
+    g.membros = {
+        chave: db.session.merge(membro, load=False) if membro is not None and not inspect(membro).transient else membro
+        for chave, membro in memo.items()
+    }
+    g.membros_carregados = usuario_id
@@ -0,0 +1,171 @@
+import logging
+import uuid
+from datetime import datetime, timedelta
+from itertools import groupby
+from flask import current_app
+from sqlalchemy import update
+from src.models.user import db, User, Pelada, MembroPelada, Partida, PresencaPartida, Notificacao, InscricaoPush
+from src.database.upsert import inserir_ignorando_conflito
+from src.services.jobs import enfileirar
+from src.services.transportes import TransporteSMTP, TransporteWebPush
+
+# Notificações de partidas.
+#
+# Os eventos viram linhas em Notificacao (uma por membro e evento, garantida por
+# índice único) e o envio acontece depois, pela fila: o job de envio espera
+# NOTIFICACOES_JANELA segundos, junta tudo o que está pendente de cada usuário
+# em um único resumo e manda os resumos em lotes pelos transportes configurados.
+
+logger = logging.getLogger(__name__)
+
+
+def transportes():
+    config = current_app.config
+    ativos = []
+    if config['SMTP_HOST']:
+        ativos.append(TransporteSMTP(config['SMTP_HOST'], config['SMTP_PORT'], config['SMTP_USUARIO'],
+                                     config['SMTP_SENHA'], config['SMTP_TLS'], config['SMTP_REMETENTE']))
+    if config['VAPID_PRIVATE_KEY']:
+        ativos.append(TransporteWebPush(config['VAPID_PRIVATE_KEY'], config['VAPID_EMAIL'], _inscricoes_push))
+    return ativos
+
+
+def _inscricoes_push(usuario_ids):
+    inscricoes = InscricaoPush.query.filter(InscricaoPush.usuario_id.in_(usuario_ids)).all()
+    por_usuario = {}
+    for inscricao in inscricoes:
+        por_usuario.setdefault(inscricao.usuario_id, []).append(inscricao)
+    return por_usuario
+
+
+def _formatar_partida(partida, pelada_nome):
+    return f"{pelada_nome}: {partida.data_partida.strftime('%d/%m/%Y')} às {partida.hora_inicio.strftime('%H:%M')}"
+
+
+def registrar(linhas):
+    # Grava as notificações ignorando as que já existem e agenda o envio
+    agora = datetime.utcnow()
+    for linha in linhas:
+        linha.setdefault('id', str(uuid.uuid4()))
+        linha.setdefault('status', 'pendente')
+        linha.setdefault('criada_em', agora)
+    novas = 0
+    for inicio in range(0, len(linhas), 500):
+        novas += inserir_ignorando_conflito(Notificacao, linhas[inicio:inicio + 500])
+    if novas and transportes():
+        enfileirar('enviar_notificacoes', chave='enviar_notificacoes', atraso=current_app.config['NOTIFICACOES_JANELA'])
+    return novas
+
+
+def notificar_nova_partida(partida_id, criador_id=None):
+    row = db.session.query(Partida, Pelada.nome).join(Pelada, Pelada.id == Partida.pelada_id).filter(
+        Partida.id == partida_id
+    ).first()
+    if not row:
+        return 0
+    partida, pelada_nome = row
+    membros = [u for (u,) in db.session.query(MembroPelada.usuario_id).filter(MembroPelada.pelada_id == partida.pelada_id)]
+    texto = _formatar_partida(partida, pelada_nome)
+    return registrar([{
+        'usuario_id': usuario_id, 'evento': 'nova_partida', 'referencia_id': partida.id,
+        'titulo': 'Nova partida marcada', 'mensagem': f'{texto}. Confirme sua presença!'
+    } for usuario_id in membros if usuario_id != criador_id])
+
+
+def agendar_lembretes(agora=None):
+    # Presenças pendentes das partidas agendadas nas próximas horas: uma consulta
+    # guiada pelo índice (status, data_partida) de Partida e pela chave de PresencaPartida
+    agora = agora or datetime.now()
+    limite = agora + timedelta(hours=current_app.config['NOTIFICACOES_LEMBRETE_HORAS'])
+    pendentes = db.session.query(
+        PresencaPartida.usuario_id, Partida, Pelada.nome
+    ).join(
+        Partida, Partida.id == PresencaPartida.partida_id
+    ).join(
+        Pelada, Pelada.id == Partida.pelada_id
+    ).filter(
+        Partida.status == 'agendada',
+        Partida.data_partida >= agora.date(),
+        Partida.data_partida <= limite.date(),
+        PresencaPartida.confirmacao == 'pendente'
+    ).all()
+
+    linhas = []
+    for usuario_id, partida, pelada_nome in pendentes:
+        inicio = datetime.combine(partida.data_partida, partida.hora_inicio)
+        if agora <= inicio <= limite:
+            linhas.append({
+                'usuario_id': usuario_id, 'evento': 'lembrete_presenca', 'referencia_id': partida.id,
+                'titulo': 'Confirme sua presença',
+                'mensagem': f'{_formatar_partida(partida, pelada_nome)}. Você ainda não respondeu.'
+            })
+    return registrar(linhas)
+
+
+def montar_resumos(notificacoes):
+    # notificacoes: (Notificacao, User) ordenadas por usuário -> um resumo por usuário
+    resumos = []
+    for usuario_id, grupo in groupby(notificacoes, key=lambda n: n[0].usuario_id):
+        grupo = list(grupo)
+        usuario = grupo[0][1]
+        if len(grupo) == 1:
+            assunto = grupo[0][0].titulo
+        else:
+            assunto = f'O Rei da Pelada: {len(grupo)} novidades'
+        resumos.append({
+            'usuario_id': usuario_id,
+            'nome': usuario.nome,
+            'email': usuario.email,
+            'assunto': assunto,
+            'texto': '\n'.join(f'- {n.titulo}: {n.mensagem}' for n, _ in grupo),
+            'ids': [n.id for n, _ in grupo]
+        })
+    return resumos
+
+
+def enviar_pendentes():
+    lote = current_app.config['NOTIFICACOES_LOTE']
+    ativos = transportes()
+    if not ativos:
+        return 0
+
+    # Lote limitado por usuários inteiros: um resumo nunca é dividido entre lotes
+    usuarios = [u for (u,) in db.session.query(Notificacao.usuario_id).filter(
+        Notificacao.status == 'pendente'
+    ).distinct().order_by(Notificacao.usuario_id).limit(lote)]
+    if not usuarios:
+        return 0
+
+    notificacoes = db.session.query(Notificacao, User).join(User, User.id == Notificacao.usuario_id).filter(
+        Notificacao.status == 'pendente',
+        Notificacao.usuario_id.in_(usuarios)
+    ).order_by(Notificacao.usuario_id, Notificacao.criada_em).all()
+    resumos = montar_resumos(notificacoes)
+
+    # Falha = nenhum transporte conseguiu entregar. Um transporte que quebra não
+    # interrompe os outros: o lote é gravado mesmo assim e nada é reenviado
+    falhas = None
+    for transporte in ativos:
+        try:
+            falhas_transporte = transporte.enviar_lote(resumos)
+        except Exception:
+            logger.exception('Transporte %s falhou no lote inteiro', transporte.nome)
+            falhas_transporte = {r['usuario_id'] for r in resumos}
+        falhas = falhas_transporte if falhas is None else falhas & falhas_transporte
+        for endpoint in getattr(transporte, 'expiradas', []):
+            db.session.query(InscricaoPush).filter_by(endpoint=endpoint).delete(synchronize_session=False)
+
+    agora = datetime.utcnow()
+    for status, selecionados in (('enviada', [r for r in resumos if r['usuario_id'] not in falhas]),
+                                 ('falhou', [r for r in resumos if r['usuario_id'] in falhas])):
+        ids = [i for r in selecionados for i in r['ids']]
+        if ids:
+            db.session.execute(
+                update(Notificacao).where(Notificacao.id.in_(ids)).values(status=status, enviada_em=agora),
+                execution_options={'synchronize_session': False}
+            )
+
+    # Ainda há usuários pendentes: próximo lote logo em seguida
+    if len(usuarios) == lote:
+        enfileirar('enviar_notificacoes', chave='enviar_notificacoes')
+    return len(resumos)
@@ -0,0 +1,110 @@
+from datetime import datetime
+from sqlalchemy import select, update, func, case, exists
+from sqlalchemy.orm import aliased
+from src.models.user import (db, Partida, EstatisticaJogadorPartida, AvaliacaoPartida,
+                             RegraPontuacao, PESOS_PADRAO)
+from src.services.rating import reconstruir_ratings, ESCOPO_GERAL
+from src.services.atributos import atualizar_atributos
+from src.services.snapshots import reconstruir_snapshots
+from src.services.destaques import reconstruir_destaques, reconstruir_temporadas
+from src.services.jobs import enfileirar
+from src.services.arquivo import repontuar
+
+
+def regras_da_pelada(pelada_id):
+    # Regras configuradas ou, se não houver, os pesos padrão (objeto não persistido)
+    regras = db.session.get(RegraPontuacao, pelada_id)
+    return regras or RegraPontuacao(pelada_id=pelada_id, **PESOS_PADRAO)
+
+
+def _expressao_pontuacao(pesos):
+    E = EstatisticaJogadorPartida
+    voto = aliased(AvaliacaoPartida)
+
+    def votos(tipo):
+        return select(func.count()).select_from(voto).where(
+            voto.partida_id == E.partida_id,
+            voto.avaliado_id == E.usuario_id,
+            voto.tipo_avaliacao == tipo
+        ).scalar_subquery()
+
+    votou = exists().where(voto.partida_id == E.partida_id, voto.avaliador_id == E.usuario_id)
+    concluida = select(Partida.status).where(Partida.id == E.partida_id).scalar_subquery() == 'concluida'
+
+    base = (
+        func.coalesce(E.gols, 0) * pesos['gol']
+        + func.coalesce(E.assistencias, 0) * pesos['assistencia']
+        + func.coalesce(E.defesas, 0) * pesos['defesa']
+        + func.coalesce(E.gols_sofridos, 0) * pesos['gol_sofrido']
+        + func.coalesce(E.desarmes, 0) * pesos['desarme']
+    )
+    # Votos só contam depois que a partida foi finalizada (igual ao finalize_partida)
+    pelos_votos = case(
+        (concluida,
+         votos('mvp') * pesos['voto_mvp']
+         + votos('bola_murcha') * pesos['voto_bola_murcha']
+         + case((votou, 0), else_=pesos['nao_votou'])),
+        else_=0
+    )
+    return base + pelos_votos
+
+
+def recalcular_pontuacao_pelada(pelada_id):
+    # Reescreve pontuacao_total de todo o histórico da pelada com UPDATEs set-based
+    # e enfileira a atualização dos agregados que dependem da pontuação. Não faz
+    # commit: entra na transação que gravou as regras.
+    pesos = regras_da_pelada(pelada_id).pesos()
+    E = EstatisticaJogadorPartida
+
+    partidas_da_pelada = select(Partida.id).where(Partida.pelada_id == pelada_id)
+    resultado = db.session.execute(
+        update(E).where(E.partida_id.in_(partidas_da_pelada)).values(pontuacao_total=_expressao_pontuacao(pesos)),
+        execution_options={'synchronize_session': False}
+    )
+
+    # MVP e bola murcha de cada partida concluída seguem a nova pontuação
+    # (empates: menor usuario_id, como em finalize_partida)
+    def extremo(ordem):
+        return select(E.usuario_id).where(E.partida_id == Partida.id).order_by(ordem, E.usuario_id).limit(1).scalar_subquery()
+
+    db.session.execute(
+        update(Partida).where(
+            Partida.pelada_id == pelada_id,
+            Partida.status == 'concluida',
+            Partida.arquivada.is_(False)
+        ).values(
+            mvp_id=extremo(E.pontuacao_total.desc()),
+            bola_murcha_id=extremo(E.pontuacao_total.asc())
+        ),
+        execution_options={'synchronize_session': False}
+    )
+
+    # Agregados na fila; edições seguidas das regras viram uma só reconstrução.
+    # As temporadas arquivadas são repontuadas lá, dentro do próprio arquivo
+    job_id = enfileirar('agregados_pelada', {'pelada_id': pelada_id}, chave=f'agregados_pelada:{pelada_id}')
+
+    return {'estatisticas': resultado.rowcount, 'recalculado_em': datetime.utcnow().isoformat(), 'job_id': job_id}
+
+
+def atualizar_agregados_pelada(pelada_id):
+    # Agregados derivados da pontuação: ratings (o geral depende de todas as peladas)
+    # atributos do card da pelada e gerais, evolução do ranking, destaques e temporadas.
+    # A reconstrução já inclui todas as partidas concluídas: agregados_partida
+    # ainda na fila para elas não deve somá-las de novo
+    db.session.execute(
+        update(Partida).where(
+            Partida.pelada_id == pelada_id,
+            Partida.status == 'concluida',
+            Partida.agregados_em.is_(None)
+        ).values(agregados_em=datetime.utcnow()),
+        execution_options={'synchronize_session': False}
+    )
+    # Temporadas arquivadas primeiro: as reconstruções abaixo leem as linhas delas
+    repontuar(pelada_id, regras_da_pelada(pelada_id).pesos())
+    reconstruir_ratings()
+    atualizar_atributos(pelada_id)
+    atualizar_atributos(ESCOPO_GERAL)
+    reconstruir_snapshots(pelada_id)
+    reconstruir_destaques(pelada_id)
+    reconstruir_temporadas(pelada_id)
+    db.session.commit()
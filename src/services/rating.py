@@ -0,0 +1,112 @@
+from datetime import datetime
+import numpy as np
+from src.models.user import db, RatingJogador, EstatisticaJogadorPartida
+from src.services.historico import carregar_estatisticas, limites_por_partida
+
+# Rating estilo Elo para partidas com muitos jogadores.
+#
+# Cada partida é tratada como um conjunto de confrontos entre todos os pares de
+# jogadores: quem fez mais pontos "venceu" o confronto. A variação do rating é
+# K x (resultado real - resultado esperado), na média dos confrontos do jogador.
+# Jogadores com poucas partidas não dominam mais o ranking: o rating só sobe
+# vencendo confrontos de forma consistente.
+#
+# Os ratings são mantidos por pelada (escopo = id da pelada) e geral ('geral').
+
+RATING_INICIAL = 1500.0
+K = 32.0
+ESCOPO_GERAL = 'geral'
+
+
+def variacao_elo(ratings, pontos, k=K):
+    n = len(ratings)
+    if n < 2:
+        return np.zeros(n)
+
+    # esperado[i, j] = probabilidade de i superar j
+    esperado = 1.0 / (1.0 + 10.0 ** ((ratings[None, :] - ratings[:, None]) / 400.0))
+    real = (pontos[:, None] > pontos[None, :]) + 0.5 * (pontos[:, None] == pontos[None, :])
+    # Na diagonal real = esperado = 0.5, então ela não contribui para o saldo
+    saldo = (real - esperado).sum(axis=1)
+    return k * saldo / (n - 1)
+
+
+def atualizar_ratings_partida(partida):
+    # Atualização incremental, chamada ao finalizar a partida (antes do commit)
+    estatisticas = EstatisticaJogadorPartida.query.filter_by(partida_id=partida.id).all()
+    if len(estatisticas) < 2:
+        return
+
+    usuario_ids = [e.usuario_id for e in estatisticas]
+    pontos = np.array([e.pontuacao_total or 0 for e in estatisticas], dtype=np.float64)
+
+    # FOR UPDATE (na mesma ordem em todas as tarefas): partidas finalizadas ao mesmo
+    # tempo não sobrescrevem o rating uma da outra (o escopo geral é compartilhado)
+    existentes = RatingJogador.query.filter(
+        RatingJogador.usuario_id.in_(usuario_ids),
+        RatingJogador.escopo.in_([partida.pelada_id, ESCOPO_GERAL])
+    ).order_by(RatingJogador.usuario_id, RatingJogador.escopo).with_for_update().all()
+    por_chave = {(r.usuario_id, r.escopo): r for r in existentes}
+
+    agora = datetime.utcnow()
+    for escopo in (partida.pelada_id, ESCOPO_GERAL):
+        registros = []
+        for usuario_id in usuario_ids:
+            registro = por_chave.get((usuario_id, escopo))
+            if registro is None:
+                registro = RatingJogador(usuario_id=usuario_id, escopo=escopo, rating=RATING_INICIAL, partidas=0)
+                db.session.add(registro)
+            registros.append(registro)
+
+        ratings = np.array([r.rating for r in registros], dtype=np.float64)
+        novos = ratings + variacao_elo(ratings, pontos)
+        for registro, rating in zip(registros, novos):
+            registro.rating = float(rating)
+            registro.partidas += 1
+            registro.atualizado_em = agora
+
+
+def reconstruir_ratings():
+    # Replay completo do histórico: uma consulta colunar, cálculo em arrays e
+    # regravação em lote. Nenhum objeto do ORM é carregado partida a partida.
+    historico = carregar_estatisticas()
+    partida_ids = historico['partida_id']
+    pontos = historico['pontuacao_total']
+
+    usuarios, usuario_idx = np.unique(historico['usuario_id'].astype(str), return_inverse=True)
+    peladas, pelada_idx = np.unique(historico['pelada_id'].astype(str), return_inverse=True)
+    pares, par_idx = np.unique(pelada_idx * len(usuarios) + usuario_idx, return_inverse=True)
+
+    rating_geral = np.full(len(usuarios), RATING_INICIAL)
+    partidas_geral = np.zeros(len(usuarios), dtype=np.int64)
+    rating_pelada = np.full(len(pares), RATING_INICIAL)
+    partidas_pelada = np.zeros(len(pares), dtype=np.int64)
+
+    inicios, fins = limites_por_partida(partida_ids)
+    for inicio, fim in zip(inicios, fins):
+        p = pontos[inicio:fim]
+        u = usuario_idx[inicio:fim]
+        pu = par_idx[inicio:fim]
+        rating_geral[u] += variacao_elo(rating_geral[u], p)
+        rating_pelada[pu] += variacao_elo(rating_pelada[pu], p)
+        partidas_geral[u] += 1
+        partidas_pelada[pu] += 1
+
+    agora = datetime.utcnow()
+    linhas = [
+        {'usuario_id': str(usuarios[i]), 'escopo': ESCOPO_GERAL, 'rating': float(rating_geral[i]),
+         'partidas': int(partidas_geral[i]), 'atualizado_em': agora}
+        for i in range(len(usuarios))
+    ]
+    for i, par in enumerate(pares):
+        linhas.append({
+            'usuario_id': str(usuarios[par % len(usuarios)]), 'escopo': str(peladas[par // len(usuarios)]),
+            'rating': float(rating_pelada[i]), 'partidas': int(partidas_pelada[i]), 'atualizado_em': agora
+        })
+
+    db.session.query(RatingJogador).delete(synchronize_session=False)
+    if linhas:
+        db.session.execute(RatingJogador.__table__.insert(), linhas)
+    db.session.commit()
+
+    return {'partidas': len(inicios), 'ratings': len(linhas)}
@@ -0,0 +1,113 @@
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from flask import current_app, has_app_context
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# Hash de senhas fora das threads de requisição.
+#
+# O método e o custo vêm de SENHA_METODO (formato do Werkzeug, ex.: scrypt:32768:8:1
+# ou pbkdf2:sha256:600000); hashes gravados com outro método são refeitos no
+# próximo login que acertar a senha. O cálculo roda em um pool de
+# SENHA_PROCESSOS processos por worker (0 = na própria thread) e no máximo
+# SENHA_FILA_MAX cálculos ficam em andamento ou na fila; quem passa de
+# SENHA_ESPERA_SEGUNDOS esperando uma vaga recebe SobrecargaSenhas.
+#
+# Este módulo não importa os modelos: os processos do pool (spawn) importam só ele.
+
+PADROES = {
+    'SENHA_METODO': 'scrypt:32768:8:1',
+    'SENHA_PROCESSOS': 1,
+    'SENHA_FILA_MAX': 32,
+    'SENHA_ESPERA_SEGUNDOS': 2,
+}
+
+
+class SobrecargaSenhas(Exception):
+    pass
+
+
+def _config(nome):
+    if has_app_context():
+        return current_app.config.get(nome, PADROES[nome])
+    return PADROES[nome]
+
+
+def metodo_completo(metodo):
+    # Mesmos padrões do Werkzeug, para comparar com o prefixo dos hashes gravados
+    partes = metodo.split(':')
+    if partes[0] == 'scrypt':
+        padrao = ['scrypt', '32768', '8', '1']
+    elif partes[0] == 'pbkdf2':
+        padrao = ['pbkdf2', 'sha256', '600000']
+    else:
+        return metodo
+    return ':'.join(partes + padrao[len(partes):])
+
+
+def precisa_rehash(senha_hash):
+    return senha_hash.split('$', 1)[0] != metodo_completo(_config('SENHA_METODO'))
+
+
+class PoolSenhas:
+
+    def __init__(self):
+        self._executor = None
+        self._processos = None
+        self._vagas = None
+        self._lock = threading.Lock()
+
+    def _preparar(self):
+        # Criado no primeiro uso (depois do fork do gunicorn); muda junto com a configuração
+        processos, fila_max = _config('SENHA_PROCESSOS'), _config('SENHA_FILA_MAX')
+        with self._lock:
+            if self._vagas is None or self._processos != processos:
+                self._desligar()
+                self._processos = processos
+                self._vagas = threading.BoundedSemaphore(fila_max)
+            if processos and self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=processos, mp_context=multiprocessing.get_context('spawn')
+                )
+            return self._executor, self._vagas
+
+    def _desligar(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+    def executar(self, fn, *args):
+        executor, vagas = self._preparar()
+        if not vagas.acquire(timeout=_config('SENHA_ESPERA_SEGUNDOS')):
+            raise SobrecargaSenhas('Muitos logins ao mesmo tempo, tente novamente em instantes')
+        try:
+            if executor is None:
+                return fn(*args)
+            try:
+                return executor.submit(fn, *args).result()
+            except BrokenProcessPool:
+                # Um processo do pool morreu: recria o pool e tenta de novo uma vez
+                with self._lock:
+                    if self._executor is executor:
+                        self._desligar()
+                executor, _ = self._preparar()
+                return executor.submit(fn, *args).result()
+        finally:
+            vagas.release()
+
+    def desligar(self):
+        with self._lock:
+            self._desligar()
+            self._vagas = None
+
+
+pool_senhas = PoolSenhas()
+
+
+def gerar_hash(senha):
+    return pool_senhas.executar(generate_password_hash, senha, _config('SENHA_METODO'))
+
+
+def verificar_hash(senha_hash, senha):
+    return pool_senhas.executar(check_password_hash, senha_hash, senha)
@@ -0,0 +1,351 @@
+import hashlib
+import json
+import secrets
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from flask import current_app, has_request_context, request, session as flask_session
+from flask.sessions import SessionInterface, SessionMixin, session_json_serializer
+from sqlalchemy import delete, event, insert, select, update
+from werkzeug.datastructures import CallbackDict
+from src.models.user import db, User, MembroPelada, SessaoUsuario
+from src.database.routing import RoutingSession
+
+# Sessões de login guardadas no servidor.
+#
+# O cookie leva só um token aleatório; dados da sessão, usuário, data de expiração
+# e o contexto do usuário (perfil e associações com as peladas) ficam no
+# armazenamento escolhido por SESSAO_BACKEND:
+# - 'memoria': dicionário do processo (desenvolvimento, um único processo);
+# - 'banco': tabela sessao_usuario, com um cache por processo de
+#   SESSAO_CACHE_SEGUNDOS para que a requisição comum não leia o banco.
+# O contexto é apagado depois do commit de qualquer mudança no perfil ou nas
+# associações (invalidar_contexto) e recarregado na próxima leitura.
+
+
+def _hash(token):
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def _copia(registro):
+    return dict(registro, dados=dict(registro['dados']))
+
+
+class ArmazenamentoMemoria:
+
+    def __init__(self):
+        self._sessoes = {}
+        self._lock = threading.Lock()
+
+    def carregar(self, token_hash):
+        with self._lock:
+            registro = self._sessoes.get(token_hash)
+            return _copia(registro) if registro else None
+
+    def criar(self, registro):
+        with self._lock:
+            self._sessoes[registro['token_hash']] = _copia(registro)
+
+    def atualizar(self, token_hash, valores):
+        with self._lock:
+            if token_hash in self._sessoes:
+                self._sessoes[token_hash].update(valores)
+
+    def remover(self, token_hash):
+        with self._lock:
+            self._sessoes.pop(token_hash, None)
+
+    def listar(self, usuario_id):
+        with self._lock:
+            return [_copia(r) for r in self._sessoes.values() if r['usuario_id'] == usuario_id]
+
+    def revogar(self, usuario_id, sessao_id=None, exceto_id=None):
+        with self._lock:
+            alvos = [
+                h for h, r in self._sessoes.items()
+                if r['usuario_id'] == usuario_id
+                and (sessao_id is None or r['id'] == sessao_id)
+                and r['id'] != exceto_id
+            ]
+            for token_hash in alvos:
+                del self._sessoes[token_hash]
+            return len(alvos)
+
+    def invalidar_contexto(self, usuario_ids):
+        with self._lock:
+            for registro in self._sessoes.values():
+                if registro['usuario_id'] in usuario_ids:
+                    registro['contexto'] = None
+
+    def limpar_expiradas(self, agora):
+        with self._lock:
+            expiradas = [h for h, r in self._sessoes.items() if r['expira_em'] <= agora]
+            for token_hash in expiradas:
+                del self._sessoes[token_hash]
+            return len(expiradas)
+
+
+class ArmazenamentoBanco:
+    # Escritas vão direto ao primário em transações próprias (independentes da
+    # db.session da requisição); leituras passam por um cache curto do processo.
+
+    def __init__(self, cache_segundos, cache_max):
+        self.tabela = SessaoUsuario.__table__
+        self.cache_segundos = cache_segundos
+        self.cache_max = cache_max
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _de_linha(self, linha):
+        registro = dict(linha._mapping)
+        registro['dados'] = session_json_serializer.loads(registro['dados'])
+        registro['contexto'] = json.loads(registro['contexto']) if registro['contexto'] else None
+        return registro
+
+    def _para_linha(self, valores):
+        linha = dict(valores)
+        if 'dados' in linha:
+            linha['dados'] = session_json_serializer.dumps(linha['dados'])
+        if 'contexto' in linha:
+            linha['contexto'] = json.dumps(linha['contexto']) if linha['contexto'] is not None else None
+        return linha
+
+    def _guardar_cache(self, registro):
+        with self._lock:
+            self._cache[registro['token_hash']] = (_copia(registro), time.monotonic())
+            self._cache.move_to_end(registro['token_hash'])
+            while len(self._cache) > self.cache_max:
+                self._cache.popitem(last=False)
+
+    def _esquecer(self, condicao):
+        with self._lock:
+            for token_hash in [h for h, (r, _) in self._cache.items() if condicao(r)]:
+                del self._cache[token_hash]
+
+    def carregar(self, token_hash):
+        with self._lock:
+            item = self._cache.get(token_hash)
+            if item and time.monotonic() - item[1] < self.cache_segundos:
+                return _copia(item[0])
+
+        with db.engine.connect() as conn:
+            linha = conn.execute(select(self.tabela).where(self.tabela.c.token_hash == token_hash)).first()
+        if linha is None:
+            self._esquecer(lambda r: r['token_hash'] == token_hash)
+            return None
+        registro = self._de_linha(linha)
+        self._guardar_cache(registro)
+        return registro
+
+    def criar(self, registro):
+        with db.engine.begin() as conn:
+            conn.execute(insert(self.tabela).values(self._para_linha(registro)))
+        self._guardar_cache(registro)
+
+    def atualizar(self, token_hash, valores):
+        with db.engine.begin() as conn:
+            conn.execute(update(self.tabela).where(self.tabela.c.token_hash == token_hash).values(self._para_linha(valores)))
+        with self._lock:
+            item = self._cache.get(token_hash)
+            if item:
+                item[0].update(valores)
+
+    def remover(self, token_hash):
+        with db.engine.begin() as conn:
+            conn.execute(delete(self.tabela).where(self.tabela.c.token_hash == token_hash))
+        self._esquecer(lambda r: r['token_hash'] == token_hash)
+
+    def listar(self, usuario_id):
+        with db.engine.connect() as conn:
+            linhas = conn.execute(
+                select(self.tabela).where(self.tabela.c.usuario_id == usuario_id).order_by(self.tabela.c.ultimo_acesso.desc())
+            ).all()
+        return [self._de_linha(linha) for linha in linhas]
+
+    def revogar(self, usuario_id, sessao_id=None, exceto_id=None):
+        comando = delete(self.tabela).where(self.tabela.c.usuario_id == usuario_id)
+        if sessao_id is not None:
+            comando = comando.where(self.tabela.c.id == sessao_id)
+        if exceto_id is not None:
+            comando = comando.where(self.tabela.c.id != exceto_id)
+        with db.engine.begin() as conn:
+            removidas = conn.execute(comando).rowcount
+        self._esquecer(lambda r: r['usuario_id'] == usuario_id
+                       and (sessao_id is None or r['id'] == sessao_id) and r['id'] != exceto_id)
+        return removidas
+
+    def invalidar_contexto(self, usuario_ids):
+        with db.engine.begin() as conn:
+            conn.execute(update(self.tabela).where(self.tabela.c.usuario_id.in_(list(usuario_ids))).values(contexto=None))
+        self._esquecer(lambda r: r['usuario_id'] in usuario_ids)
+
+    def limpar_expiradas(self, agora):
+        with db.engine.begin() as conn:
+            removidas = conn.execute(delete(self.tabela).where(self.tabela.c.expira_em <= agora)).rowcount
+        self._esquecer(lambda r: r['expira_em'] <= agora)
+        return removidas
+
+
+class SessaoServidor(CallbackDict, SessionMixin):
+
+    def __init__(self, registro=None, token=None):
+        def ao_mudar(sessao):
+            sessao.modified = True
+
+        super().__init__(registro['dados'] if registro else None, ao_mudar)
+        self.registro = registro
+        self.token = token
+        self.contexto = registro['contexto'] if registro else None
+        self.contexto_modificado = False
+        self.regenerar_id = False
+        self.modified = False
+
+    def regenerar(self):
+        # Token novo no login (evita fixação de sessão)
+        self.regenerar_id = True
+        self.modified = True
+
+
+class InterfaceSessaoServidor(SessionInterface):
+
+    def open_session(self, app, request):
+        token = request.cookies.get(self.get_cookie_name(app))
+        if token:
+            registro = armazenamento(app).carregar(_hash(token))
+            if registro and registro['expira_em'] > datetime.utcnow():
+                return SessaoServidor(registro, token)
+        return SessaoServidor()
+
+    def save_session(self, app, sessao, response):
+        loja = armazenamento(app)
+        nome = self.get_cookie_name(app)
+        dominio = self.get_cookie_domain(app)
+        caminho = self.get_cookie_path(app)
+        registro = sessao.registro
+
+        if not sessao:
+            if registro is not None:
+                loja.remover(registro['token_hash'])
+                response.delete_cookie(nome, domain=dominio, path=caminho)
+            return
+
+        agora = datetime.utcnow()
+        expira_em = agora + app.permanent_session_lifetime
+        if registro is not None and sessao.regenerar_id:
+            loja.remover(registro['token_hash'])
+            registro = None
+
+        if registro is None:
+            sessao.token = secrets.token_urlsafe(32)
+            registro = {
+                'id': str(uuid.uuid4()),
+                'token_hash': _hash(sessao.token),
+                'usuario_id': sessao.get('user_id'),
+                'dados': dict(sessao),
+                'contexto': sessao.contexto if sessao.contexto_modificado else None,
+                'criada_em': agora,
+                'ultimo_acesso': agora,
+                'expira_em': expira_em,
+                'user_agent': request.user_agent.string[:200] if has_request_context() else None,
+                'ip': request.remote_addr if has_request_context() else None,
+            }
+            loja.criar(registro)
+            sessao.registro = registro
+        else:
+            # Só grava o que mudou; sem mudança, renova a expiração de tempos em tempos
+            valores = {}
+            if sessao.modified:
+                valores['dados'] = dict(sessao)
+                if sessao.get('user_id') != registro['usuario_id']:
+                    valores['usuario_id'] = sessao.get('user_id')
+                    valores['contexto'] = None
+            if sessao.contexto_modificado:
+                valores['contexto'] = sessao.contexto
+            if valores or agora - registro['ultimo_acesso'] > timedelta(seconds=app.config['SESSAO_TOQUE_SEGUNDOS']):
+                valores.update(ultimo_acesso=agora, expira_em=expira_em)
+            else:
+                return
+            loja.atualizar(registro['token_hash'], valores)
+            registro.update(valores)
+
+        response.set_cookie(
+            nome, sessao.token, expires=expira_em, domain=dominio, path=caminho,
+            httponly=self.get_cookie_httponly(app), secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app)
+        )
+
+
+def configurar_sessoes(app):
+    if app.config['SESSAO_BACKEND'] == 'memoria':
+        loja = ArmazenamentoMemoria()
+    else:
+        loja = ArmazenamentoBanco(app.config['SESSAO_CACHE_SEGUNDOS'], app.config['SESSAO_CACHE_MAX'])
+    app.extensions['sessoes'] = loja
+    app.session_interface = InterfaceSessaoServidor()
+
+
+def armazenamento(app=None):
+    return (app or current_app).extensions['sessoes']
+
+
+def sessao_atual():
+    sessao = flask_session._get_current_object()
+    return sessao if isinstance(sessao, SessaoServidor) else None
+
+
+def contexto_usuario():
+    # Perfil e associações do usuário logado, guardados junto com a sessão
+    usuario_id = flask_session['user_id']
+    sessao = sessao_atual()
+    contexto = sessao.contexto if sessao else None
+    if contexto is None or contexto.get('usuario_id') != usuario_id:
+        user = db.session.get(User, usuario_id)
+        if user is None:
+            return None
+        membros = db.session.query(MembroPelada.pelada_id, MembroPelada.is_admin).filter(
+            MembroPelada.usuario_id == usuario_id
+        ).all()
+        contexto = {
+            'usuario_id': usuario_id,
+            'user': user.to_dict(),
+            'membros': {str(pelada_id): bool(is_admin) for pelada_id, is_admin in membros}
+        }
+        if sessao:
+            sessao.contexto = contexto
+            sessao.contexto_modificado = True
+    return contexto
+
+
+def invalidar_contexto(usuario_id):
+    # Apagado depois do commit, para ninguém recarregar o contexto antigo antes dele
+    db.session.info.setdefault('contextos_invalidados', set()).add(usuario_id)
+    sessao = sessao_atual() if has_request_context() else None
+    if sessao and sessao.get('user_id') == usuario_id:
+        sessao.contexto = None
+        sessao.contexto_modificado = False
+
+
+def listar_sessoes(usuario_id):
+    return armazenamento().listar(usuario_id)
+
+
+def revogar_sessoes(usuario_id, sessao_id=None, exceto_id=None):
+    return armazenamento().revogar(usuario_id, sessao_id=sessao_id, exceto_id=exceto_id)
+
+
+def limpar_expiradas():
+    return armazenamento().limpar_expiradas(datetime.utcnow())
+
+
+@event.listens_for(RoutingSession, 'after_commit')
+def _invalidar_apos_commit(session):
+    usuarios = session.info.pop('contextos_invalidados', None)
+    if usuarios and 'sessoes' in current_app.extensions:
+        armazenamento().invalidar_contexto(usuarios)
+
+
+@event.listens_for(RoutingSession, 'after_rollback')
+def _descartar_invalidacoes(session):
+    session.info.pop('contextos_invalidados', None)
@@ -0,0 +1,109 @@
+import numpy as np
+from src.models.user import db, Partida, EstatisticaJogadorPartida, SnapshotRanking
+from src.services.historico import carregar_estatisticas, limites_por_partida
+from src.services.arquivo import totais_por_usuario
+
+# Fotografias do ranking da pelada.
+#
+# A cada partida concluída grava-se a posição de todos os jogadores ranqueados da
+# pelada (ordem por média de pontos, como em get_ranking_pelada) e a pontuação de
+# quem atuou. A evolução de um jogador vira uma varredura de índice em
+# (pelada_id, usuario_id, data_partida), sem recalcular o ranking de cada data.
+
+
+def capturar_snapshot_ranking(partida):
+    # Chamado ao finalizar a partida, com a pontuação final já na sessão
+    totais = totais_por_usuario(pelada_id=partida.pelada_id)
+    media = (totais.c.pontuacao * 1.0 / totais.c.partidas).label('media_pontos')
+    ranking = db.session.query(
+        totais.c.usuario_id,
+        totais.c.partidas.label('total_partidas'),
+        media
+    ).order_by(
+        media.desc(),
+        totais.c.usuario_id
+    ).all()
+
+    pontuacoes = dict(db.session.query(
+        EstatisticaJogadorPartida.usuario_id, EstatisticaJogadorPartida.pontuacao_total
+    ).filter(
+        EstatisticaJogadorPartida.partida_id == partida.id
+    ).all())
+
+    db.session.query(SnapshotRanking).filter(
+        SnapshotRanking.partida_id == partida.id
+    ).delete(synchronize_session=False)
+
+    linhas = [{
+        'pelada_id': partida.pelada_id,
+        'partida_id': partida.id,
+        'usuario_id': row.usuario_id,
+        'data_partida': partida.data_partida,
+        'posicao': i + 1,
+        'total_partidas': int(row.total_partidas),
+        'media_pontos': float(row.media_pontos or 0),
+        'pontuacao_partida': pontuacoes.get(row.usuario_id)
+    } for i, row in enumerate(ranking)]
+
+    if linhas:
+        db.session.execute(SnapshotRanking.__table__.insert(), linhas)
+
+
+def reconstruir_snapshots(pelada_id):
+    # Replay do histórico da pelada com somas acumuladas em arrays
+    historico = carregar_estatisticas(pelada_id=pelada_id)
+    usuarios, idx = np.unique(historico['usuario_id'].astype(str), return_inverse=True)
+    pontos = historico['pontuacao_total']
+
+    soma = np.zeros(len(usuarios))
+    jogos = np.zeros(len(usuarios), dtype=np.int64)
+    linhas = []
+
+    inicios, fins = limites_por_partida(historico['partida_id'])
+    for inicio, fim in zip(inicios, fins):
+        u = idx[inicio:fim]
+        soma[u] += pontos[inicio:fim]
+        jogos[u] += 1
+
+        ranqueados = np.flatnonzero(jogos > 0)
+        medias = soma[ranqueados] / jogos[ranqueados]
+        # Empates pelo id do usuário (usuarios já vem ordenado), como na captura
+        ordem = ranqueados[np.argsort(-medias, kind='stable')]
+        atuou = dict(zip(u.tolist(), pontos[inicio:fim].tolist()))
+
+        for posicao, j in enumerate(ordem):
+            linhas.append({
+                'pelada_id': pelada_id,
+                'partida_id': historico['partida_id'][inicio],
+                'usuario_id': str(usuarios[j]),
+                'data_partida': historico['data_partida'][inicio],
+                'posicao': posicao + 1,
+                'total_partidas': int(jogos[j]),
+                'media_pontos': float(soma[j] / jogos[j]),
+                'pontuacao_partida': int(atuou[j]) if j in atuou else None
+            })
+
+    db.session.query(SnapshotRanking).filter(
+        SnapshotRanking.pelada_id == pelada_id
+    ).delete(synchronize_session=False)
+    if linhas:
+        db.session.execute(SnapshotRanking.__table__.insert(), linhas)
+    return len(linhas)
+
+
+def medias_moveis(valores, janela):
+    # Média das últimas `janela` partidas (ou de todas, enquanto houver menos)
+    valores = np.asarray(valores, dtype=np.float64)
+    if len(valores) == 0:
+        return []
+    acumulado = np.concatenate(([0.0], np.cumsum(valores)))
+    fim = np.arange(1, len(valores) + 1)
+    inicio = np.maximum(0, fim - janela)
+    return np.round((acumulado[fim] - acumulado[inicio]) / (fim - inicio), 2).tolist()
+
+
+def reconstruir_todos_snapshots():
+    peladas = [p for (p,) in db.session.query(Partida.pelada_id).filter(Partida.status == 'concluida').distinct()]
+    total = sum(reconstruir_snapshots(pelada_id) for pelada_id in peladas)
+    db.session.commit()
+    return {'peladas': len(peladas), 'snapshots': total}
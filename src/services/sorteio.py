@@ -0,0 +1,104 @@
+import numpy as np
+
+# Sorteio de times equilibrados.
+#
+# Cada jogador tem uma nota (média histórica de pontuação). O objetivo é minimizar
+# a soma dos quadrados dos desvios da soma de notas de cada time em relação à média.
+#
+# Restrições: goleiros são distribuídos um por time (enquanto houver) e os tamanhos
+# dos times diferem em no máximo um jogador. A busca local só troca jogadores da
+# mesma classe (goleiro com goleiro, linha com linha), então as restrições montadas
+# na distribuição inicial nunca são quebradas.
+#
+# A cada passo o ganho de TODAS as trocas possíveis é calculado de uma vez em uma
+# matriz n x n e a melhor troca é aplicada, até não haver melhora. Várias partidas
+# aleatórias (reinícios) garantem que cada sorteio saia diferente.
+
+
+def _distribuicao_inicial(classes, n_times, rng):
+    times = np.empty(len(classes), dtype=np.int64)
+    tamanhos = np.zeros(n_times, dtype=np.int64)
+    # Goleiros primeiro, para garantir um por time
+    for classe in (1, 0):
+        indices = rng.permutation(np.flatnonzero(classes == classe))
+        for i in indices:
+            menores = np.flatnonzero(tamanhos == tamanhos.min())
+            time = rng.choice(menores)
+            times[i] = time
+            tamanhos[time] += 1
+    return times
+
+
+def _busca_local(notas, classes, times, n_times, max_passos):
+    somas = np.bincount(times, weights=notas, minlength=n_times)
+    media = somas.mean()
+    mesma_classe = classes[:, None] == classes[None, :]
+
+    for _ in range(max_passos):
+        # d[i, j] = quanto o time de i perde (e o de j ganha) trocando i por j
+        d = notas[:, None] - notas[None, :]
+        si = (somas - media)[times][:, None]
+        sj = (somas - media)[times][None, :]
+        ganho = (si - d) ** 2 + (sj + d) ** 2 - si ** 2 - sj ** 2
+
+        validas = mesma_classe & (times[:, None] != times[None, :])
+        ganho = np.where(validas, ganho, np.inf)
+
+        melhor = np.argmin(ganho)
+        i, j = divmod(int(melhor), len(notas))
+        if not ganho[i, j] < -1e-9:
+            break
+
+        ti, tj = times[i], times[j]
+        somas[ti] += notas[j] - notas[i]
+        somas[tj] += notas[i] - notas[j]
+        times[i], times[j] = tj, ti
+
+    return times, somas
+
+
+def desequilibrio(notas, times, n_times):
+    somas = np.bincount(times, weights=notas, minlength=n_times)
+    return float(somas.max() - somas.min())
+
+
+def sortear_times(notas, goleiros, n_times, reinicios=8, max_passos=200, seed=None):
+    notas = np.asarray(notas, dtype=np.float64)
+    classes = np.asarray(goleiros, dtype=np.int64)
+    if n_times < 2 or len(notas) < n_times:
+        raise ValueError('Jogadores insuficientes para o número de times')
+
+    rng = np.random.default_rng(seed)
+    melhor_times, melhor_custo = None, np.inf
+    for _ in range(reinicios):
+        times = _distribuicao_inicial(classes, n_times, rng)
+        times, somas = _busca_local(notas, classes, times, n_times, max_passos)
+        custo = float(((somas - somas.mean()) ** 2).sum())
+        if custo < melhor_custo - 1e-9:
+            melhor_times, melhor_custo = times.copy(), custo
+
+    return melhor_times
+
+
+def sortear_times_guloso(notas, goleiros, n_times):
+    # Referência ingênua: do melhor para o pior, cada jogador vai para o time mais fraco
+    # que ainda tenha vaga (goleiros primeiro, um por time)
+    notas = np.asarray(notas, dtype=np.float64)
+    classes = np.asarray(goleiros, dtype=np.int64)
+    times = np.empty(len(notas), dtype=np.int64)
+    somas = np.zeros(n_times)
+    tamanhos = np.zeros(n_times, dtype=np.int64)
+    goleiros_no_time = np.zeros(n_times, dtype=np.int64)
+    limite = -(-len(notas) // n_times)
+
+    ordem = sorted(range(len(notas)), key=lambda i: (-classes[i], -notas[i]))
+    for i in ordem:
+        abertos = np.flatnonzero(tamanhos < limite)
+        if classes[i] == 1:
+            abertos = abertos[goleiros_no_time[abertos] == goleiros_no_time[abertos].min()]
+        time = abertos[np.argmin(somas[abertos])]
+        times[i] = time
+        goleiros_no_time[time] += classes[i]
+        somas[time] += notas[i]
+        tamanhos[time] += 1
+    return times
@@ -0,0 +1,116 @@
+import os
+from datetime import datetime
+from sqlalchemy import update
+from src.models.user import db, User, Partida
+from src.services.jobs import tarefa, periodica
+from src.services.rating import atualizar_ratings_partida
+from src.services.atributos import atualizar_atributos_partida
+from src.services.snapshots import capturar_snapshot_ranking
+from src.services.destaques import registrar_destaques, atualizar_temporada_partida
+from src.services.pontuacao import atualizar_agregados_pelada
+from src.services import notificacoes
+from src.services.sessoes import invalidar_contexto, limpar_expiradas
+from src.services.limites import limpar_baldes
+from src.services.idempotencia import limpar_respostas
+from src.services import arquivo
+
+# Tarefas executadas pela fila (src/services/jobs.py). Cada uma roda em uma
+# transação própria; o executor faz o commit ao final.
+
+TAMANHO_FOTO = 512
+
+
+@tarefa('agregados_partida')
+def agregados_partida(partida_id):
+    # Tudo o que deriva de uma partida finalizada: ratings, card, evolução do
+    # ranking, destaques e temporada (numa única transação: ou tudo ou nada)
+    partida = db.session.get(Partida, partida_id)
+    if partida is None or partida.status != 'concluida':
+        return
+    # Ratings e temporada são incrementais: a marca garante uma única aplicação por
+    # partida (o UPDATE condicional também trava a linha contra execuções simultâneas)
+    marcada = db.session.execute(
+        update(Partida).where(Partida.id == partida_id, Partida.agregados_em.is_(None)).values(
+            agregados_em=datetime.utcnow()
+        ),
+        execution_options={'synchronize_session': False}
+    )
+    if not marcada.rowcount:
+        return
+    atualizar_ratings_partida(partida)
+    atualizar_atributos_partida(partida)
+    capturar_snapshot_ranking(partida)
+    registrar_destaques(partida)
+    atualizar_temporada_partida(partida)
+
+
+@tarefa('agregados_pelada')
+def agregados_pelada(pelada_id):
+    atualizar_agregados_pelada(pelada_id)
+
+
+@tarefa('processar_foto')
+def processar_foto(usuario_id, pasta, arquivo):
+    # Corrige a orientação, reduz para TAMANHO_FOTO e grava em JPEG
+    from PIL import Image, ImageOps
+
+    origem = os.path.join(pasta, arquivo)
+    if not os.path.exists(origem):
+        return
+
+    processado = os.path.splitext(arquivo)[0] + f'_{TAMANHO_FOTO}.jpg'
+    with Image.open(origem) as imagem:
+        imagem = ImageOps.exif_transpose(imagem)
+        imagem.thumbnail((TAMANHO_FOTO, TAMANHO_FOTO))
+        imagem.convert('RGB').save(os.path.join(pasta, processado), 'JPEG', quality=85, optimize=True)
+
+    # Só troca se o usuário não enviou outra foto nesse meio tempo
+    resultado = db.session.execute(
+        update(User).where(
+            User.id == usuario_id,
+            User.foto_perfil_url == f'/uploads/{arquivo}'
+        ).values(foto_perfil_url=f'/uploads/{processado}'),
+        execution_options={'synchronize_session': False}
+    )
+    if resultado.rowcount:
+        invalidar_contexto(usuario_id)
+    db.session.commit()
+
+    if not resultado.rowcount:
+        os.remove(os.path.join(pasta, processado))
+    os.remove(origem)
+
+
+@tarefa('notificar_nova_partida')
+def notificar_nova_partida(partida_id, criador_id=None):
+    notificacoes.notificar_nova_partida(partida_id, criador_id)
+
+
+@tarefa('enviar_notificacoes')
+def enviar_notificacoes():
+    notificacoes.enviar_pendentes()
+
+
+@periodica('agendar_lembretes', 'NOTIFICACOES_INTERVALO')
+def agendar_lembretes():
+    notificacoes.agendar_lembretes()
+
+
+@periodica('limpar_sessoes', 'SESSAO_LIMPEZA_INTERVALO')
+def limpar_sessoes():
+    limpar_expiradas()
+
+
+@periodica('limpar_limites', 'LIMITES_LIMPEZA_INTERVALO')
+def limpar_limites():
+    limpar_baldes()
+
+
+@periodica('limpar_idempotencia', 'IDEMPOTENCIA_LIMPEZA_INTERVALO')
+def limpar_idempotencia():
+    limpar_respostas()
+
+
+@periodica('arquivar_temporadas', 'ARQUIVO_INTERVALO')
+def arquivar_temporadas():
+    arquivo.arquivar()
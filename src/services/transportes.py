@@ -0,0 +1,104 @@
+import json
+import logging
+import smtplib
+from email.message import EmailMessage
+from email.utils import formataddr
+
+# Transportes de notificação. Cada um recebe um lote de resumos (um por usuário)
+# e devolve os ids dos usuários cujo envio falhou.
+
+logger = logging.getLogger(__name__)
+
+
+class TransporteSMTP:
+    nome = 'smtp'
+
+    def __init__(self, host, porta, usuario=None, senha=None, tls=True, remetente='nao-responda@reidapelada'):
+        self.host = host
+        self.porta = porta
+        self.usuario = usuario
+        self.senha = senha
+        self.tls = tls
+        self.remetente = remetente
+
+    def enviar_lote(self, resumos):
+        # Uma conexão SMTP para o lote inteiro. Nunca levanta exceção no meio do lote:
+        # o que já saiu não pode ser reenviado pela retentativa da tarefa
+        try:
+            smtp = smtplib.SMTP(self.host, self.porta, timeout=30)
+            try:
+                if self.tls:
+                    smtp.starttls()
+                if self.usuario:
+                    smtp.login(self.usuario, self.senha)
+            except Exception:
+                smtp.close()
+                raise
+        except (smtplib.SMTPException, OSError) as e:
+            # Sem conexão ou login recusado: nenhum resumo foi enviado
+            logger.warning('Falha ao conectar no SMTP %s:%s: %s', self.host, self.porta, e)
+            return {resumo['usuario_id'] for resumo in resumos}
+
+        falhas = set()
+        try:
+            for resumo in resumos:
+                mensagem = EmailMessage()
+                mensagem['From'] = self.remetente
+                mensagem['To'] = formataddr((resumo['nome'], resumo['email']))
+                mensagem['Subject'] = resumo['assunto']
+                mensagem.set_content(resumo['texto'])
+                try:
+                    smtp.send_message(mensagem)
+                except (smtplib.SMTPException, OSError) as e:
+                    logger.warning('Falha no e-mail para %s: %s', resumo['usuario_id'], e)
+                    falhas.add(resumo['usuario_id'])
+        finally:
+            try:
+                smtp.quit()
+            except (smtplib.SMTPException, OSError):
+                smtp.close()
+        return falhas
+
+
+class TransporteWebPush:
+    nome = 'webpush'
+
+    def __init__(self, chave_privada, email_contato, inscricoes):
+        # inscricoes: função usuario_ids -> {usuario_id: [InscricaoPush]}
+        self.chave_privada = chave_privada
+        self.email_contato = email_contato
+        self.inscricoes = inscricoes
+        self.expiradas = []
+
+    def enviar_lote(self, resumos):
+        # pywebpush é opcional: só é necessário com VAPID_PRIVATE_KEY configurada
+        from pywebpush import webpush, WebPushException
+
+        por_usuario = self.inscricoes([r['usuario_id'] for r in resumos])
+        falhas = set()
+        for resumo in resumos:
+            # Sem nenhuma inscrição que tenha recebido (inclusive sem inscrição) conta como falha
+            entregue = False
+            dados = json.dumps({'titulo': resumo['assunto'], 'mensagem': resumo['texto']})
+            for inscricao in por_usuario.get(resumo['usuario_id'], []):
+                try:
+                    webpush(
+                        subscription_info={'endpoint': inscricao.endpoint,
+                                           'keys': {'p256dh': inscricao.p256dh, 'auth': inscricao.auth}},
+                        data=dados,
+                        vapid_private_key=self.chave_privada,
+                        vapid_claims={'sub': f'mailto:{self.email_contato}'}
+                    )
+                    entregue = True
+                except WebPushException as e:
+                    # 404/410: o navegador cancelou a inscrição
+                    if e.response is not None and e.response.status_code in (404, 410):
+                        self.expiradas.append(inscricao.endpoint)
+                    else:
+                        logger.warning('Falha no web push para %s: %s', resumo['usuario_id'], e)
+                except OSError as e:
+                    # Erros de rede do requests são OSError
+                    logger.warning('Falha no web push para %s: %s', resumo['usuario_id'], e)
+            if not entregue:
+                falhas.add(resumo['usuario_id'])
+        return falhas